@@ -1,21 +1,30 @@
-from cachetools import TTLCache, cached
+from cachetools import LRUCache, TTLCache, cached
+from cachetools.keys import hashkey
 from functools import lru_cache
-from flask import Flask, request, jsonify, Response, redirect, send_from_directory
+from flask import Flask, request, jsonify, Response, redirect, send_from_directory, stream_with_context
 from flask_restx import Api, Resource
 from flask_cors import CORS
 from news_digest import get_news_digest
+import json
 import logging
+import threading
 import requests
 from datetime import datetime, timedelta
 import os
 from google.cloud import translate_v2 as translate
-from auth import AuthService, token_required, db, init_admin, SavedVideo, CustomMusic, VideoVote, VideoComment
+from auth import AuthService, token_required, db, init_admin, User, SavedVideo, CustomMusic, VideoVote, VideoComment
 from routes.mlb import mlb
 from flask_migrate import Migrate
-from cfknn import run_main
-from db import add, remove, get_video_url, search_feature, rag_recommend_pgvector
-from sqlalchemy import create_engine
-from sqlalchemy.sql import text
+from cfknn import run_main, iter_batch_recommendations, fold_in_rating, fold_out_rating
+from ratings_snapshot import get_snapshot
+from trainer import get_trainer
+from popularity import get_popularity
+from catalog import get_catalog
+from embedding_cache import get_embedding_cache, normalize
+from result_cursor import get_cursors
+from rating_writer import get_rating_writer
+from hybrid import rank_feed, follow_query
+from db import get_video_url, get_video_urls, search_feature, pool_status, RATING_TABLES
 from gemini import run_gemini_prompt
 from highlight import generate_videos
 import re
@@ -51,22 +60,93 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
 
 CACHE_SIZE = 1024 * 100
+BATCH_MAX_USERS = int(os.getenv('RECOMMEND_BATCH_MAX_USERS', 10000))
 CACHE_TTL = 60 * 15  # 15 minutes
+# Shuffled follow feeds kept for paging; a feed lasts until its day, session seed or catalog version changes
+FOLLOW_SHUFFLES_CACHED = int(os.getenv('FOLLOW_SHUFFLES_CACHED', 2048))
+# Seconds a user's follows are kept for cold-start requests that don't send them
+FOLLOWS_CACHE_TTL = float(os.getenv('FOLLOWS_CACHE_TTL', 5 * 60))
 
 
 @cached(cache=TTLCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL))
-def cached_search_feature(model: str, search: str, amount) -> list:
-    return search_feature(model, search, amount)
+def cached_search_feature(model: str, search: str, amount, start=0) -> list:
+    return search_feature(model, search, amount, start)
 
 
-@cached(cache=TTLCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL))
-def cached_rag_recommend_pgvector(model: str, query: str, start: int) -> list:
-    return rag_recommend_pgvector(model, query, start)
+def vector_page(query, key, cursor, start, amount):
+    """(ids, has_more, cursor) for one page of a pgvector search.
 
-@cached(cache=TTLCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL))
-def cached_get_video_url(play_id: str):
+    Without a cursor (None) the page is queried on its own. A caller that
+    pages passes one: an empty cursor, an expired one or one opened for a
+    search other than key fetches the top result_cursor.CURSOR_RESULTS
+    matches once and opens a new cursor on them; pages that bring the cursor
+    back are sliced from memory. Pages past CURSOR_RESULTS are queried on
+    their own.
+    """
+    cursors = get_cursors()
+    if cursor is None or start + amount > cursors.limit:
+        results = cached_search_feature("embeddings", query, amount + 1, start)
+        return [row['id'] for row in results[:amount]], len(results) > amount, cursor
+    page = cursors.page(cursor, key, start, amount)
+    if page is None:
+        cursor = cursors.open(cached_search_feature("embeddings", query, cursors.limit), key)
+        page = cursors.page(cursor, key, start, amount)
+    ids, _, has_more = page
+    return ids, has_more, cursor
+
+
+VIDEO_CACHE = TTLCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL)
+VIDEO_CACHE_LOCK = threading.Lock()
+VIDEOS_MAX_IDS = 100
+
+
+@cached(cache=VIDEO_CACHE, lock=VIDEO_CACHE_LOCK)
+def _cached_db_video_url(play_id: str):
     return get_video_url(play_id)
 
+
+def cached_get_video_url(play_id: str):
+    """Metadata for a play id from the highlight catalog; ids newer than the catalog go to the database"""
+    video_data = get_catalog().metadata(play_id)
+    return video_data if video_data is not None else _cached_db_video_url(play_id)
+
+
+def cached_get_video_urls(play_ids):
+    """Metadata for many play ids from the catalog, then the per-id cache, then one query for the rest"""
+    found = get_catalog().metadata_many(play_ids)
+    with VIDEO_CACHE_LOCK:
+        found.update({play_id: VIDEO_CACHE[hashkey(play_id)] for play_id in play_ids
+                      if play_id not in found and hashkey(play_id) in VIDEO_CACHE})
+    missing = [play_id for play_id in dict.fromkeys(play_ids) if play_id not in found]
+    if missing:
+        fetched = get_video_urls(missing) or {}
+        with VIDEO_CACHE_LOCK:
+            for play_id, video_data in fetched.items():
+                VIDEO_CACHE[hashkey(play_id)] = video_data
+        found.update(fetched)
+    return found
+
+@cached(cache=LRUCache(maxsize=FOLLOW_SHUFFLES_CACHED), lock=threading.Lock())
+def follow_shuffle(user_id: int, day: int, session: int, followed_teams: tuple, followed_players: tuple,
+                   catalog_version: int):
+    """The user's followed highlights (or every highlight) in a stable random order for this day and session.
+
+    catalog_version is only part of the cache key, so a reloaded catalog gets a fresh shuffle.
+    """
+    catalog = get_catalog()
+    positions = catalog.followed(followed_teams, followed_players) if followed_teams or followed_players else None
+    return catalog.shuffled([user_id, day, session], positions)
+
+
+def requested_table(args):
+    """The ratings table named by ?table= (user_ratings_db by default), or None if it is not in RATING_TABLES"""
+    table = args.get('table', 'user_ratings_db')
+    return table if table in RATING_TABLES else None
+
+
+UNKNOWN_TABLE = {'success': False, 'message': 'Unknown ratings table'}
+
+
 def allowed_audio_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_AUDIO_EXTENSIONS
 
@@ -101,6 +181,9 @@ with app.app_context():
 
 CORS(app, resources={r"/*": {"origins": "*"}})
 
+# Build or load the recommender model in the background so requests never wait on it
+get_trainer('user_ratings_db')
+
 api = Api(app, version='1.0',
           title='MLB Fan Feed API',
           description='API for MLB fan feed features')
@@ -212,7 +295,9 @@ def add_rating():
         user_id = request.args.get('user_id')
         reel_id = request.args.get('reel_id')
         rating = request.args.get('rating')
-        table = request.args.get('table', default='user_ratings_db')
+        table = requested_table(request.args)
+        if table is None:
+            return jsonify(UNKNOWN_TABLE), 400
 
         if not all([user_id, reel_id, rating]):
             return jsonify({'success': False, 'message': 'Missing required fields'}), 400
@@ -224,7 +309,16 @@ def add_rating():
         except ValueError:
             return jsonify({'success': False, 'message': 'Invalid rating value'}), 400
 
-        add(user_id, reel_id, rating, table)
+        writer = get_rating_writer(table)
+        try:
+            user_id, reel_id = writer.key(user_id, reel_id)
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Invalid user_id or reel_id'}), 400
+
+        # Buffered and written in bulk by the table's RatingWriter
+        if not writer.add(user_id, reel_id, rating):
+            return jsonify({'success': False, 'message': 'Too many ratings waiting to be written'}), 503
+        fold_in_rating(user_id, reel_id, rating, table)
         return jsonify({'success': True, 'message': 'Rating added successfully'}), 200
     except Exception as e:
         logger.error(f"Error adding rating: {str(e)}", exc_info=True)
@@ -237,31 +331,73 @@ def remove_rating():
     try:
         user_id = request.args.get('user_id')
         reel_id = request.args.get('reel_id')
-        table = request.args.get('table', default='user_ratings_db')
+        table = requested_table(request.args)
+        if table is None:
+            return jsonify(UNKNOWN_TABLE), 400
 
         if not all([user_id, reel_id]):
             return jsonify({'success': False, 'message': 'Missing required fields'}), 400
 
-        remove(user_id, reel_id, table)
+        writer = get_rating_writer(table)
+        try:
+            user_id, reel_id = writer.key(user_id, reel_id)
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Invalid user_id or reel_id'}), 400
+
+        # Goes through the writer so a buffered or in-flight rating cannot be written after the delete
+        if writer.remove(user_id, reel_id):
+            fold_out_rating(user_id, reel_id, table)
         return jsonify({'success': True, 'message': 'Rating removed successfully'}), 200
     except Exception as e:
         logger.error(f"Error removing rating: {str(e)}", exc_info=True)
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+@app.route('/recommend/status', methods=['GET'])
+def get_recommender_status():
+    """Report the model version, ratings snapshot, cold-start ranking, catalog and search caches"""
+    try:
+        table = requested_table(request.args)
+        if table is None:
+            return jsonify(UNKNOWN_TABLE), 400
+        return jsonify({
+            'success': True,
+            'model': get_trainer(table).status(),
+            'snapshot': get_snapshot(table).status(),
+            'popularity': get_popularity(table).status(),
+            'writer': get_rating_writer(table).status(),
+            'catalog': get_catalog().status(),
+            'embeddings': get_embedding_cache().status(),
+            'cursors': get_cursors().status()
+        })
+    except Exception as e:
+        logger.error(f"Error getting recommender status: {str(e)}", exc_info=True)
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@app.route('/api/db/pool', methods=['GET'])
+def get_db_pool_status():
+    """Connection pool metrics: connections checked out, overflow in use and checkout wait times"""
+    try:
+        return jsonify({'success': True, 'pools': pool_status()})
+    except Exception as e:
+        logger.error(f"Error getting pool status: {str(e)}", exc_info=True)
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
 @app.route('/recommend/search', methods=['GET'])
 def get_search_recommendations():
     try:
-        search = request.args.get('search', '').strip().lower()
-        amount = request.args.get('amount', 5)
+        search = normalize(request.args.get('search', '')).lower()
+        amount = request.args.get('amount', 5, type=int)
+        start = request.args.get('start', 0, type=int)
         if search:
-            # Use the cached search function instead of calling search_feature directly.
-            data = cached_search_feature("embeddings", search, int(amount))
-            ids = [item['id'] for item in data]
+            ids, has_more, cursor = vector_page(search, ('search', search), request.args.get('cursor'), start, amount)
             return jsonify({
                 'success': True,
                 'recommendations': ids,
-                'has_more': len(ids) == int(amount)
+                'has_more': has_more,
+                'cursor': cursor
             })
         else:
             return jsonify({
@@ -274,6 +410,7 @@ def get_search_recommendations():
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+VECTOR_PAGE_SIZE = 5
 RANDOM_TEAMS = ['New York Yankees', 'Los Angeles Dodgers', 'Chicago Cubs', 'Boston Red Sox', 'Houston Astros']
 RANDOM_PLAYERS = ['Aaron Judge', 'Mookie Betts', 'Shohei Ohtani', 'Mike Trout', 'Freddie Freeman']
 
@@ -295,28 +432,55 @@ def get_vector_recommendations(current_user):
         if not followed_players:
             followed_players = random.sample(RANDOM_PLAYERS, min(3, len(RANDOM_PLAYERS)))
 
-        query = f"Teams: {', '.join(followed_teams)}. Players: {', '.join(followed_players)}."
+        query = follow_query(followed_teams, followed_players)
 
         if query:
-            data = cached_rag_recommend_pgvector("embeddings", query, start)
-            ids = [item['id'] for item in data]
+            # Later pages pass back the cursor, so they continue the same result set even when
+            # the teams/players above were picked at random; it is bound to the user, not the query
+            ids, has_more, cursor = vector_page(query, ('user', current_user.client_id), request.args.get('cursor'),
+                                                start, VECTOR_PAGE_SIZE)
             return jsonify({
                 'success': True,
                 'recommendations': ids,
-                'has_more': False
+                'has_more': has_more,
+                'cursor': cursor
             })
     except Exception as e:
         logger.error(f"Error getting model recommendations: {str(e)}", exc_info=True)
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+def followed_names(user):
+    """(team names, player names) a user follows; empty for an unknown user"""
+    if user is None:
+        return [], []
+    return ([team.get('name', '') for team in (user.followed_teams or [])],
+            [player.get('fullName', '') for player in (user.followed_players or [])])
+
+
+@cached(cache=TTLCache(maxsize=CACHE_SIZE, ttl=FOLLOWS_CACHE_TTL), lock=threading.Lock())
+def cached_followed_names(user_id: int):
+    """followed_names of a user id, cached so repeated cold starts skip the users query"""
+    teams, players = followed_names(User.query.get(user_id))
+    return tuple(teams), tuple(players)
+
+
+def requested_follows(args, user_id):
+    """(team names, player names) from ?followed_teams=&followed_players= if sent, else the user's cached follows"""
+    if 'followed_teams' in args or 'followed_players' in args:
+        return args.getlist('followed_teams'), args.getlist('followed_players')
+    return cached_followed_names(user_id)
+
+
 @app.route('/recommend/predict', methods=['GET'])
 def get_model_recommendations():
     try:
         user_id = int(request.args.get('user_id'))
         page = int(request.args.get('page', default=1))
         per_page = int(request.args.get('per_page', default=5))
-        table = request.args.get('table', default='user_ratings_db')
+        table = requested_table(request.args)
+        if table is None:
+            return jsonify(UNKNOWN_TABLE), 400
         search = request.args.get('search', '').strip()
 
         # Break down search terms for better matching
@@ -324,122 +488,34 @@ def get_model_recommendations():
 
         offset = (page - 1) * per_page
 
+        recs, has_more = [], False
         try:
             # Try to get personalized recommendations first
+            get_trainer(table)
             recs, has_more = run_main(table, user_id=user_id, num_recommendations=per_page, offset=offset)
-            if not recs:
-                raise Exception("No personalized recommendations available")
         except Exception as e:
             logger.warning(f"Could not get personalized recommendations for user {user_id}: {str(e)}")
-            # If personalized recommendations fail, fall back to default recommendations
-            engine = create_engine(init_connection_pool())
-            with engine.connect() as conn:
-                if search_terms:
-                    # Build dynamic search conditions for each term
-                    search_conditions = []
-                    params = {}
-                    for i, term in enumerate(search_terms):
-                        param_name = f"term_{i}"
-                        search_conditions.append(f"""
-                            (LOWER(title) LIKE :term_{i} OR 
-                             LOWER(blurb) LIKE :term_{i} OR 
-                             LOWER(player) LIKE :term_{i} OR
-                             LOWER(home_team) LIKE :term_{i} OR
-                             LOWER(away_team) LIKE :term_{i})
-                        """)
-                        params[f"term_{i}"] = f"%{term}%"
-
-                    search_clause = " AND ".join(search_conditions)
-
-                    base_query = f"""
-                        WITH matched_videos AS (
-                            SELECT 
-                                id as reel_id,
-                                title,
-                                blurb,
-                                COUNT(*) as view_count,
-                                CASE 
-                                    WHEN LOWER(title) = :exact_search THEN 3
-                                    WHEN LOWER(blurb) = :exact_search THEN 2
-                                    ELSE 0
-                                END as exact_match_score
-                            FROM mlb_highlights
-                            WHERE id IS NOT NULL
-                            AND ({search_clause})
-                            GROUP BY id, title, blurb
-                            HAVING COUNT(*) > 0
-                        )
-                        SELECT 
-                            reel_id,
-                            view_count
-                        FROM matched_videos
-                        ORDER BY exact_match_score DESC, view_count DESC, RANDOM()
-                        OFFSET :offset
-                        LIMIT :limit
-                    """
-
-                    # Add the exact search parameter
-                    params['exact_search'] = search.lower()
-                    params['offset'] = offset
-                    params['limit'] = per_page + 1
-
-                    results = conn.execute(text(base_query), params).fetchall()
-                else:
-                    base_query = """
-                        SELECT id as reel_id, COUNT(*) as view_count
-                        FROM mlb_highlights
-                        WHERE id IS NOT NULL
-                        GROUP BY id
-                        HAVING COUNT(*) > 0
-                        ORDER BY view_count DESC, RANDOM()
-                        OFFSET :offset
-                        LIMIT :limit
-                    """
-                    results = conn.execute(text(base_query), {
-                        "offset": offset,
-                        "limit": per_page + 1
-                    }).fetchall()
-
-                has_more = len(results) > per_page
-                recs = [{"reel_id": str(row[0])} for row in results[:per_page]]
+
+        if not recs and not search_terms:
+            # Cold start: a page of the precomputed popularity ranking, boosted by the user's follows
+            followed_teams, followed_players = requested_follows(request.args, user_id)
+            recs, has_more = get_popularity(table).recommend(followed_teams, followed_players, per_page, offset)
+        elif not recs:
+            # If personalized recommendations fail, fall back to keyword matches in the catalog
+            catalog = get_catalog()
+            positions = catalog.search(search_terms, search)
+            has_more = offset + per_page < len(positions)
+            recs = [{"reel_id": reel_id} for reel_id in catalog.reel_ids(positions[offset:offset + per_page])]
 
         if search_terms and recs:
-            reel_ids = [r["reel_id"] for r in recs]
-            reel_ids_str = ", ".join(f"'{rid}'" for rid in reel_ids)
-
-            # Verify the results still match the search criteria
-            engine = create_engine(init_connection_pool())
-            with engine.connect() as conn:
-                search_conditions = []
-                params = {"search": f"%{search.lower()}%"}
-                for i, term in enumerate(search_terms):
-                    param_name = f"term_{i}"
-                    search_conditions.append(f"""
-                        (LOWER(title) LIKE :term_{i} OR 
-                         LOWER(blurb) LIKE :term_{i} OR 
-                         LOWER(player) LIKE :term_{i} OR
-                         LOWER(home_team) LIKE :term_{i} OR
-                         LOWER(away_team) LIKE :term_{i})
-                    """)
-                    params[param_name] = f"%{term}%"
-
-                search_clause = " AND ".join(search_conditions)
-
-                highlights_query = text(f"""
-                    SELECT id, title
-                    FROM mlb_highlights
-                    WHERE id IN ({reel_ids_str})
-                    AND ({search_clause})
-                """)
-                highlight_results = conn.execute(highlights_query, params).fetchall()
-                valid_ids = set(row[0] for row in highlight_results)
-                filtered_recs = [r for r in recs if r["reel_id"] in valid_ids]
-
-                return jsonify({
-                    'success': True,
-                    'recommendations': filtered_recs,
-                    'has_more': False
-                })
+            # Keep only the results that still match the search criteria
+            matches = get_catalog().matches([r["reel_id"] for r in recs], search_terms)
+            filtered_recs = [r for r, match in zip(recs, matches) if match]
+            return jsonify({
+                'success': True,
+                'recommendations': filtered_recs,
+                'has_more': False
+            })
 
         if recs:
             return jsonify({
@@ -455,58 +531,114 @@ def get_model_recommendations():
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+@app.route('/recommend/batch', methods=['POST'])
+def get_batch_recommendations():
+    """Recommendations for many users in one request.
+
+    Takes {"user_ids": [...], "page": 1, "per_page": 5, "table": ...}. Users are
+    scored together by cfknn.iter_batch_recommendations; users without ratings
+    get the popularity ranking boosted by their follows. With ?stream=1 (or an
+    Accept: application/x-ndjson header) the response is one JSON object per
+    line, written as each chunk of users is scored.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict) or not isinstance(data.get('user_ids', []), list):
+            return jsonify({'success': False, 'message': 'Expected a JSON object with a user_ids list'}), 400
+        try:
+            user_ids = [int(user_id) for user_id in data.get('user_ids', [])]
+            page = int(data.get('page', 1))
+            per_page = int(data.get('per_page', 5))
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'user_ids, page and per_page must be integers'}), 400
+        if page < 1 or per_page < 1:
+            return jsonify({'success': False, 'message': 'page and per_page must be at least 1'}), 400
+        table = requested_table(data)
+        if table is None:
+            return jsonify(UNKNOWN_TABLE), 400
+        if not user_ids:
+            return jsonify({'success': False, 'message': 'Missing user_ids'}), 400
+        if len(user_ids) > BATCH_MAX_USERS:
+            return jsonify({'success': False, 'message': f'At most {BATCH_MAX_USERS} users per batch'}), 400
+        stream = request.args.get('stream', '').lower() in ('1', 'true') or \
+            'application/x-ndjson' in request.headers.get('Accept', '')
+
+        offset = (page - 1) * per_page
+        get_trainer(table)
+        popularity = get_popularity(table)
+
+        def results():
+            users = None
+            for user_id, recs, has_more in iter_batch_recommendations(table, user_ids, per_page, offset):
+                if not recs:
+                    if users is None:
+                        # One query for every user in the batch, made only once someone needs a cold start
+                        users = {user.client_id: user
+                                 for user in User.query.filter(User.client_id.in_(user_ids)).all()}
+                    followed_teams, followed_players = followed_names(users.get(user_id))
+                    recs, has_more = popularity.recommend(followed_teams, followed_players, per_page, offset)
+                yield {'user_id': user_id, 'recommendations': recs, 'has_more': has_more}
+
+        if stream:
+            return Response(stream_with_context(json.dumps(result) + '\n' for result in results()),
+                            mimetype='application/x-ndjson')
+        return jsonify({'success': True, 'results': list(results())})
+
+    except Exception as e:
+        logger.error(f"Error getting batch recommendations: {str(e)}", exc_info=True)
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@app.route('/recommend/feed', methods=['GET'])
+@token_required
+def get_feed_recommendations(current_user):
+    """One ranked page blending the model, pgvector and follow recommendations (see hybrid.rank_feed)"""
+    try:
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', 5, type=int)
+        table = requested_table(request.args)
+        if table is None:
+            return jsonify(UNKNOWN_TABLE), 400
+
+        get_trainer(table)
+        followed_teams, followed_players = followed_names(current_user)
+        recommendations, has_more = rank_feed(table, current_user.client_id, followed_teams, followed_players,
+                                              per_page, (page - 1) * per_page)
+        return jsonify({
+            'success': True,
+            'recommendations': recommendations,
+            'has_more': has_more
+        })
+
+    except Exception as e:
+        logger.error(f"Error getting feed recommendations: {str(e)}", exc_info=True)
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
 @app.route('/recommend/follow', methods=['GET'])
 @token_required
 def get_follow_recommendations(current_user):
-    """Get recommendations based on followed teams/players with random ordering"""
+    """Get recommendations based on followed teams/players with random ordering.
+
+    The order is a shuffle seeded by the user, the day and an optional ?seed
+    the client keeps for one browsing session, so later pages continue the
+    same list without repeats.
+    """
     try:
         page = request.args.get('page', 1, type=int)
         search = request.args.get('search', '').strip().lower()
+        session = abs(request.args.get('seed', 0, type=int))
         per_page = 5
 
-        # Get followed teams and players names
-        followed_teams = [team.get('name', '') for team in (current_user.followed_teams or [])]
-        followed_players = [player.get('fullName', '') for player in (current_user.followed_players or [])]
+        followed_teams, followed_players = followed_names(current_user)
 
-        # Build query to get random recommendations from mlb_highlights
-        if not followed_teams and not followed_players:
-            # If no follows, return random highlights
-            query = text("""
-                SELECT id as reel_id
-                FROM mlb_highlights 
-                ORDER BY random()
-                LIMIT :limit OFFSET :offset
-            """)
-            params = {
-                'limit': per_page,
-                'offset': (page - 1) * per_page
-            }
-        else:
-            # Return highlights based on followed teams/players
-            query = text("""
-                SELECT id as reel_id
-                FROM mlb_highlights 
-                WHERE home_team = ANY(:teams)
-                   OR away_team = ANY(:teams)
-                   OR player = ANY(:players)
-                ORDER BY random()
-                LIMIT :limit OFFSET :offset
-            """)
-            params = {
-                'teams': followed_teams,
-                'players': followed_players,
-                'limit': per_page,
-                'offset': (page - 1) * per_page
-            }
-
-        # Execute query with parameters
-        engine = create_engine(init_connection_pool())
-        with engine.connect() as connection:
-            result = connection.execute(query, params)
-            recommendations = [{'reel_id': row[0]} for row in result]
-
-        # Check if there are more results
-        has_more = len(recommendations) == per_page
+        # A page is a slice of the cached shuffle of the followed teams'/players' highlights (or all of them)
+        shuffled = follow_shuffle(current_user.client_id, datetime.utcnow().date().toordinal(), session,
+                                  tuple(sorted(followed_teams)), tuple(sorted(followed_players)),
+                                  get_catalog().version)
+        offset = (page - 1) * per_page
+        recommendations = [{'reel_id': reel_id} for reel_id in shuffled[offset:offset + per_page]]
+        has_more = offset + per_page < len(shuffled)
 
         return jsonify({
             'success': True,
@@ -884,6 +1016,35 @@ def get_video_url_endpoint():
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+@app.route('/api/mlb/videos', methods=['GET', 'POST'])
+def get_video_urls_endpoint():
+    """Video URLs and metadata for many play IDs at once, in request order"""
+    try:
+        if request.method == 'POST':
+            play_ids = (request.get_json() or {}).get('play_ids', [])
+        else:
+            play_ids = [play_id for value in request.args.getlist('play_ids') for play_id in value.split(',')]
+        play_ids = [str(play_id) for play_id in play_ids if play_id]
+        if not play_ids:
+            return jsonify({'success': False, 'message': 'Play IDs are required'}), 400
+        if len(play_ids) > VIDEOS_MAX_IDS:
+            return jsonify({'success': False, 'message': f'At most {VIDEOS_MAX_IDS} play IDs per request'}), 400
+
+        found = cached_get_video_urls(play_ids)
+        videos = []
+        for play_id in play_ids:
+            video_data = found.get(play_id)
+            if video_data:
+                videos.append({'play_id': play_id, 'success': True, **video_data})
+            else:
+                videos.append({'play_id': play_id, 'success': False, 'message': 'Video not found'})
+        return jsonify({'success': True, 'videos': videos})
+
+    except Exception as e:
+        logger.error(f"Error fetching video URLs: {str(e)}", exc_info=True)
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
 @app.route('/api/showcase/compile', methods=['POST'])
 @token_required
 def compile_showcase(current_user):
@@ -11,7 +11,16 @@ import random
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-db = SQLAlchemy()
+class SharedEngineSQLAlchemy(SQLAlchemy):
+    """SQLAlchemy whose engine comes from db.get_engine, so the models share its metered pool"""
+
+    def create_engine(self, sa_url, engine_opts):
+        # db imports this module, so it is imported only once Flask-SQLAlchemy builds its engine
+        from db import get_engine
+        return get_engine(sa_url.render_as_string(hide_password=False))
+
+
+db = SharedEngineSQLAlchemy()
 
 #after imports
 print("10. Auth.py imported, directory:", os.getcwd())
@@ -0,0 +1,290 @@
+"""Performance benchmarks for the recommender.
+
+Usage:
+    python benchmark.py scoring [--users 200] [--reels 1000 10000 100000]
+    python benchmark.py topn [--users 10000] [--reels 20000] [--size 100]
+    python benchmark.py neighbors [--users 10000 100000 1000000] [--index ivf]
+    python benchmark.py als [--users 10000 100000] [--factors 64]
+    python benchmark.py codec [--dimensions 256 768 1536] [--url postgresql+psycopg2://...]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix, random as sparse_random
+from psycopg2.extensions import adapt
+from sklearn.neighbors import NearestNeighbors
+from sqlalchemy import create_engine
+
+from rating_matrix import RatingMatrix
+from scoring import score_reels, paginate
+from topn import build_top_n
+from neighbor_index import make_index
+from als import ImplicitALS
+from vector_codec import Vector, register_vector_adapter
+
+
+def synthetic_ratings(num_users, num_reels, density=0.01, seed=0):
+    """Random sparse users x reels matrix of integer ratings 1-5"""
+    rng = np.random.default_rng(seed)
+    matrix = sparse_random(num_users, num_reels, density=density, format='csr', random_state=rng,
+                           data_rvs=lambda n: rng.integers(1, 6, size=n))
+    return matrix.astype(np.float64)
+
+
+def clustered_ratings(num_users, num_reels, ratings_per_user=20, clusters=100, seed=0):
+    """Synthetic ratings with taste clusters, so that nearest neighbors are meaningful.
+
+    Each user belongs to a cluster and draws 80% of their reels from that
+    cluster's pool of 5 x ratings_per_user reels and the rest uniformly from
+    the whole catalog.
+    """
+    rng = np.random.default_rng(seed)
+    pool_size = 5 * ratings_per_user
+    pools = rng.integers(0, num_reels, size=(clusters, pool_size))
+    user_clusters = rng.integers(0, clusters, size=num_users)
+
+    users = np.repeat(np.arange(num_users), ratings_per_user)
+    from_pool = rng.random(len(users)) < 0.8
+    reels = rng.integers(0, num_reels, size=len(users))
+    picks = rng.integers(0, pool_size, size=len(users))
+    reels[from_pool] = pools[user_clusters[users[from_pool]], picks[from_pool]]
+    ratings = rng.integers(1, 6, size=len(users)).astype(np.float32)
+
+    matrix = csr_matrix((ratings, (users, reels)), shape=(num_users, num_reels))
+    matrix.sum_duplicates()
+    return matrix
+
+
+def legacy_scores(user_index, indices, user_reel_matrix, reel_ids):
+    """The original nested-loop scoring from cfknn.recommend_reels, over the given reels"""
+    reel_scores = {}
+    for i in indices[0]:
+        if i == user_index:
+            continue
+        for reel_id in reel_ids:
+            if user_reel_matrix.iloc[user_index][reel_id] == 0:
+                reel_scores[reel_id] = reel_scores.get(reel_id, 0) + user_reel_matrix.iloc[i][reel_id]
+    return sorted(reel_scores.items(), key=lambda x: x[1], reverse=True)
+
+
+def _timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_scoring(args):
+    print(f"{'reels':>8} {'legacy (s)':>14} {'vectorized (ms)':>16} {'speedup':>10}")
+    for num_reels in args.reels:
+        ratings = synthetic_ratings(args.users, num_reels, args.density, args.seed)
+        model_knn = NearestNeighbors(metric='cosine', algorithm='brute', n_neighbors=10)
+        model_knn.fit(ratings)
+        user_index = 0
+        distances, indices = model_knn.kneighbors(ratings[user_index], n_neighbors=min(20, args.users))
+
+        def vectorized():
+            scores, candidates = score_reels(ratings, user_index, indices[0], distances[0])
+            paginate(scores, candidates, args.limit, 0)
+
+        vectorized_seconds = _timed(vectorized, args.repeat)
+
+        # The loop is far too slow to run over 100k reels, so it is timed on a prefix of
+        # the columns and extrapolated. Each cell rebuilds a full pandas row, so the
+        # extrapolation is a lower bound.
+        frame = pd.DataFrame(ratings.toarray())
+        sampled = frame.columns[:min(num_reels, args.legacy_reels)]
+        legacy_seconds = _timed(lambda: legacy_scores(user_index, indices, frame, sampled), 1)
+        legacy_seconds *= num_reels / len(sampled)
+        marker = '~' if len(sampled) < num_reels else ' '
+
+        print(f"{num_reels:>8} {marker}{legacy_seconds:>13.2f} {vectorized_seconds * 1000:>16.3f} "
+              f"{legacy_seconds / vectorized_seconds:>9.0f}x")
+
+
+def bench_topn(args):
+    ratings = synthetic_ratings(args.users, args.reels, args.density, args.seed).astype(np.float32)
+    matrix = RatingMatrix(ratings, np.arange(args.users), np.arange(args.reels))
+    model_knn = NearestNeighbors(metric='cosine', algorithm='brute', n_neighbors=10, n_jobs=-1)
+    model_knn.fit(matrix.ratings)
+
+    table = build_top_n(model_knn, matrix, args.size)
+    print(f"top {args.size} for {args.users} users x {args.reels} reels: {table.build_seconds:.2f}s, "
+          f"{table.users_per_second:.0f} users/s, "
+          f"{(table.positions.nbytes + table.scores.nbytes) / 2 ** 20:.1f} MB")
+
+    user_index = args.users // 2
+    lookup = _timed(lambda: table.page(user_index, 5, 10), args.repeat)
+
+    def live():
+        distances, indices = model_knn.kneighbors(matrix.ratings[user_index], n_neighbors=20)
+        scores, candidates = score_reels(matrix.ratings, user_index, indices[0], distances[0])
+        paginate(scores, candidates, 5, 10)
+
+    print(f"page lookup: {lookup * 1e6:.1f} us, live query: {_timed(live, args.repeat) * 1000:.2f} ms")
+
+
+def bench_neighbors(args):
+    print(f"{'users':>9} {'index':>6} {'fit (s)':>9} {'p50 (ms)':>9} {'p99 (ms)':>9} {'recall@' + str(args.k):>10}")
+    rng = np.random.default_rng(args.seed)
+    for num_users in args.users:
+        ratings = clustered_ratings(num_users, args.reels, args.ratings_per_user, args.clusters, args.seed)
+        queries = rng.choice(num_users, size=min(args.queries, num_users), replace=False)
+
+        reference = None
+        for kind in ['brute'] + [kind for kind in args.index if kind != 'brute']:
+            start = time.perf_counter()
+            index = make_index(kind).fit(ratings)
+            fit_seconds = time.perf_counter() - start
+
+            latencies, found = [], []
+            for q in queries:
+                start = time.perf_counter()
+                _, indices = index.kneighbors(ratings[q], n_neighbors=args.k)
+                latencies.append(time.perf_counter() - start)
+                found.append(indices[0])
+            if reference is None:
+                reference = found
+            recall = np.mean([len(np.intersect1d(a, b)) / args.k for a, b in zip(found, reference)])
+
+            p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+            print(f"{num_users:>9} {kind:>6} {fit_seconds:>9.2f} {p50:>9.2f} {p99:>9.2f} {recall:>10.3f}")
+
+
+def bench_als(args):
+    print(f"{'users':>9} {'model':>6} {'fit (s)':>9} {'p50 (ms)':>9} {'p99 (ms)':>9} {'memory (MB)':>12}")
+    rng = np.random.default_rng(args.seed)
+    for num_users in args.users:
+        ratings = clustered_ratings(num_users, args.reels, args.ratings_per_user, args.clusters, args.seed)
+        queries = rng.choice(num_users, size=min(args.queries, num_users), replace=False)
+        n_neighbors = min(20, num_users)
+
+        start = time.perf_counter()
+        index = make_index('brute').fit(ratings)
+        knn_fit = time.perf_counter() - start
+
+        def knn_query(user_index):
+            distances, indices = index.kneighbors(ratings[user_index], n_neighbors=n_neighbors)
+            scores, candidates = score_reels(ratings, user_index, indices[0], distances[0])
+            paginate(scores, candidates, args.limit)
+
+        start = time.perf_counter()
+        als = ImplicitALS(factors=args.factors, iterations=args.iterations, threads=args.threads).fit(ratings)
+        als_fit = time.perf_counter() - start
+
+        def als_query(user_index):
+            scores = als.scores(user_index)
+            candidates = np.ones(len(scores), dtype=bool)
+            candidates[ratings[user_index].indices] = False
+            paginate(scores, candidates, args.limit)
+
+        # Brute force keeps the rating matrix itself as its model
+        knn_bytes = ratings.data.nbytes + ratings.indices.nbytes + ratings.indptr.nbytes
+        als_bytes = als.user_factors_.nbytes + als.item_factors_.nbytes
+        for name, fit_seconds, query, model_bytes in [('knn', knn_fit, knn_query, knn_bytes),
+                                                      ('als', als_fit, als_query, als_bytes)]:
+            latencies = [_timed(lambda: query(q), 1) for q in queries]
+            p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+            print(f"{num_users:>9} {name:>6} {fit_seconds:>9.2f} {p50:>9.2f} {p99:>9.2f} "
+                  f"{model_bytes / 2 ** 20:>12.1f}")
+
+
+def _legacy_vector_parameter(embedding):
+    """How search_feature used to bind an embedding: a formatted string, quoted by psycopg2"""
+    embedding = np.array(embedding).tolist()
+    return f"[{', '.join(map(str, embedding))}]"
+
+
+def bench_codec(args):
+    register_vector_adapter()
+    rng = np.random.default_rng(args.seed)
+    connection = create_engine(args.url).raw_connection() if args.url else None
+    print(f"{'dims':>6} {'binding':>8} {'encode (us)':>12} {'bytes':>7}" +
+          (f" {'round trip (ms)':>16}" if connection else ''))
+    try:
+        for dimensions in args.dimensions:
+            vector = rng.standard_normal(dimensions).astype(np.float32)
+            # The embedding API hands back Python floats; the embedding cache hands back float32 arrays
+            cases = [('string', vector.astype(np.float64).tolist(), _legacy_vector_parameter,
+                      "SELECT vector_dims(CAST(%s AS vector))"),
+                     ('codec', vector, Vector, "SELECT vector_dims(%s)")]
+            for name, embedding, bind, query in cases:
+                encode_seconds = _timed(lambda: adapt(bind(embedding)).getquoted(), args.repeat)
+                size = len(adapt(bind(embedding)).getquoted())
+                line = f"{dimensions:>6} {name:>8} {encode_seconds * 1e6:>12.1f} {size:>7}"
+                if connection:
+                    with connection.cursor() as cursor:
+                        round_trip = _timed(lambda: (cursor.execute(query, (bind(embedding),)), cursor.fetchone()),
+                                            args.repeat)
+                    line += f" {round_trip * 1000:>16.3f}"
+                print(line)
+    finally:
+        if connection:
+            connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    scoring = subparsers.add_parser('scoring', help='nested-loop vs sparse neighbor scoring')
+    scoring.add_argument('--users', type=int, default=200)
+    scoring.add_argument('--reels', type=int, nargs='+', default=[1000, 10000, 100000])
+    scoring.add_argument('--density', type=float, default=0.01)
+    scoring.add_argument('--limit', type=int, default=5)
+    scoring.add_argument('--legacy-reels', type=int, default=500,
+                         help='columns the legacy loop is actually run over before extrapolating')
+    scoring.add_argument('--repeat', type=int, default=5)
+    scoring.add_argument('--seed', type=int, default=0)
+    scoring.set_defaults(func=bench_scoring)
+
+    topn = subparsers.add_parser('topn', help='batch top-N precomputation throughput')
+    topn.add_argument('--users', type=int, default=10000)
+    topn.add_argument('--reels', type=int, default=20000)
+    topn.add_argument('--density', type=float, default=0.002)
+    topn.add_argument('--size', type=int, default=100)
+    topn.add_argument('--repeat', type=int, default=5)
+    topn.add_argument('--seed', type=int, default=0)
+    topn.set_defaults(func=bench_topn)
+
+    neighbors = subparsers.add_parser('neighbors', help='recall and latency of neighbor indexes vs brute force')
+    neighbors.add_argument('--users', type=int, nargs='+', default=[10000, 100000, 1000000])
+    neighbors.add_argument('--reels', type=int, default=20000)
+    neighbors.add_argument('--ratings-per-user', type=int, default=20)
+    neighbors.add_argument('--clusters', type=int, default=100)
+    neighbors.add_argument('--index', nargs='+', default=['ivf'])
+    neighbors.add_argument('--k', type=int, default=20)
+    neighbors.add_argument('--queries', type=int, default=200)
+    neighbors.add_argument('--seed', type=int, default=0)
+    neighbors.set_defaults(func=bench_neighbors)
+
+    als = subparsers.add_parser('als', help='implicit ALS vs user KNN fit time, query latency and memory')
+    als.add_argument('--users', type=int, nargs='+', default=[10000, 100000])
+    als.add_argument('--reels', type=int, default=20000)
+    als.add_argument('--ratings-per-user', type=int, default=20)
+    als.add_argument('--clusters', type=int, default=100)
+    als.add_argument('--factors', type=int, default=64)
+    als.add_argument('--iterations', type=int, default=15)
+    als.add_argument('--threads', type=int, default=None)
+    als.add_argument('--limit', type=int, default=5)
+    als.add_argument('--queries', type=int, default=200)
+    als.add_argument('--seed', type=int, default=0)
+    als.set_defaults(func=bench_als)
+
+    codec = subparsers.add_parser('codec', help='cost of binding a query embedding as a string vs vector_codec')
+    codec.add_argument('--dimensions', type=int, nargs='+', default=[256, 768, 1536])
+    codec.add_argument('--repeat', type=int, default=200)
+    codec.add_argument('--url', help='also time a round trip through this database (needs the vector extension)')
+    codec.add_argument('--seed', type=int, default=0)
+    codec.set_defaults(func=bench_codec)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
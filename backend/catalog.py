@@ -0,0 +1,269 @@
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from db import load_highlights
+from text_index import TextIndex
+
+logger = logging.getLogger(__name__)
+
+# Seconds between reloads of mlb_highlights
+REFRESH_INTERVAL = float(os.getenv('CATALOG_REFRESH_INTERVAL', 60 * 60))
+# Seconds before retrying a failed load; doubles with each further failure, up to REFRESH_INTERVAL
+RETRY_DELAY = float(os.getenv('CATALOG_RETRY_DELAY', 5))
+# Seconds a lookup waits for the first load to finish before it is served from the empty catalog
+FIRST_LOAD_WAIT = float(os.getenv('CATALOG_FIRST_LOAD_WAIT', 10))
+TAG_COLUMNS = ('player', 'home_team', 'away_team')
+
+# Reel columns hold one entry per distinct id, with the metadata of its first
+# row. Row columns keep every table row, so a highlight stored once per player
+# is found under each of them. tags maps each TAG_COLUMNS column to
+# (positions, offsets): the reels of name code c are positions[offsets[c]:offsets[c + 1]].
+# text_index covers every row's title, blurb, player and teams, by reel position.
+CatalogData = namedtuple('CatalogData', [
+    'reel_ids', 'id_index', 'urls', 'titles', 'blurbs',
+    'names', 'name_codes', 'row_reels', 'tags', 'text_index', 'lower_titles', 'lower_blurbs',
+])
+
+
+def _grouped(codes, row_reels, num_names):
+    """(positions, offsets) listing the reel of every row under its name code; rows without a name are skipped"""
+    rows = np.flatnonzero(codes >= 0)
+    rows = rows[np.argsort(codes[rows], kind='stable')]
+    offsets = np.zeros(num_names + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codes[rows], minlength=num_names), out=offsets[1:])
+    return row_reels[rows], offsets
+
+
+def build_catalog(rows):
+    """CatalogData from a load_highlights frame"""
+    rows = rows.reset_index(drop=True)
+    row_reels, reel_ids = pd.factorize(rows['reel_id'].astype(str))
+    row_reels = row_reels.astype(np.int32)
+    first = rows['reel_id'].astype(str).drop_duplicates().index.to_numpy()
+
+    # One name vocabulary for players and teams, as followed names are matched against both
+    codes, names = pd.factorize(pd.concat([rows[column] for column in TAG_COLUMNS], ignore_index=True))
+    names = np.asarray(names, dtype=object)
+    tags = {column: _grouped(column_codes.astype(np.int32), row_reels, len(names))
+            for column, column_codes in zip(TAG_COLUMNS, np.split(codes, len(TAG_COLUMNS)))}
+
+    titles = rows['title'].to_numpy(dtype=object)[first]
+    blurbs = rows['blurb'].to_numpy(dtype=object)[first]
+    return CatalogData(
+        reel_ids=np.asarray(reel_ids, dtype=object),
+        id_index=pd.Index(reel_ids),
+        urls=rows['url'].to_numpy(dtype=object)[first],
+        titles=titles,
+        blurbs=blurbs,
+        names=names,
+        name_codes={name: code for code, name in enumerate(names)},
+        row_reels=row_reels,
+        tags=tags,
+        text_index=TextIndex.build(rows, row_reels, len(reel_ids)),
+        lower_titles=pd.Series(titles, dtype=object).fillna('').astype(str).str.lower().to_numpy(dtype=object),
+        lower_blurbs=pd.Series(blurbs, dtype=object).fillna('').astype(str).str.lower().to_numpy(dtype=object),
+    )
+
+
+EMPTY_ROWS = pd.DataFrame(columns=['reel_id', 'url', 'title', 'blurb', *TAG_COLUMNS])
+
+
+class HighlightCatalog:
+    """In-process copy of mlb_highlights with indexes by id, player, home_team and away_team.
+
+    The table is reference data, so it is loaded whole every refresh_interval
+    seconds into columnar arrays and swapped in as one CatalogData. Metadata
+    lookups, follow filtering, random sampling and keyword matching are then
+    served from memory; only the reloads reach the database.
+
+    Reloads run on a daemon thread started by start(), never on a request.
+    After a failed load the previous catalog stays in use and the load is
+    retried after retry_delay seconds, doubling with each further failure.
+    Lookups made while the first load is running wait up to first_load_wait
+    seconds for it.
+    """
+
+    def __init__(self, refresh_interval=REFRESH_INTERVAL, retry_delay=RETRY_DELAY, first_load_wait=FIRST_LOAD_WAIT):
+        self.refresh_interval = refresh_interval
+        self.retry_delay = retry_delay
+        self.first_load_wait = first_load_wait
+        self._data = build_catalog(EMPTY_ROWS)
+        self.version = 0
+        self.refreshed_at = None
+        self.last_refresh_seconds = 0.0
+        self.failures = 0
+        self._lock = threading.Lock()
+        self._first_attempt = threading.Event()
+        self._thread = None
+
+    @property
+    def age(self):
+        if self.refreshed_at is None:
+            return None
+        return time.time() - self.refreshed_at
+
+    def refresh(self):
+        """Reload the table now; returns whether it loaded (the previous catalog is kept if not)"""
+        with self._lock:
+            start = time.perf_counter()
+            rows = load_highlights()
+            if rows is None:
+                self.failures += 1
+                return False
+            self._data = build_catalog(rows)
+            self.version += 1
+            self.refreshed_at = time.time()
+            self.last_refresh_seconds = time.perf_counter() - start
+            self.failures = 0
+            logger.info(f"Loaded {len(self._data.reel_ids)} highlights ({len(rows)} rows) "
+                        f"in {self.last_refresh_seconds:.3f}s")
+            return True
+
+    def start(self):
+        """Start the reload thread, once"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='highlight-catalog', daemon=True)
+                self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            try:
+                loaded = self.refresh()
+            except Exception as e:
+                logger.error(f"Loading the highlight catalog failed: {str(e)}", exc_info=True)
+                with self._lock:
+                    self.failures += 1
+                loaded = False
+            self._first_attempt.set()
+            delay = self.refresh_interval if loaded else \
+                min(self.retry_delay * 2 ** (self.failures - 1), self.refresh_interval)
+            if not loaded:
+                logger.warning(f"Highlight catalog not loaded ({self.failures} failures); retrying in {delay:.0f}s")
+            time.sleep(delay)
+
+    def current(self):
+        """The current CatalogData, waiting for the first load if it is still running"""
+        if self.refreshed_at is None and self._thread is not None:
+            self._first_attempt.wait(self.first_load_wait)
+        return self._data
+
+    def count(self):
+        return len(self.current().reel_ids)
+
+    def positions(self, reel_ids):
+        """Catalog position of each reel id, -1 for ids not in the catalog"""
+        data = self.current()
+        return data.id_index.get_indexer([str(reel_id) for reel_id in reel_ids])
+
+    def reel_ids(self, positions):
+        return self.current().reel_ids[positions]
+
+    def metadata(self, reel_id):
+        """{'video_url', 'title', 'blurb'} of one highlight, or None"""
+        return self.metadata_many([reel_id]).get(str(reel_id))
+
+    def metadata_many(self, reel_ids):
+        """{reel_id: metadata} for the ids in the catalog; missing ids are left out"""
+        data = self.current()
+        reel_ids = [str(reel_id) for reel_id in reel_ids]
+        positions = data.id_index.get_indexer(reel_ids)
+        return {reel_id: {'video_url': data.urls[position], 'title': data.titles[position],
+                          'blurb': data.blurbs[position]}
+                for reel_id, position in zip(reel_ids, positions) if position >= 0}
+
+    def followed(self, followed_teams=(), followed_players=()):
+        """Sorted positions of highlights whose home or away team, or player, is followed"""
+        data = self.current()
+        lookups = [(column, name) for name in followed_teams for column in ('home_team', 'away_team')]
+        lookups += [('player', name) for name in followed_players]
+        found = []
+        for column, name in lookups:
+            code = data.name_codes.get(name)
+            if code is not None:
+                positions, offsets = data.tags[column]
+                found.append(positions[offsets[code]:offsets[code + 1]])
+        return np.unique(np.concatenate(found)) if found else np.array([], dtype=np.int32)
+
+    def tagged(self):
+        """(reel_ids, {name: sorted positions in reel_ids}) for every player and team name"""
+        data = self.current()
+        tagged = {}
+        for code, name in enumerate(data.names):
+            parts = [positions[offsets[code]:offsets[code + 1]] for positions, offsets in data.tags.values()]
+            tagged[name] = np.unique(np.concatenate(parts))
+        return data.reel_ids, tagged
+
+    def sample(self, size, positions=None, rng=None):
+        """Up to size distinct random reel ids, drawn from positions or the whole catalog"""
+        data = self.current()
+        rng = rng or np.random.default_rng()
+        population = len(data.reel_ids) if positions is None else len(positions)
+        chosen = rng.choice(population, size=min(size, population), replace=False)
+        return data.reel_ids[chosen if positions is None else positions[chosen]]
+
+    def shuffled(self, seed, positions=None):
+        """Reel ids of positions (or the whole catalog) in a random order that depends only on seed and the ids.
+
+        Ids are sorted before the permutation, so the same seed gives the same
+        order after a reload that keeps the same highlights.
+        """
+        data = self.current()
+        reel_ids = np.sort(data.reel_ids if positions is None else data.reel_ids[positions])
+        return reel_ids[np.random.default_rng(seed).permutation(len(reel_ids))]
+
+    def search(self, terms, phrase=''):
+        """Positions of highlights matching every term, best first, from the text index.
+
+        A term matches a word of the title, blurb, player or teams that it
+        equals or starts with. Highlights whose title, then blurb, equals the
+        whole phrase come first; the rest are ordered by TextIndex score, ties
+        in catalog order.
+        """
+        data = self.current()
+        scores = data.text_index.scores(terms)
+        positions = np.flatnonzero(scores)
+        phrase = phrase.lower()
+        exact = np.where(data.lower_titles[positions] == phrase, 3, np.where(data.lower_blurbs[positions] == phrase, 2, 0))
+        return positions[np.lexsort((positions, -scores[positions], -exact))]
+
+    def matches(self, reel_ids, terms):
+        """Whether each reel id is in the catalog and matches every term, as search() would"""
+        data = self.current()
+        positions = data.id_index.get_indexer([str(reel_id) for reel_id in reel_ids])
+        # Position -1 (not in the catalog) reads the extra False slot
+        return np.append(data.text_index.scores(terms) > 0, False)[positions]
+
+    def status(self):
+        age = self.age
+        data = self._data
+        return {
+            'highlights': len(data.reel_ids),
+            'rows': len(data.row_reels),
+            'names': len(data.names),
+            'search_tokens': len(data.text_index.vocabulary),
+            'age_seconds': None if age is None else round(age, 3),
+            'last_refresh_seconds': round(self.last_refresh_seconds, 4),
+            'version': self.version,
+            'failures': self.failures,
+        }
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """Process-wide HighlightCatalog, its reload thread started on first use"""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = HighlightCatalog().start()
+        return _catalog
@@ -1,112 +1,392 @@
-import pandas as pd
-import numpy as np
-from scipy.sparse import csr_matrix
-from sklearn.neighbors import NearestNeighbors
-import joblib
+import copy
+import logging
 import os
-from sqlalchemy import create_engine
-from db import load_data
-
-# Global variables to cache the model and matrix
-_cached_model = None
-_cached_matrix = None
-
-def build_and_save_model(user_reel_matrix, model_path='knn_model.pkl'):
-    user_reel_matrix = user_reel_matrix.astype(float)
-    user_reel_matrix_sparse = csr_matrix(user_reel_matrix.values)  
-    model_knn = NearestNeighbors(metric='cosine', algorithm='brute', n_neighbors=10, n_jobs=-1)
-    model_knn.fit(user_reel_matrix_sparse)
-    joblib.dump((model_knn, user_reel_matrix), model_path)
-    print(f"Model trained and saved to {model_path}")
-    return model_knn, user_reel_matrix
-
-def get_cached_model(model_path='knn_model.pkl'):
-    """Get model from cache or build it if not exists"""
-    global _cached_model, _cached_matrix
-    
-    if _cached_model is not None and _cached_matrix is not None:
-        print("Using cached model")
-        return _cached_model, _cached_matrix
-        
-    # Try to load from file
-    abs_model_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), model_path)
-    if os.path.exists(abs_model_path):
-        print(f"Loading model from {abs_model_path}...")
-        _cached_model, _cached_matrix = joblib.load(abs_model_path)
-        return _cached_model, _cached_matrix
+import shutil
+import time
+from ratings_snapshot import get_snapshot
+import numpy as np
+from scoring import score_reels, paginate, unrated_mask
+from topn import build_top_n, neighbor_graph, CHUNK_CELLS
+from item_knn import build_item_neighbors, score_items
+from neighbor_index import make_index
+from model_store import write_artifact, read_artifact
+from als import ImplicitALS, implicit_weights
+from db import load_implicit_feedback
+
+logger = logging.getLogger(__name__)
+
+# Neighbor weighting for scoring: 'uniform' or 'similarity' (1 - cosine distance)
+NEIGHBOR_WEIGHTING = os.getenv('CFKNN_WEIGHTING', 'uniform')
+NEIGHBOR_COUNT = 20
+# Neighbor index backend: 'brute' (exact) or 'ivf' (approximate, see neighbor_index.ClusteredIndex)
+NEIGHBOR_INDEX = os.getenv('CFKNN_INDEX', 'brute')
+NEIGHBOR_INDEX_PARAMS = {'ivf': {'probes': int(os.getenv('CFKNN_IVF_PROBES', 8))}}.get(NEIGHBOR_INDEX, {})
+# Recommendations precomputed per user on every build (0 disables the table)
+TOPN_SIZE = int(os.getenv('CFKNN_TOPN', 100))
+# 'user' for user-user KNN, 'item' for precomputed item-item neighborhoods, 'als' for implicit matrix factorization
+RECOMMENDER_MODE = os.getenv('CFKNN_MODE', 'user')
+ITEM_NEIGHBOR_COUNT = int(os.getenv('CFKNN_ITEM_NEIGHBORS', 50))
+ALS_PARAMS = {'factors': int(os.getenv('CFKNN_ALS_FACTORS', 64)),
+              'iterations': int(os.getenv('CFKNN_ALS_ITERATIONS', 15)),
+              'alpha': float(os.getenv('CFKNN_ALS_ALPHA', 10.0))}
+# Implicit feedback weights added to a user's rating of a reel for ALS training
+ALS_UPVOTE_WEIGHT = float(os.getenv('CFKNN_ALS_UPVOTE_WEIGHT', 4.0))
+ALS_SAVE_WEIGHT = float(os.getenv('CFKNN_ALS_SAVE_WEIGHT', 5.0))
+
+# Versioned model artifacts written by the background trainer
+MODEL_DIR = os.getenv('MODEL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models'))
+MODEL_VERSIONS_KEPT = 3
+
+
+class ModelState:
+    """A fitted model together with the matrix it was fitted on.
+
+    States are never modified after construction; a new model is published by
+    replacing the reference in _states, so a reader that grabbed a state keeps a
+    consistent model/matrix pair for the whole request.
+    """
+
+    def __init__(self, model, matrix, version, built_at, build_seconds=0.0, high_water_mark=0, change_count=0,
+                 top_n=None, item_neighbors=None):
+        self.model = model
+        self.matrix = matrix
+        self.top_n = top_n
+        self.item_neighbors = item_neighbors
+        self.version = version
+        self.built_at = built_at
+        self.build_seconds = build_seconds
+        self.high_water_mark = high_water_mark
+        self.change_count = change_count
+
+    def refitted(self, matrix, changed=None):
+        """Same build, refitted on a matrix that has had ratings folded in.
+
+        matrix must extend this state's matrix (RatingMatrix.extends): the
+        model, top_n and item_neighbors hold row and column positions.
+        changed lists the rows whose ratings differ, when the caller knows
+        them; otherwise the two matrices are compared.
+        """
+        if changed is None:
+            changed = self.matrix.changed_users(matrix)
+        top_n = self.top_n
+        if top_n is not None:
+            # Users whose own ratings changed must not be served their precomputed (now stale) list
+            top_n = top_n.with_dirty(changed)
+        # Refit a copy so readers of this state keep an untouched index
+        model = copy.copy(self.model).refit(matrix.ratings, changed)
+        return ModelState(model, matrix, self.version, self.built_at, self.build_seconds,
+                          self.high_water_mark, self.change_count, top_n, self.item_neighbors)
+
+
+# Current model per ratings table
+_states = {}
+
+def fit_model(user_reel_matrix):
+    """Cosine neighbor index over the rating rows, of the kind selected by CFKNN_INDEX"""
+    return make_index(NEIGHBOR_INDEX, **NEIGHBOR_INDEX_PARAMS).fit(user_reel_matrix.ratings)
+
+def _artifact_path(table, version, model_dir=MODEL_DIR):
+    return os.path.join(model_dir, f"{table}-knn-{version}")
+
+def _artifact_versions(table, model_dir=MODEL_DIR):
+    prefix = f"{table}-knn-"
+    if not os.path.isdir(model_dir):
+        return []
+    return sorted(int(name[len(prefix):]) for name in os.listdir(model_dir)
+                  if name.startswith(prefix) and name[len(prefix):].isdigit())
+
+def save_model(table, state, model_dir=MODEL_DIR):
+    """Write a versioned memory-mappable artifact atomically and prune old versions"""
+    os.makedirs(model_dir, exist_ok=True)
+    path = _artifact_path(table, state.version, model_dir)
+    write_artifact(path, state.model, state.matrix, state.top_n, state.item_neighbors, {
+        'version': state.version,
+        'built_at': state.built_at,
+        'build_seconds': state.build_seconds,
+        'high_water_mark': state.high_water_mark,
+    })
+    for version in _artifact_versions(table, model_dir)[:-MODEL_VERSIONS_KEPT]:
+        # Workers still mapping an old version keep their pages until they swap
+        shutil.rmtree(_artifact_path(table, version, model_dir), ignore_errors=True)
+    logger.info(f"Model version {state.version} saved to {path}")
+    return path
+
+def latest_model_version(table, model_dir=MODEL_DIR):
+    """Version of the newest saved artifact for a table, or None"""
+    versions = _artifact_versions(table, model_dir)
+    return versions[-1] if versions else None
+
+def load_latest_model(table, model_dir=MODEL_DIR):
+    """Newest saved ModelState for a table, memory-mapped read-only, or None"""
+    versions = _artifact_versions(table, model_dir)
+    if not versions:
+        return None
+    path = _artifact_path(table, versions[-1], model_dir)
+    logger.info(f"Loading model from {path}...")
+    try:
+        model, matrix, top_n, item_neighbors, manifest = read_artifact(path)
+    except Exception as e:
+        logger.error(f"Error loading model {path}: {e}")
+        return None
+    return ModelState(model, matrix, manifest['version'], manifest['built_at'], manifest['build_seconds'],
+                      manifest['high_water_mark'], top_n=top_n, item_neighbors=item_neighbors)
+
+def build_model(table, model_dir=MODEL_DIR):
+    """Full rebuild from the ratings snapshot; returns the new ModelState without publishing it"""
+    snapshot = get_snapshot(table)
+    start = time.perf_counter()
+    matrix = snapshot.refresh()
+    if matrix is None:
+        return None
+    change_count = snapshot.change_count
+    top_n = item_neighbors = None
+    if RECOMMENDER_MODE == 'als':
+        feedback = load_implicit_feedback(ALS_UPVOTE_WEIGHT, ALS_SAVE_WEIGHT)
+        model_knn = ImplicitALS(**ALS_PARAMS).fit(implicit_weights(matrix, feedback))
+        logger.info(f"Factorized {matrix.shape[0]} users x {matrix.shape[1]} reels in {model_knn.fit_seconds_:.2f}s")
     else:
-        print("Model not found, building new model...")
-        # Load data and build model
-        ratings = load_data('user_ratings_db')
-        if ratings is None:
-            return None, None
-            
-        user_reel_matrix = ratings.pivot_table(
-            index='user_id', 
-            columns='reel_id', 
-            values='rating', 
-            fill_value=0
-        )
-        _cached_model, _cached_matrix = build_and_save_model(user_reel_matrix, model_path)
-        return _cached_model, _cached_matrix
+        model_knn = fit_model(matrix)
+    if RECOMMENDER_MODE == 'item':
+        item_neighbors, item_seconds = build_item_neighbors(matrix.ratings, ITEM_NEIGHBOR_COUNT)
+        logger.info(f"Built {ITEM_NEIGHBOR_COUNT} item neighbors for {matrix.shape[1]} reels in {item_seconds:.2f}s")
+    elif RECOMMENDER_MODE == 'user' and TOPN_SIZE > 0:
+        top_n = build_top_n(model_knn, matrix, TOPN_SIZE, NEIGHBOR_COUNT, NEIGHBOR_WEIGHTING)
+        logger.info(f"Precomputed top {TOPN_SIZE} for {matrix.shape[0]} users in {top_n.build_seconds:.2f}s "
+                    f"({top_n.users_per_second or 0:.0f} users/s)")
+    state = ModelState(model_knn, matrix, int(time.time() * 1000), time.time(),
+                       time.perf_counter() - start, snapshot.high_water_mark, change_count, top_n,
+                       item_neighbors)
+    save_model(table, state, model_dir)
+    return state
+
+def publish_model(table, state):
+    """Atomically make state the model served for table"""
+    _states[table] = state
+
+def current_model(table='user_ratings_db'):
+    return _states.get(table)
 
-def recommend_reels(user_id, model_knn, user_reel_matrix, num_recommendations=5, offset=0):
+def _live_state(table):
+    """Published ModelState, refitted first if ratings were folded in since; None until one is built"""
+    state = _states.get(table)
+    if state is None:
+        return None
+
+    snapshot = get_snapshot(table)
+    live_matrix = snapshot.matrix
+    if live_matrix is not None and live_matrix is not state.matrix:
+        if not live_matrix.extends(state.matrix):
+            # Positions differ from the model's (e.g. it was saved by another worker); renumber the snapshot once
+            live_matrix = snapshot.align(state.matrix)
+        # Only replace the state we refitted; a freshly published build wins
+        refitted = state.refitted(live_matrix, snapshot.changes_since(state.matrix))
+        if _states.get(table) is state:
+            _states[table] = refitted
+        state = refitted
+    return state
+
+def get_cached_model(table='user_ratings_db'):
+    """Get the published model and its matrix; (None, None) until one is built"""
+    state = _live_state(table)
+    if state is None:
+        return None, None
+    return state.model, state.matrix
+
+def fold_in_rating(user_id, reel_id, rating, table='user_ratings_db'):
+    """Queue a rating that was just written for the live matrix; the model picks it up after the next merge"""
+    return get_snapshot(table).apply([user_id], [reel_id], [rating]) is not None
+
+def fold_out_rating(user_id, reel_id, table='user_ratings_db'):
+    """Queue the removal of a rating that was just deleted from the live matrix"""
+    return get_snapshot(table).apply([user_id], [reel_id], [0]) is not None
+
+def recommend_reels(user_id, model_knn, user_reel_matrix, num_recommendations=5, offset=0,
+                    weighting=NEIGHBOR_WEIGHTING, top_n=None):
     """Get recommendations for a user"""
     try:
-        print(f"Recommending reels for user {user_id}, offset: {offset}, limit: {num_recommendations}")
-        user_index = user_reel_matrix.index.get_loc(user_id)
+        logger.debug(f"Recommending reels for user {user_id}, offset: {offset}, limit: {num_recommendations}")
+        user_index = user_reel_matrix.user_position(user_id)
+        if user_index is None:
+            logger.debug(f"User {user_id} has no ratings")
+            return [], False
+
+        # Serve from the precomputed table when the page falls inside it
+        page = top_n.page(user_index, num_recommendations, offset) if top_n is not None else None
+        if page is not None:
+            positions, scores, has_more = page
+            return _format_recommendations(user_reel_matrix, positions, scores), bool(has_more)
+
+        rating_rows = user_reel_matrix.ratings
 
-        print(user_id)
-        
         # Get similar users
         distances, indices = model_knn.kneighbors(
-            user_reel_matrix.iloc[user_index, :].values.reshape(1, -1),
-            n_neighbors=20  # Increased for more recommendations
+            rating_rows[user_index],
+            n_neighbors=min(NEIGHBOR_COUNT, rating_rows.shape[0])
         )
-        
-        # Calculate scores for all reels
-        reel_scores = {}
-        for i in indices[0]:
-            if i == user_index:
-                continue
-            for reel_id in user_reel_matrix.columns:
-                if user_reel_matrix.iloc[user_index][reel_id] == 0:
-                    reel_scores[reel_id] = reel_scores.get(reel_id, 0) + user_reel_matrix.iloc[i][reel_id]
 
-        # Sort recommendations by score
-        recommended_reels = sorted(reel_scores.items(), key=lambda x: x[1], reverse=True)
-        
-        # Apply pagination
-        start_idx = offset
-        end_idx = min(offset + num_recommendations, len(recommended_reels))
-        paginated_reels = recommended_reels[start_idx:end_idx]
-        
-        has_more = end_idx < len(recommended_reels)
-        print(f"Found {len(recommended_reels)} total recommendations, returning {len(paginated_reels)} items, has_more: {has_more}")
-        
-        return [{"reel_id": reel_id, "predicted_score": score} for reel_id, score in paginated_reels], has_more
+        # Score every reel at once from the neighbors' rating rows
+        scores, candidates = score_reels(rating_rows, user_index, indices[0], distances[0], weighting)
+        if candidates is None:
+            return [], False
+
+        positions, has_more = paginate(scores, candidates, num_recommendations, offset)
+        logger.debug(f"Found {int(candidates.sum())} total recommendations, returning {len(positions)} items, has_more: {has_more}")
+
+        return _format_recommendations(user_reel_matrix, positions, scores[positions]), has_more
         
     except Exception as e:
-        print(f"Error in recommend_reels: {str(e)}")
+        logger.error(f"Error in recommend_reels: {str(e)}")
         return [], False
 
-def run_main(table, user_id=10, num_recommendations=3, offset=0, model_path='knn_model.pkl'):
-    ratings = load_data(table)
-    if ratings is None:
-        return []
-    user_reel_matrix = ratings.pivot_table(index='user_id', columns='reel_id', values='rating', fill_value=0)
+def recommend_reels_by_item(user_id, item_neighbors, user_reel_matrix, num_recommendations=5, offset=0):
+    """Get recommendations for a user from the precomputed item-item neighborhoods"""
+    try:
+        user_index = user_reel_matrix.user_position(user_id)
+        if user_index is None:
+            logger.debug(f"User {user_id} has no ratings")
+            return [], False
+
+        scores, candidates = score_items(item_neighbors, user_reel_matrix.ratings[user_index])
+        if candidates is None:
+            return [], False
+
+        positions, has_more = paginate(scores, candidates, num_recommendations, offset)
+        return _format_recommendations(user_reel_matrix, positions, scores[positions]), has_more
+
+    except Exception as e:
+        logger.error(f"Error in recommend_reels_by_item: {str(e)}")
+        return [], False
+
+def recommend_reels_by_factors(user_id, model, user_reel_matrix, num_recommendations=5, offset=0):
+    """Get recommendations for a user from the ALS user and reel factors"""
+    try:
+        user_index = user_reel_matrix.user_position(user_id)
+        if user_index is None:
+            logger.debug(f"User {user_id} has no ratings")
+            return [], False
+
+        scores = model.scores(user_index)
+        candidates = unrated_mask(user_reel_matrix.ratings, user_index)[:len(scores)]
+        positions, has_more = paginate(scores, candidates, num_recommendations, offset)
+        return _format_recommendations(user_reel_matrix, positions, scores[positions]), has_more
+
+    except Exception as e:
+        logger.error(f"Error in recommend_reels_by_factors: {str(e)}")
+        return [], False
+
+def _format_recommendations(user_reel_matrix, positions, scores):
+    reel_ids = user_reel_matrix.reel_ids[positions].tolist()
+    return [{"reel_id": reel_id, "predicted_score": float(score)} for reel_id, score in zip(reel_ids, scores)]
+
+def _score_batch(state, user_indices):
+    """(scores, candidates, has_neighbors) for several users at once.
+
+    User mode runs one kneighbors call and one sparse product of the neighbor
+    weights with the rating matrix; item mode one product of the users' rows
+    with the item-neighbor matrix; ALS one dense product of the user factors
+    with the reel factors. Rows match the single-user functions user for user
+    (ALS scores up to float32 rounding, as a matrix product may round
+    differently from a vector product).
+    """
+    ratings = state.matrix.ratings
+    rows = ratings[user_indices]
+    if isinstance(state.model, ImplicitALS):
+        scores = np.asarray(state.model.scores(user_indices), dtype=np.float64)
+        rows = rows[:, :scores.shape[1]]
+        has_neighbors = np.ones(len(user_indices), dtype=bool)
+    elif state.item_neighbors is not None:
+        rows = rows[:, :state.item_neighbors.shape[0]]
+        scores = np.asarray((rows @ state.item_neighbors).todense(), dtype=np.float64)
+        has_neighbors = np.diff(rows.indptr) > 0
+    else:
+        distances, indices = state.model.kneighbors(rows, n_neighbors=min(NEIGHBOR_COUNT, ratings.shape[0]))
+        graph, neighbor_counts = neighbor_graph(indices, distances, ratings.shape[0], NEIGHBOR_WEIGHTING,
+                                                user_indices=user_indices)
+        scores = np.asarray((graph @ ratings).todense(), dtype=np.float64)
+        has_neighbors = neighbor_counts > 0
+    candidates = np.ones(scores.shape, dtype=bool)
+    rated_rows, rated_cols = rows.nonzero()
+    candidates[rated_rows, rated_cols] = False
+    return scores, candidates, has_neighbors
+
+def iter_batch_recommendations(table, user_ids, num_recommendations=5, offset=0):
+    """Yield (user_id, recommendations, has_more) for every user id, in order.
+
+    Pages inside the precomputed top-N table are slices of it; the remaining
+    users are scored together in chunks. recommendations is None for users
+    without ratings, so the caller can serve them a cold-start list instead.
+    """
+    snapshot = get_snapshot(table)
+    if snapshot.matrix is not None:
+        snapshot.refresh_if_stale()
+
+    state = _live_state(table)
+    if state is None:
+        logger.warning("No model built yet")
+        for user_id in user_ids:
+            yield user_id, None, False
+        return
+
+    matrix = state.matrix
+    chunk = max(1, CHUNK_CELLS // max(matrix.shape[1], 1))
+    for begin in range(0, len(user_ids), chunk):
+        chunk_ids = user_ids[begin:begin + chunk]
+        positions = [matrix.user_position(user_id) for user_id in chunk_ids]
+        pages = {}
+        if state.item_neighbors is None and state.top_n is not None:
+            for index in positions:
+                if index is not None:
+                    page = state.top_n.page(index, num_recommendations, offset)
+                    if page is not None:
+                        pages[index] = page
+
+        live = [index for index in dict.fromkeys(positions) if index is not None and index not in pages]
+        if live:
+            scores, candidates, has_neighbors = _score_batch(state, live)
+            for row, index in enumerate(live):
+                if not has_neighbors[row]:
+                    pages[index] = ([], [], False)
+                    continue
+                page_positions, has_more = paginate(scores[row], candidates[row], num_recommendations, offset)
+                pages[index] = (page_positions, scores[row][page_positions], has_more)
+
+        for user_id, index in zip(chunk_ids, positions):
+            if index is None:
+                yield user_id, None, False
+                continue
+            page_positions, page_scores, has_more = pages[index]
+            yield user_id, _format_recommendations(matrix, page_positions, page_scores), bool(has_more)
+
+def recommend_batch(table, user_ids, num_recommendations=5, offset=0):
+    """{user_id: (recommendations, has_more)} for many users; see iter_batch_recommendations"""
+    return {user_id: (recommendations, has_more) for user_id, recommendations, has_more
+            in iter_batch_recommendations(table, user_ids, num_recommendations, offset)}
+
+def run_main(table, user_id=10, num_recommendations=3, offset=0):
+    # Keep the snapshot current; this only reads ratings added since the last refresh.
+    # The initial load and model builds happen on the background trainer.
+    snapshot = get_snapshot(table)
+    if snapshot.matrix is not None:
+        snapshot.refresh_if_stale()
+
+    state = _live_state(table)
+    if state is None:
+        logger.warning("No model built yet")
+        return [], False
+
+    if isinstance(state.model, ImplicitALS):
+        return recommend_reels_by_factors(user_id, state.model, state.matrix, num_recommendations, offset)
 
-    model_knn, user_reel_matrix_loaded = get_cached_model(model_path)
-    if model_knn is None:
-        print("Model not found, building new model...")
-        model_knn, user_reel_matrix_loaded = build_and_save_model(user_reel_matrix, model_path)
+    if state.item_neighbors is not None:
+        return recommend_reels_by_item(user_id, state.item_neighbors, state.matrix, num_recommendations, offset)
 
     recommendations, has_more = recommend_reels(
         user_id, 
-        model_knn, 
-        user_reel_matrix_loaded, 
+        state.model, 
+        state.matrix, 
         num_recommendations,
-        offset
+        offset,
+        top_n=state.top_n
     )
     return recommendations, has_more
 
@@ -0,0 +1,292 @@
+"""Batch embedding of mlb_highlights into the embeddings table.
+
+Builds one text per highlight id from its title, blurb, players and teams,
+skips ids whose stored content_hash already matches that text (and model),
+embeds the rest in batches with bounded concurrency and retry with
+exponential backoff, and writes the vectors with COPY. A checkpoint file
+records the last id written, so an interrupted run picks up after it; it is
+removed once a run completes.
+
+--fake swaps the Gemini API for a deterministic local embedder, and
+--dry-run skips all database writes and the checkpoint; together with --csv
+they need neither API nor database credentials.
+
+Usage:
+    python embed_highlights.py [--table embeddings] [--batch-size 100] [--concurrency 4]
+    python embed_highlights.py --csv mlb_highlights.csv --fake --dry-run [--latency 0.05]
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# The embedding API accepts at most 100 texts per call
+EMBED_BATCH_SIZE = int(os.getenv('EMBED_BATCH_SIZE', 100))
+EMBED_CONCURRENCY = int(os.getenv('EMBED_CONCURRENCY', 4))
+EMBED_RETRIES = int(os.getenv('EMBED_RETRIES', 5))
+# Seconds before the first retry; doubles with each further attempt
+EMBED_BACKOFF = float(os.getenv('EMBED_BACKOFF', 1.0))
+# Vectors written per COPY, and per checkpoint
+WRITE_BATCH_SIZE = int(os.getenv('EMBED_WRITE_BATCH_SIZE', 1000))
+CHECKPOINT_PATH = os.getenv('EMBED_CHECKPOINT_PATH', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'cache', 'embed_checkpoint.json'))
+PROGRESS_INTERVAL = 10
+
+
+def highlight_documents(rows):
+    """One (reel_id, text) row per highlight id, sorted by id, from load_highlights-style rows"""
+    rows = rows.assign(reel_id=rows['reel_id'].astype(str)).fillna({'title': '', 'blurb': '', 'player': ''})
+    grouped = rows.groupby('reel_id', sort=True)
+    documents = grouped[['title', 'blurb', 'home_team', 'away_team']].first()
+    players = grouped['player'].agg(lambda names: ', '.join(dict.fromkeys(name for name in names if name)))
+    teams = documents['home_team'].fillna('') + ', ' + documents['away_team'].fillna('')
+    text = ('Title: ' + documents['title'] + '. Blurb: ' + documents['blurb'] + '. Players: ' + players +
+            '. Teams: ' + teams.str.strip(', ') + '.')
+    return pd.DataFrame({'reel_id': documents.index.to_numpy(dtype=object), 'text': text.to_numpy(dtype=object)})
+
+
+def content_hash(text, model):
+    return sha256(f"{model}\0{text}".encode('utf-8')).hexdigest()
+
+
+class FakeEmbedder:
+    """Deterministic stand-in for the embedding API.
+
+    Each text maps to a unit vector seeded by its hash, so equal texts get
+    equal vectors across runs. latency seconds are slept per call and a
+    failure_rate share of calls raise, to exercise concurrency and retries.
+    """
+
+    def __init__(self, dimensions=768, latency=0.0, failure_rate=0.0, seed=0):
+        self.dimensions = dimensions
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.model = f"fake-{dimensions}"
+        self._random = random.Random(seed)
+
+    def __call__(self, texts):
+        if self.latency:
+            time.sleep(self.latency)
+        if self._random.random() < self.failure_rate:
+            raise RuntimeError("Fake embedding failure")
+        vectors = []
+        for text in texts:
+            seed = int.from_bytes(sha256(text.encode('utf-8')).digest()[:8], 'little')
+            vector = np.random.default_rng(seed).standard_normal(self.dimensions, dtype=np.float32)
+            vectors.append(vector / np.linalg.norm(vector))
+        return vectors
+
+
+def with_retries(call, retries=EMBED_RETRIES, backoff=EMBED_BACKOFF, stats=None):
+    """call(), retried up to retries times with exponential backoff and full jitter"""
+    for attempt in range(retries + 1):
+        try:
+            return call()
+        except Exception as e:
+            if attempt == retries:
+                raise
+            if stats is not None:
+                stats['retries'] += 1
+            delay = random.uniform(0, backoff * 2 ** attempt)
+            logger.warning(f"Embedding batch failed ({str(e)}), retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+
+def embed_all(embed, texts):
+    """embed(texts), checked to return one vector per text"""
+    vectors = embed(texts)
+    if vectors is None or len(vectors) != len(texts):
+        raise ValueError(f"Embedding returned {0 if vectors is None else len(vectors)} vectors for {len(texts)} texts")
+    return vectors
+
+
+def embed_batches(batches, embed, concurrency=EMBED_CONCURRENCY, retries=EMBED_RETRIES, backoff=EMBED_BACKOFF,
+                  stats=None):
+    """Yield (batch, vectors) for each frame of batches, in order, with at most concurrency calls in flight.
+
+    A call that returns a vector count other than its text count is retried
+    like a failed one. A batch that still fails after its retries raises from
+    this generator.
+    """
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='embed') as pool:
+        pending = deque()
+        for batch in batches:
+            texts = batch['text'].tolist()
+            pending.append((batch, pool.submit(with_retries, lambda texts=texts: embed_all(embed, texts),
+                                               retries, backoff, stats)))
+            if len(pending) >= concurrency:
+                batch, future = pending.popleft()
+                yield batch, future.result()
+        while pending:
+            batch, future = pending.popleft()
+            yield batch, future.result()
+
+
+def load_checkpoint(path, table, model):
+    """Last id written by an unfinished run for this table and model, or None"""
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if checkpoint.get('table') != table or checkpoint.get('model') != model:
+        return None
+    return checkpoint.get('last_id')
+
+
+def save_checkpoint(path, table, model, last_id, rows):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temporary = f"{path}.tmp"
+    with open(temporary, 'w') as f:
+        json.dump({'table': table, 'model': model, 'last_id': last_id, 'rows': rows, 'updated_at': time.time()}, f)
+    os.replace(temporary, path)
+
+
+def run(documents, embed, model, write, stored_hashes=None, table='embeddings', checkpoint_path=CHECKPOINT_PATH,
+        resume=True, batch_size=EMBED_BATCH_SIZE, write_size=WRITE_BATCH_SIZE, concurrency=EMBED_CONCURRENCY,
+        retries=EMBED_RETRIES, backoff=EMBED_BACKOFF):
+    """Embed and write every document whose content changed; returns run statistics.
+
+    documents are highlight_documents() rows sorted by reel_id. write(rows)
+    takes (reel_id, vector, content_hash) rows and returns whether they were
+    stored; the checkpoint only advances past rows write() accepted. With
+    checkpoint_path None no checkpoint is read or written.
+    """
+    start = time.perf_counter()
+    stats = {'documents': len(documents), 'resumed_after': None, 'skipped_checkpoint': 0, 'skipped_unchanged': 0,
+             'embedded': 0, 'written': 0, 'calls': 0, 'retries': 0, 'complete': False}
+    documents = documents.assign(content_hash=[content_hash(text, model) for text in documents['text']])
+
+    last_id = load_checkpoint(checkpoint_path, table, model) if resume and checkpoint_path else None
+    if last_id is not None:
+        after = documents['reel_id'].to_numpy(dtype=object) > last_id
+        stats['resumed_after'] = last_id
+        stats['skipped_checkpoint'] = int((~after).sum())
+        documents = documents[after]
+    if stored_hashes:
+        unchanged = documents['reel_id'].map(stored_hashes).to_numpy(dtype=object) == \
+            documents['content_hash'].to_numpy(dtype=object)
+        stats['skipped_unchanged'] = int(unchanged.sum())
+        documents = documents[~unchanged]
+
+    batches = (documents.iloc[begin:begin + batch_size] for begin in range(0, len(documents), batch_size))
+    pending, reported = [], time.perf_counter()
+
+    def flush():
+        if not pending:
+            return True
+        if not write(pending):
+            return False
+        stats['written'] += len(pending)
+        if checkpoint_path:
+            save_checkpoint(checkpoint_path, table, model, pending[-1][0], stats['written'])
+        pending.clear()
+        return True
+
+    try:
+        for batch, vectors in embed_batches(batches, embed, concurrency, retries, backoff, stats):
+            stats['calls'] += 1
+            stats['embedded'] += len(batch)
+            pending.extend(zip(batch['reel_id'], vectors, batch['content_hash']))
+            if len(pending) >= write_size and not flush():
+                break
+            if time.perf_counter() - reported >= PROGRESS_INTERVAL:
+                reported = time.perf_counter()
+                logger.info(f"{stats['embedded']}/{len(documents)} embedded, "
+                            f"{stats['embedded'] / (reported - start):.1f} rows/s")
+        else:
+            stats['complete'] = flush()
+    except Exception as e:
+        logger.error(f"Stopping: {str(e)}")
+        flush()
+    finally:
+        stats['seconds'] = time.perf_counter() - start
+
+    if stats['complete'] and checkpoint_path and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    stats['rows_per_second'] = stats['embedded'] / stats['seconds'] if stats['seconds'] else 0.0
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--table', default='embeddings')
+    parser.add_argument('--csv', help='read highlights from a CSV with id, url, title, blurb, player, '
+                                      'home_team and away_team columns instead of mlb_highlights')
+    parser.add_argument('--fake', action='store_true', help='use the deterministic local embedder')
+    parser.add_argument('--dimensions', type=int, default=768, help='vector size of the fake embedder')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds per fake embedding call')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='share of fake calls that fail')
+    parser.add_argument('--dry-run', action='store_true', help='embed but write nothing to the database')
+    parser.add_argument('--batch-size', type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument('--write-size', type=int, default=WRITE_BATCH_SIZE)
+    parser.add_argument('--concurrency', type=int, default=EMBED_CONCURRENCY)
+    parser.add_argument('--retries', type=int, default=EMBED_RETRIES)
+    parser.add_argument('--backoff', type=float, default=EMBED_BACKOFF)
+    parser.add_argument('--checkpoint', default=CHECKPOINT_PATH)
+    parser.add_argument('--no-resume', action='store_true', help='ignore an existing checkpoint')
+    parser.add_argument('--limit', type=int, help='only the first N highlights by id')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    # db and gemini need credentials at import, which --csv --fake --dry-run runs go without
+    if args.fake:
+        embed = FakeEmbedder(args.dimensions, args.latency, args.failure_rate)
+        model = embed.model
+    else:
+        from gemini import EMBEDDING_MODEL, embed_batch
+        model = EMBEDDING_MODEL
+
+        def embed(texts):
+            return embed_batch(texts, model)
+
+    if args.csv:
+        rows = pd.read_csv(args.csv).rename(columns={'id': 'reel_id'})
+    else:
+        from db import load_highlights
+        rows = load_highlights()
+        if rows is None:
+            raise SystemExit("Could not load mlb_highlights")
+    documents = highlight_documents(rows)
+    if args.limit:
+        documents = documents.iloc[:args.limit]
+
+    if args.dry_run:
+        stored_hashes = {}
+
+        def write(rows):
+            return True
+    else:
+        from db import copy_embeddings, ensure_embedding_columns, load_embedding_hashes
+        keyed = ensure_embedding_columns(args.table)
+        stored_hashes = load_embedding_hashes(args.table) or {}
+
+        def write(rows):
+            return copy_embeddings(args.table, rows, keyed)
+
+    # A dry run writes nothing, so it must not move (or remove) the real run's checkpoint either
+    checkpoint_path = None if args.dry_run else args.checkpoint
+    stats = run(documents, embed, model, write, stored_hashes, args.table, checkpoint_path, not args.no_resume,
+                args.batch_size, args.write_size, args.concurrency, args.retries, args.backoff)
+    print(f"{stats['documents']} highlights: {stats['skipped_unchanged']} unchanged, "
+          f"{stats['skipped_checkpoint']} before checkpoint {stats['resumed_after']}, "
+          f"{stats['embedded']} embedded in {stats['calls']} calls ({stats['retries']} retries), "
+          f"{stats['written']} written")
+    print(f"{stats['seconds']:.2f}s, {stats['rows_per_second']:.1f} rows/s"
+          f"{'' if stats['complete'] else '; incomplete, rerun to resume'}")
+    if not stats['complete']:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from hashlib import sha256
+
+import numpy as np
+from cachetools import LRUCache
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'cache', 'embeddings.sqlite'))
+# Query embeddings kept in process memory in front of the SQLite store
+EMBEDDING_CACHE_SIZE = int(os.getenv('EMBEDDING_CACHE_SIZE', 4096))
+# Milliseconds a worker waits on another worker's write before giving up on the store
+SQLITE_BUSY_TIMEOUT = 5000
+
+
+def normalize(text):
+    """Cache key form of a query: NFKC, with runs of whitespace collapsed and the ends stripped"""
+    return ' '.join(unicodedata.normalize('NFKC', text).split())
+
+
+def cache_key(text, model):
+    return sha256(f"{model}\0{normalize(text)}".encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """Query embeddings keyed on model and normalized text.
+
+    An LRU of float32 vectors sits in front of a SQLite file that every
+    worker process on the host shares (WAL mode, so readers never block on a
+    writer). A miss in both tiers calls compute and stores a non-empty result
+    in both. If the file cannot be opened the cache stops trying it and keeps
+    working from memory alone.
+    """
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH, memory_size=EMBEDDING_CACHE_SIZE):
+        self.path = path
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.store_errors = 0
+        self.store_unavailable = False
+        self._memory = LRUCache(maxsize=memory_size)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _connection(self):
+        """This thread's connection to the store, reopened after a fork; None once the store failed to open"""
+        if self.store_unavailable:
+            return None
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            connection = None
+            try:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                connection = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT / 1000, isolation_level=None)
+                connection.execute('PRAGMA journal_mode=WAL')
+                connection.execute("""
+                    CREATE TABLE IF NOT EXISTS embeddings (
+                        key TEXT PRIMARY KEY,
+                        model TEXT NOT NULL,
+                        dimensions INTEGER NOT NULL,
+                        vector BLOB NOT NULL,
+                        created_at REAL NOT NULL
+                    )
+                """)
+            except (sqlite3.Error, OSError) as e:
+                if connection is not None:
+                    connection.close()
+                self._store_failed()
+                self.store_unavailable = True
+                logger.warning(f"Opening embedding cache {self.path} failed, caching in memory only: {str(e)}")
+                return None
+            local.connection, local.pid = connection, os.getpid()
+        return local.connection
+
+    def _store_failed(self):
+        with self._lock:
+            self.store_errors += 1
+
+    def _read(self, key):
+        connection = self._connection()
+        if connection is None:
+            return None
+        try:
+            row = connection.execute('SELECT vector FROM embeddings WHERE key = ?', (key,)).fetchone()
+        except (sqlite3.Error, OSError) as e:
+            self._store_failed()
+            logger.warning(f"Reading embedding cache {self.path} failed: {str(e)}")
+            return None
+        return None if row is None else np.frombuffer(row[0], dtype=np.float32)
+
+    def _write(self, key, model, vector):
+        connection = self._connection()
+        if connection is None:
+            return
+        try:
+            connection.execute(
+                'INSERT OR REPLACE INTO embeddings (key, model, dimensions, vector, created_at) VALUES (?, ?, ?, ?, ?)',
+                (key, model, len(vector), vector.tobytes(), time.time()))
+        except (sqlite3.Error, OSError) as e:
+            self._store_failed()
+            logger.warning(f"Writing embedding cache {self.path} failed: {str(e)}")
+
+    def get(self, text, model, compute):
+        """Embedding of text as a float32 array, from the cache or compute(text); None if compute fails"""
+        key = cache_key(text, model)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self.memory_hits += 1
+                return vector
+        vector = self._read(key)
+        if vector is not None:
+            with self._lock:
+                self.disk_hits += 1
+                self._memory[key] = vector
+            return vector
+
+        with self._lock:
+            self.misses += 1
+        computed = compute(text)
+        if computed is None or len(computed) == 0:
+            return None
+        vector = np.asarray(computed, dtype=np.float32)
+        vector.setflags(write=False)
+        self._write(key, model, vector)
+        with self._lock:
+            self._memory[key] = vector
+        return vector
+
+    def status(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            'path': self.path,
+            'memory_entries': len(self._memory),
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else None,
+            'store_errors': self.store_errors,
+            'store_unavailable': self.store_unavailable,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """Process-wide EmbeddingCache"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+        return _cache
@@ -0,0 +1,249 @@
+"""Offline evaluation of the recommender engines.
+
+Holds out part of each user's ratings, fits every engine on the rest and
+asks it for the top k reels of a sample of users. Reports precision@k,
+recall@k and NDCG@k against the held-out reels, along with fit time,
+per-query p50/p99 latency, peak RSS of the process that ran the engine and
+the size of the model written with model_store.
+
+The knn engines run the same neighbor query and scoring as
+cfknn.recommend_reels (cfknn itself needs database credentials to import);
+'train' is train.top_plays.
+
+Usage:
+    python evaluate.py --csv mlb.csv [--split time --time-col timestamp]
+    python evaluate.py --synthetic [--users 20000] [--reels 5000] [--engines knn item popularity]
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from benchmark import clustered_ratings
+from item_knn import build_item_neighbors, score_items
+from model_store import artifact_size, write_artifact
+from neighbor_index import make_index
+from als import ImplicitALS
+from rating_matrix import RatingMatrix
+from scoring import paginate, popularity_scores, score_reels, top_k
+from train import top_plays
+
+ENGINES = ('knn', 'knn-ivf', 'item', 'als', 'train', 'popularity')
+
+
+def load_csv(path, time_col=None):
+    """Ratings from a CSV with user_id, reel_id (or highlight_id) and rating columns"""
+    frame = pd.read_csv(path).rename(columns={'highlight_id': 'reel_id'})
+    columns = ['user_id', 'reel_id', 'rating'] + ([time_col] if time_col else [])
+    return frame[columns].rename(columns={time_col: 'timestamp'} if time_col else {})
+
+
+def synthetic_frame(num_users, num_reels, ratings_per_user, clusters, seed):
+    """benchmark.clustered_ratings as a ratings frame, with a random timestamp per rating"""
+    matrix = clustered_ratings(num_users, num_reels, ratings_per_user, clusters, seed).tocoo()
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({'user_id': matrix.row, 'reel_id': matrix.col, 'rating': matrix.data,
+                         'timestamp': rng.permutation(matrix.nnz)})
+
+
+def split_holdout(frame, fraction=0.2, by_time=False, seed=0):
+    """(train, test) frames holding out a fraction of each user's ratings.
+
+    With by_time the newest ratings are held out, otherwise random ones. Every
+    user keeps at least one training rating, so users with a single rating
+    are only in train.
+    """
+    rng = np.random.default_rng(seed)
+    key = frame['timestamp'].to_numpy() if by_time else rng.random(len(frame))
+    order = np.lexsort((key, frame['user_id'].to_numpy()))
+    frame = frame.iloc[order]
+    position = frame.groupby('user_id').cumcount().to_numpy()
+    count = frame.groupby('user_id')['user_id'].transform('size').to_numpy()
+    held_out = np.minimum(np.floor(count * fraction).astype(int), count - 1)
+    test = position >= count - held_out
+    return frame[~test].reset_index(drop=True), frame[test].reset_index(drop=True)
+
+
+def _knn_engine(kind, n_neighbors):
+    def fit(matrix):
+        model = make_index(kind).fit(matrix.ratings)
+        k = min(n_neighbors, matrix.shape[0])
+
+        def recommend(user_index, limit):
+            distances, indices = model.kneighbors(matrix.ratings[user_index], n_neighbors=k)
+            scores, candidates = score_reels(matrix.ratings, user_index, indices[0], distances[0])
+            if candidates is None:
+                return np.array([], dtype=np.int64)
+            return paginate(scores, candidates, limit)[0]
+        return recommend, {'model': model}
+    return fit
+
+
+def _fit_item(matrix):
+    item_neighbors, _ = build_item_neighbors(matrix.ratings)
+
+    def recommend(user_index, limit):
+        scores, candidates = score_items(item_neighbors, matrix.ratings[user_index])
+        if candidates is None:
+            return np.array([], dtype=np.int64)
+        return paginate(scores, candidates, limit)[0]
+    return recommend, {'model': make_index('brute'), 'item_neighbors': item_neighbors}
+
+
+def _fit_als(matrix):
+    model = ImplicitALS().fit(matrix.ratings)
+
+    def recommend(user_index, limit):
+        scores = model.scores(user_index)
+        candidates = np.ones(len(scores), dtype=bool)
+        candidates[matrix.ratings[user_index].indices] = False
+        return paginate(scores, candidates, limit)[0]
+    return recommend, {'model': model}
+
+
+def _fit_train(matrix):
+    model = make_index('brute').fit(matrix.ratings)
+
+    def recommend(user_index, limit):
+        plays = top_plays(matrix.user_ids[user_index], model, matrix, limit)
+        return plays[0] if plays is not None else np.array([], dtype=np.int64)
+    return recommend, {'model': model}
+
+
+def _fit_popularity(matrix):
+    ratings = matrix.ratings
+    scores = popularity_scores(np.diff(ratings.tocsc().indptr), np.asarray(ratings.sum(axis=0)).ravel())
+
+    def recommend(user_index, limit):
+        candidates = np.ones(ratings.shape[1], dtype=bool)
+        candidates[ratings[user_index].indices] = False
+        return top_k(scores, candidates, limit)
+    return recommend, {'arrays': [scores]}
+
+
+def make_engine(name, n_neighbors=20):
+    """fit(matrix) -> (recommend(user_index, k) -> reel positions, artifacts) for an engine name"""
+    engines = {
+        'knn': _knn_engine('brute', n_neighbors),
+        'knn-ivf': _knn_engine('ivf', n_neighbors),
+        'item': _fit_item,
+        'als': _fit_als,
+        'train': _fit_train,
+        'popularity': _fit_popularity,
+    }
+    if name not in engines:
+        raise ValueError(f"Unknown engine '{name}', expected one of {ENGINES}")
+    return engines[name]
+
+
+def model_size(matrix, artifacts):
+    """Bytes on disk of the engine's model as the trainer would save it"""
+    if 'arrays' in artifacts:
+        return sum(array.nbytes for array in artifacts['arrays'])
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'model')
+        write_artifact(path, artifacts['model'], matrix, item_neighbors=artifacts.get('item_neighbors'))
+        return artifact_size(path)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def ranking_metrics(recommended, relevant, k):
+    """(precision@k, recall@k, NDCG@k) for one user with binary relevance"""
+    hits = np.isin(recommended[:k], relevant)
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    ideal = discounts[:min(k, len(relevant))].sum()
+    return hits.sum() / k, hits.sum() / len(relevant), (discounts[:len(hits)] * hits).sum() / ideal
+
+
+def evaluate_engine(name, train, test, args):
+    """Fit one engine on train and score it on the sampled test users"""
+    matrix = RatingMatrix.from_frame(train)
+    start = time.perf_counter()
+    recommend, artifacts = make_engine(name, args.neighbors)(matrix)
+    fit_seconds = time.perf_counter() - start
+
+    test = test[test['rating'] >= args.relevant]
+    users = test['user_id'].unique()
+    users = np.random.default_rng(args.seed).permutation(users)[:args.queries]
+    relevant = test.groupby('user_id')['reel_id'].apply(lambda ids: ids.to_numpy())
+
+    latencies, metrics = [], []
+    for user_id in users:
+        user_index = matrix.user_position(user_id)
+        if user_index is None:
+            continue
+        start = time.perf_counter()
+        positions = recommend(user_index, args.k)
+        latencies.append(time.perf_counter() - start)
+        metrics.append(ranking_metrics(matrix.reel_ids[positions], relevant[user_id], args.k))
+
+    precision, recall, ndcg = np.mean(metrics, axis=0) if metrics else (0.0, 0.0, 0.0)
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000 if latencies else (0.0, 0.0)
+    return {
+        'engine': name,
+        'users': len(metrics),
+        'precision': precision,
+        'recall': recall,
+        'ndcg': ndcg,
+        'fit_seconds': fit_seconds,
+        'p50_ms': p50,
+        'p99_ms': p99,
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'model_mb': model_size(matrix, artifacts) / 2 ** 20,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--csv', help='ratings CSV with user_id, reel_id or highlight_id, and rating columns')
+    source.add_argument('--synthetic', action='store_true', help='use benchmark.clustered_ratings')
+    parser.add_argument('--time-col', help='CSV column to order ratings by for --split time')
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--reels', type=int, default=5000)
+    parser.add_argument('--ratings-per-user', type=int, default=20)
+    parser.add_argument('--clusters', type=int, default=100)
+    parser.add_argument('--split', choices=['random', 'time'], default='random')
+    parser.add_argument('--holdout', type=float, default=0.2, help="fraction of each user's ratings held out")
+    parser.add_argument('--relevant', type=float, default=0,
+                        help='minimum held-out rating that counts as relevant')
+    parser.add_argument('--engines', nargs='+', choices=ENGINES, default=['knn', 'item', 'train', 'popularity'])
+    parser.add_argument('--neighbors', type=int, default=20)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=1000, help='test users sampled per engine')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    if args.csv and args.split == 'time' and not args.time_col:
+        parser.error('--split time with --csv needs --time-col')
+
+    if args.csv:
+        frame = load_csv(args.csv, args.time_col)
+    else:
+        frame = synthetic_frame(args.users, args.reels, args.ratings_per_user, args.clusters, args.seed)
+    train, test = split_holdout(frame, args.holdout, args.split == 'time', args.seed)
+    print(f"{len(frame)} ratings, {frame['user_id'].nunique()} users, {frame['reel_id'].nunique()} reels; "
+          f"{len(test)} held out ({args.split})")
+
+    print(f"{'engine':>10} {'users':>6} {'P@' + str(args.k):>7} {'R@' + str(args.k):>7} {'NDCG':>7} "
+          f"{'fit (s)':>8} {'p50 (ms)':>9} {'p99 (ms)':>9} {'RSS (MB)':>9} {'model (MB)':>11}")
+    for name in args.engines:
+        # A fresh process per engine, so peak RSS is that engine's alone
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+            r = pool.submit(evaluate_engine, name, train, test, args).result()
+        print(f"{r['engine']:>10} {r['users']:>6} {r['precision']:>7.4f} {r['recall']:>7.4f} {r['ndcg']:>7.4f} "
+              f"{r['fit_seconds']:>8.2f} {r['p50_ms']:>9.2f} {r['p99_ms']:>9.2f} {r['peak_rss_mb']:>9.0f} "
+              f"{r['model_mb']:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,8 @@ if not api_key:
 # Configure the Gemini API
 genai.configure(api_key=api_key)
 
+EMBEDDING_MODEL = "models/text-embedding-004"
+
 def run_gemini_prompt(prompt):
     try:
         logger.info(f"Running prompt: {prompt}...")
@@ -27,13 +29,13 @@ def run_gemini_prompt(prompt):
         logger.error(f"Error running Gemini prompt: {str(e)}", exc_info=True)
         return None
 
-def generate_embeddings(text):
+def generate_embeddings(text, model=EMBEDDING_MODEL):
     try:
         genai.configure(api_key=api_key)
         
         logger.debug(f"Generating embeddings for text: {text[:50]}...")
         result = genai.embed_content(
-            model="models/text-embedding-004",
+            model=model,
             content=text
         )
         
@@ -44,3 +46,8 @@ def generate_embeddings(text):
     except Exception as e:
         logger.error(f"Error generating embeddings: {str(e)}", exc_info=True)
         return []
+
+def embed_batch(texts, model=EMBEDDING_MODEL):
+    """Embeddings of many texts in one API call, in order; raises on failure so callers can retry"""
+    result = genai.embed_content(model=model, content=list(texts))
+    return result['embedding']
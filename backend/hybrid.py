@@ -0,0 +1,139 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from cachetools import TTLCache, cached
+from cachetools.keys import hashkey
+
+from cfknn import run_main
+from db import search_feature
+from popularity import get_popularity
+
+logger = logging.getLogger(__name__)
+
+SOURCES = ('cf', 'vector', 'follow')
+# Weight of each source's scores (scaled to 0-1) in the blended feed score
+FEED_WEIGHTS = {
+    'cf': float(os.getenv('FEED_WEIGHT_CF', 1.0)),
+    'vector': float(os.getenv('FEED_WEIGHT_VECTOR', 0.7)),
+    'follow': float(os.getenv('FEED_WEIGHT_FOLLOW', 0.5)),
+}
+# Candidates fetched per source, and how long a source's candidate set is reused
+FEED_CANDIDATES = int(os.getenv('FEED_CANDIDATES', 200))
+CANDIDATE_TTL = float(os.getenv('FEED_CANDIDATE_TTL', 60))
+CANDIDATE_CACHE_SIZE = 10000
+EMBEDDING_TABLE = 'embeddings'
+
+_executor = ThreadPoolExecutor(max_workers=len(SOURCES) * 4, thread_name_prefix='feed-candidates')
+
+
+def follow_query(followed_teams, followed_players):
+    """Text embedded to find highlights similar to what a user follows"""
+    return f"Teams: {', '.join(followed_teams)}. Players: {', '.join(followed_players)}."
+
+
+def _candidates(reel_ids, scores):
+    return np.array([str(reel_id) for reel_id in reel_ids], dtype=object), np.asarray(scores, dtype=np.float64)
+
+
+@cached(cache=TTLCache(maxsize=CANDIDATE_CACHE_SIZE, ttl=CANDIDATE_TTL), lock=threading.Lock())
+def cf_candidates(table, user_id, limit=FEED_CANDIDATES):
+    recommendations, _ = run_main(table, user_id=user_id, num_recommendations=limit)
+    return _candidates([r['reel_id'] for r in recommendations], [r['predicted_score'] for r in recommendations])
+
+
+VECTOR_CANDIDATES = TTLCache(maxsize=CANDIDATE_CACHE_SIZE, ttl=CANDIDATE_TTL)
+VECTOR_CANDIDATES_LOCK = threading.Lock()
+
+
+def vector_candidates(query, limit=FEED_CANDIDATES):
+    """Nearest highlights to the embedded query, cached only when some were found"""
+    key = hashkey(query, limit)
+    with VECTOR_CANDIDATES_LOCK:
+        found = VECTOR_CANDIDATES.get(key)
+    if found is not None:
+        return found
+    results = search_feature(EMBEDDING_TABLE, query, limit)
+    # Closer is better, so the score is the negated distance
+    found = _candidates([r['id'] for r in results], [-r['distance'] for r in results])
+    # search_feature also returns [] when embedding or the query fails, so an empty result is retried
+    if results:
+        with VECTOR_CANDIDATES_LOCK:
+            VECTOR_CANDIDATES[key] = found
+    return found
+
+
+@cached(cache=TTLCache(maxsize=CANDIDATE_CACHE_SIZE, ttl=CANDIDATE_TTL), lock=threading.Lock())
+def follow_candidates(table, followed_teams, followed_players, limit=FEED_CANDIDATES):
+    reel_ids, scores = get_popularity(table).followed(followed_teams, followed_players, limit)
+    return _candidates(reel_ids, scores)
+
+
+def _scaled(scores):
+    """Min-max scale to 0-1; a source whose scores are all equal gives each of its reels 1"""
+    if len(scores) == 0:
+        return scores
+    low, high = scores.min(), scores.max()
+    if high == low:
+        return np.ones_like(scores)
+    return (scores - low) / (high - low)
+
+
+def blend(candidates, weights=FEED_WEIGHTS):
+    """Rank the union of per-source candidate sets by a weighted sum of their scaled scores.
+
+    candidates maps a source name to (reel_ids, scores). A reel missing from a
+    source gets nothing from it. Returns (reel_ids, scores, sources) best
+    first, where sources is a reels x sources boolean matrix of where each
+    reel came from. Ties keep reel id order.
+    """
+    names = list(candidates)
+    if not names:
+        return np.array([], dtype=object), np.array([]), np.zeros((0, 0), dtype=bool)
+    reel_ids, codes = np.unique(np.concatenate([candidates[name][0] for name in names]), return_inverse=True)
+    totals = np.zeros(len(reel_ids))
+    sources = np.zeros((len(reel_ids), len(names)), dtype=bool)
+    begin = 0
+    for column, name in enumerate(names):
+        source_ids, scores = candidates[name]
+        source_codes = codes[begin:begin + len(source_ids)]
+        begin += len(source_ids)
+        contribution = np.zeros(len(reel_ids))
+        np.maximum.at(contribution, source_codes, weights.get(name, 0.0) * _scaled(scores))
+        totals += contribution
+        sources[source_codes, column] = True
+    order = np.argsort(-totals, kind='stable')
+    return reel_ids[order], totals[order], sources[order]
+
+
+def rank_feed(table, user_id, followed_teams=(), followed_players=(), num_recommendations=5, offset=0):
+    """One page of the blended feed: (recommendations, has_more).
+
+    The cf, vector and follow candidate sets are fetched in parallel (each
+    cached on its own) and blended with FEED_WEIGHTS. A source that fails is
+    left out. Users with no candidates at all get the popularity ranking.
+    """
+    followed_teams, followed_players = tuple(sorted(followed_teams)), tuple(sorted(followed_players))
+    futures = {'cf': _executor.submit(cf_candidates, table, user_id)}
+    if followed_teams or followed_players:
+        futures['vector'] = _executor.submit(vector_candidates, follow_query(followed_teams, followed_players))
+        futures['follow'] = _executor.submit(follow_candidates, table, followed_teams, followed_players)
+
+    candidates = {}
+    for name, future in futures.items():
+        try:
+            candidates[name] = future.result()
+        except Exception as e:
+            logger.warning(f"Feed candidates from {name} failed for user {user_id}: {str(e)}")
+
+    reel_ids, scores, sources = blend(candidates)
+    if len(reel_ids) == 0:
+        return get_popularity(table).recommend(followed_teams, followed_players, num_recommendations, offset)
+
+    names = np.array(list(candidates))
+    end = offset + num_recommendations
+    recommendations = [{"reel_id": reel_id, "score": float(score), "sources": names[found].tolist()}
+                       for reel_id, score, found in zip(reel_ids[offset:end], scores[offset:end], sources[offset:end])]
+    return recommendations, end < len(reel_ids)
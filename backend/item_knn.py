@@ -0,0 +1,65 @@
+import time
+
+import numpy as np
+from scipy.sparse import csr_matrix, diags
+
+from topn import select_top_n
+
+# Dense similarity cells materialized per chunk of reels (float32, so ~128 MB)
+CHUNK_CELLS = 32 * 1024 * 1024
+
+
+def build_item_neighbors(ratings, k=50, chunk_cells=CHUNK_CELLS):
+    """Sparse reels x reels matrix keeping each reel's k most cosine-similar reels.
+
+    Row i holds the similarities of reel i to its neighbors, so a user's scores
+    are their rating row times this matrix. Self-similarity and non-positive
+    similarities are dropped. Returns (matrix, build_seconds).
+    """
+    start = time.perf_counter()
+    ratings = csr_matrix(ratings, dtype=np.float32)
+    num_reels = ratings.shape[1]
+    k = min(k, max(num_reels - 1, 0))
+    if k == 0:
+        return csr_matrix((num_reels, num_reels), dtype=np.float32), time.perf_counter() - start
+
+    norms = np.sqrt(np.asarray(ratings.multiply(ratings).sum(axis=0)).ravel())
+    inverse = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    normalized = (ratings @ diags(inverse.astype(np.float32))).tocsc()
+    normalized_t = normalized.T.tocsr()
+
+    chunk = max(1, min(num_reels, chunk_cells // num_reels))
+    rows, cols, values = [], [], []
+    for begin in range(0, num_reels, chunk):
+        end = min(begin + chunk, num_reels)
+        similarities = np.asarray((normalized_t[begin:end] @ normalized).todense(), dtype=np.float32)
+        similarities[similarities <= 0] = -np.inf
+        similarities[np.arange(end - begin), np.arange(begin, end)] = -np.inf
+
+        positions, ranked, _ = select_top_n(similarities, k)
+        keep = positions >= 0
+        rows.append(np.nonzero(keep)[0] + begin)
+        cols.append(positions[keep])
+        values.append(ranked[keep])
+
+    neighbors = csr_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))),
+                           shape=(num_reels, num_reels), dtype=np.float32)
+    return neighbors, time.perf_counter() - start
+
+
+def score_items(item_neighbors, user_row):
+    """Item-based scores for one user rating row (1 x reels CSR), rated reels masked.
+
+    The row may have more columns than item_neighbors when reels were added
+    after the build; those reels are ignored until the next build. Returns
+    (scores, candidates) like scoring.score_reels, with candidates None when
+    the user has no ratings among the built reels.
+    """
+    num_reels = item_neighbors.shape[0]
+    user_row = user_row[:, :num_reels]
+    if user_row.nnz == 0:
+        return np.zeros(num_reels), None
+    scores = np.asarray((user_row @ item_neighbors).todense()).ravel().astype(np.float64)
+    candidates = np.ones(num_reels, dtype=bool)
+    candidates[user_row.indices[user_row.data != 0]] = False
+    return scores, candidates
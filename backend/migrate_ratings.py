@@ -0,0 +1,44 @@
+"""Schema changes that ratings tables need for incremental reads and bulk upserts.
+
+Adds the rating_seq column that ratings_snapshot reads new rows by, and the
+unique (user_id, reel_id) index that rating_writer upserts on. Both are
+built without long table locks, so this can run against a live table; the
+application only checks for them and falls back to full reloads and
+delete-and-insert writes until they exist.
+
+--dedupe first deletes all but the latest row of every (user_id, reel_id)
+pair, which the unique index needs.
+
+Usage:
+    python migrate_ratings.py [--table user_ratings_db] [--batch-size 10000] [--dedupe]
+"""
+import argparse
+import time
+
+from db import add_rating_key, add_rating_sequence, remove_duplicate_ratings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--table', default='user_ratings_db')
+    parser.add_argument('--batch-size', type=int, default=10000, help='rows numbered per UPDATE')
+    parser.add_argument('--dedupe', action='store_true', help='delete duplicate ratings before adding the key')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    numbered = add_rating_sequence(args.table, args.batch_size)
+    print(f"rating_seq ready on {args.table} ({numbered} existing rows numbered) "
+          f"in {time.perf_counter() - start:.1f}s")
+
+    if args.dedupe:
+        print(f"Deleted {remove_duplicate_ratings(args.table)} duplicate ratings")
+    start = time.perf_counter()
+    try:
+        add_rating_key(args.table)
+    except Exception as e:
+        raise SystemExit(f"Could not add the unique rating key (rerun with --dedupe?): {e}")
+    print(f"Unique (user_id, reel_id) key ready on {args.table} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""On-disk model artifacts as raw, memory-mappable NumPy arrays.
+
+An artifact is a directory holding one .npy file per array plus a
+manifest.json. Arrays are loaded with np.load(mmap_mode='r'), so opening a
+model only maps the files: every worker process serving the same artifact
+shares its pages through the OS page cache instead of unpickling a private
+copy. The .npy header pads array data to a 64-byte boundary.
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from als import ImplicitALS
+from neighbor_index import INDEX_TYPES
+from rating_matrix import RatingMatrix
+from topn import TopNTable
+
+FORMAT_VERSION = 1
+MANIFEST = 'manifest.json'
+# Model classes by the kind recorded in the manifest
+MODEL_TYPES = {**INDEX_TYPES, 'als': ImplicitALS}
+
+
+def _id_array(ids):
+    """Ids as a fixed-width array that can be memory-mapped when they are all strings or integers"""
+    ids = np.asarray(ids)
+    if ids.dtype == object and all(isinstance(i, str) for i in ids.tolist()):
+        return np.asarray(ids.tolist(), dtype=str)
+    if ids.dtype == object and all(isinstance(i, (int, np.integer)) and not isinstance(i, bool) for i in ids.tolist()):
+        return np.asarray(ids.tolist(), dtype=np.int64)
+    return ids
+
+
+def _csr_arrays(prefix, matrix):
+    return {f"{prefix}.data": matrix.data, f"{prefix}.indices": matrix.indices, f"{prefix}.indptr": matrix.indptr}
+
+
+def _csr(arrays, prefix, shape):
+    return csr_matrix((arrays[f"{prefix}.data"], arrays[f"{prefix}.indices"], arrays[f"{prefix}.indptr"]),
+                      shape=tuple(shape), copy=False)
+
+
+def write_artifact(path, model, matrix, top_n=None, item_neighbors=None, metadata=None):
+    """Write a model directory atomically: build it under a temporary name, then rename"""
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    arrays = _csr_arrays('ratings', matrix.ratings)
+    arrays['user_ids'] = _id_array(matrix.user_ids)
+    arrays['reel_ids'] = _id_array(matrix.reel_ids)
+    arrays.update({f"index.{name}": array for name, array in model.state_arrays().items()})
+    manifest = {
+        'format': FORMAT_VERSION,
+        'shape': list(matrix.shape),
+        'index': {'kind': next(kind for kind, cls in MODEL_TYPES.items() if type(model) is cls),
+                  'params': model.params()},
+        'top_n': None,
+        'item_neighbors': None,
+        **(metadata or {}),
+    }
+    if top_n is not None:
+        arrays.update({'top_n.positions': top_n.positions, 'top_n.scores': top_n.scores,
+                       'top_n.counts': top_n.counts, 'top_n.totals': top_n.totals,
+                       'top_n.dirty': top_n.dirty})
+        manifest['top_n'] = {'build_seconds': top_n.build_seconds}
+    if item_neighbors is not None:
+        arrays.update(_csr_arrays('item_neighbors', item_neighbors))
+        manifest['item_neighbors'] = {'shape': list(item_neighbors.shape)}
+
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_path, f"{name}.npy"), np.ascontiguousarray(array), allow_pickle=True)
+    with open(os.path.join(tmp_path, MANIFEST), 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _load_array(path):
+    try:
+        return np.load(path, mmap_mode='r')
+    except ValueError:
+        # Object arrays (ids that are neither all strings nor integers) cannot be mapped
+        return np.load(path, allow_pickle=True)
+
+
+def read_artifact(path):
+    """Map a model directory; returns (model, matrix, top_n, item_neighbors, manifest)"""
+    with open(os.path.join(path, MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported model format {manifest.get('format')} in {path}")
+    arrays = {name[:-len('.npy')]: _load_array(os.path.join(path, name))
+              for name in os.listdir(path) if name.endswith('.npy')}
+
+    matrix = RatingMatrix(_csr(arrays, 'ratings', manifest['shape']), arrays['user_ids'], arrays['reel_ids'])
+    index_arrays = {name[len('index.'):]: array for name, array in arrays.items() if name.startswith('index.')}
+    index_cls = MODEL_TYPES[manifest['index']['kind']]
+    model = index_cls.from_state(manifest['index']['params'], index_arrays, matrix.ratings)
+
+    top_n = None
+    if manifest['top_n'] is not None:
+        top_n = TopNTable(arrays['top_n.positions'], arrays['top_n.scores'], arrays['top_n.counts'],
+                          arrays['top_n.totals'], manifest['top_n']['build_seconds'], arrays['top_n.dirty'])
+    item_neighbors = None
+    if manifest['item_neighbors'] is not None:
+        item_neighbors = _csr(arrays, 'item_neighbors', manifest['item_neighbors']['shape'])
+    return model, matrix, top_n, item_neighbors, manifest
+
+
+def artifact_size(path):
+    """Total bytes on disk of a model directory"""
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
@@ -0,0 +1,206 @@
+import math
+
+import numpy as np
+from scipy.sparse import csr_matrix, diags
+from sklearn.decomposition import TruncatedSVD
+from sklearn.neighbors import NearestNeighbors
+
+
+class NeighborIndex:
+    """Cosine nearest-neighbor index over the rows of a sparse rating matrix.
+
+    Implementations follow the sklearn NearestNeighbors calling convention:
+    kneighbors returns (distances, indices) arrays of shape (queries, k) with
+    cosine distances ascending. refit rebuilds the index for a matrix that
+    differs from the fitted one only in the given rows (plus appended rows).
+    """
+
+    def fit(self, X):
+        raise NotImplementedError
+
+    def kneighbors(self, X, n_neighbors=10):
+        raise NotImplementedError
+
+    def refit(self, X, changed_rows):
+        return self.fit(X)
+
+    def params(self):
+        """Constructor arguments, for saving the index alongside its arrays"""
+        return {}
+
+    def state_arrays(self):
+        """Fitted state as plain NumPy arrays; an empty dict means the index is refitted on load"""
+        return {}
+
+    @classmethod
+    def from_state(cls, params, arrays, X):
+        """Rebuild a fitted index from params(), state_arrays() and the matrix it was fitted on"""
+        return cls(**params).fit(X)
+
+
+class BruteForceIndex(NeighborIndex):
+    """Exact search: the reference implementation every other index is measured against"""
+
+    def __init__(self, n_jobs=-1):
+        self.n_jobs = n_jobs
+        self._model = None
+
+    def params(self):
+        return {'n_jobs': self.n_jobs}
+
+    def fit(self, X):
+        self._model = NearestNeighbors(metric='cosine', algorithm='brute', n_neighbors=10, n_jobs=self.n_jobs)
+        self._model.fit(X)
+        return self
+
+    def kneighbors(self, X, n_neighbors=10):
+        return self._model.kneighbors(X, n_neighbors=n_neighbors)
+
+
+class ClusteredIndex(NeighborIndex):
+    """Approximate search with an inverted-file (IVF) index over a low-rank embedding.
+
+    Rows are embedded with a truncated SVD, the embeddings are grouped into
+    about sqrt(rows) clusters by spherical k-means, and a query ranks exact
+    cosine distance only over the members of its `probes` closest clusters.
+    refit re-embeds and re-assigns just the changed rows, keeping the learned
+    embedding and centroids until the next full fit.
+    """
+
+    def __init__(self, dimensions=64, lists=None, probes=8, iterations=10, sample_size=100000, seed=0):
+        self.dimensions = dimensions
+        self.lists = lists
+        self.probes = probes
+        self.iterations = iterations
+        self.sample_size = sample_size
+        self.seed = seed
+
+    def fit(self, X):
+        X = csr_matrix(X, dtype=np.float32)
+        rng = np.random.default_rng(self.seed)
+        self._normalized = _normalize_rows(X)
+        num_rows = X.shape[0]
+        sample = rng.choice(num_rows, size=min(num_rows, self.sample_size), replace=False)
+
+        dimensions = max(1, min(self.dimensions, X.shape[1] - 1))
+        svd = TruncatedSVD(n_components=dimensions, random_state=self.seed)
+        svd.fit(self._normalized[sample])
+        self.components_ = svd.components_.astype(np.float32)
+        embedded = self._embed(self._normalized)
+
+        lists = self.lists or int(np.clip(math.sqrt(num_rows), 1, num_rows))
+        centroids = embedded[rng.choice(sample, size=min(lists, len(sample)), replace=False)]
+        for _ in range(self.iterations):
+            assignment = np.argmax(embedded[sample] @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, embedded[sample])
+            empty = ~sums.any(axis=1)
+            sums[empty] = centroids[empty]
+            centroids = _normalize_dense(sums)
+        self.centroids_ = centroids
+        self.assignment_ = self._assign(embedded)
+        self._build_lists()
+        return self
+
+    def refit(self, X, changed_rows):
+        X = csr_matrix(X, dtype=np.float32)
+        if not hasattr(self, 'centroids_'):
+            return self.fit(X)
+        # Arrays may be read-only memory maps of a saved model, so only ever replace them
+        old_rows = len(self.assignment_)
+        rows = np.union1d(np.asarray(changed_rows, dtype=np.int64), np.arange(old_rows, X.shape[0]))
+        self._normalized = _normalize_rows(X)
+        assignment = np.empty(X.shape[0], dtype=np.int32)
+        assignment[:old_rows] = self.assignment_
+        if len(rows):
+            assignment[rows] = self._assign(self._embed(self._normalized[rows]))
+        self.assignment_ = assignment
+        self._build_lists()
+        return self
+
+    def kneighbors(self, X, n_neighbors=10):
+        queries = _normalize_rows(csr_matrix(X, dtype=np.float32))
+        routes = self._embed(queries) @ self.centroids_.T
+        probes = min(self.probes, len(self.centroids_))
+        distances = np.empty((queries.shape[0], n_neighbors))
+        indices = np.empty((queries.shape[0], n_neighbors), dtype=np.int64)
+        for q in range(queries.shape[0]):
+            closest = np.argpartition(-routes[q], probes - 1)[:probes]
+            candidates = np.concatenate([self._members[self._offsets[c]:self._offsets[c + 1]] for c in closest])
+            if len(candidates) < n_neighbors:
+                candidates = np.arange(self._normalized.shape[0])
+            distances[q], indices[q] = _rerank(self._normalized, candidates, queries[q], n_neighbors)
+        return distances, indices
+
+    def params(self):
+        return {'dimensions': self.dimensions, 'lists': self.lists, 'probes': self.probes,
+                'iterations': self.iterations, 'sample_size': self.sample_size, 'seed': self.seed}
+
+    def state_arrays(self):
+        return {
+            'components': self.components_,
+            'centroids': self.centroids_,
+            'assignment': self.assignment_,
+            'members': self._members,
+            'offsets': self._offsets,
+            'normalized_data': self._normalized.data,
+            'normalized_indices': self._normalized.indices,
+            'normalized_indptr': self._normalized.indptr,
+        }
+
+    @classmethod
+    def from_state(cls, params, arrays, X):
+        index = cls(**params)
+        index.components_ = arrays['components']
+        index.centroids_ = arrays['centroids']
+        index.assignment_ = arrays['assignment']
+        index._members = arrays['members']
+        index._offsets = arrays['offsets']
+        index._normalized = csr_matrix((arrays['normalized_data'], arrays['normalized_indices'],
+                                        arrays['normalized_indptr']), shape=X.shape, copy=False)
+        return index
+
+    def _embed(self, rows):
+        # Reels added after the fit have no SVD loading; they still count in the exact re-ranking
+        features = self.components_.shape[1]
+        return _normalize_dense(np.asarray(rows[:, :features] @ self.components_.T, dtype=np.float32))
+
+    def _assign(self, embedded, chunk=65536):
+        return np.concatenate([np.argmax(embedded[i:i + chunk] @ self.centroids_.T, axis=1)
+                               for i in range(0, len(embedded), chunk)]).astype(np.int32)
+
+    def _build_lists(self):
+        self._members = np.argsort(self.assignment_, kind='stable')
+        self._offsets = np.searchsorted(self.assignment_[self._members], np.arange(len(self.centroids_) + 1))
+
+
+def _normalize_rows(X):
+    norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=1)).ravel())
+    inverse = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    return (diags(inverse.astype(np.float32)) @ X).tocsr()
+
+
+def _normalize_dense(X):
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    return np.divide(X, norms, out=np.zeros_like(X), where=norms > 0)
+
+
+def _rerank(normalized, candidates, query, n_neighbors):
+    """Exact cosine distances of the n closest candidates to one normalized query row"""
+    similarities = np.asarray((normalized[candidates] @ query.T).todense()).ravel()
+    best = np.argpartition(-similarities, n_neighbors - 1)[:n_neighbors]
+    best = best[np.argsort(-similarities[best], kind='stable')]
+    return 1.0 - similarities[best], candidates[best]
+
+
+INDEX_TYPES = {
+    'brute': BruteForceIndex,
+    'ivf': ClusteredIndex,
+}
+
+
+def make_index(kind='brute', **params):
+    """Unfitted neighbor index of the given kind ('brute' or 'ivf')"""
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown neighbor index '{kind}', expected one of {sorted(INDEX_TYPES)}")
+    return INDEX_TYPES[kind](**params)
@@ -0,0 +1,195 @@
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from cachetools import LRUCache
+
+from catalog import get_catalog
+from db import check_rating_table, load_rating_totals, load_vote_totals
+from scoring import popularity_scores
+
+logger = logging.getLogger(__name__)
+
+# Seconds between rebuilds of the ranking
+REFRESH_INTERVAL = float(os.getenv('POPULARITY_REFRESH_INTERVAL', 10 * 60))
+# Seconds before retrying a failed rebuild, doubled with each further failure up to refresh_interval
+RETRY_DELAY = float(os.getenv('POPULARITY_RETRY_DELAY', 5))
+# Seconds a request waits for the first build to finish before it is served from the empty ranking
+FIRST_LOAD_WAIT = float(os.getenv('POPULARITY_FIRST_LOAD_WAIT', 10))
+# Ratings worth of the catalog-wide mean blended into each reel's mean, so one 5-star rating doesn't top the chart
+PRIOR_RATINGS = float(os.getenv('POPULARITY_PRIOR_RATINGS', 5))
+# Weight of net video votes relative to the rating term
+VOTE_WEIGHT = float(os.getenv('POPULARITY_VOTE_WEIGHT', 1.0))
+# Score added to highlights of a followed team or player
+FOLLOW_BOOST = float(os.getenv('POPULARITY_FOLLOW_BOOST', 5.0))
+FOLLOW_ORDERS_CACHED = 1024
+
+
+class PopularityRanker:
+    """Precomputed popularity ranking of every highlight, for users with no ratings.
+
+    The ranking is rebuilt from ratings, video_votes and the highlight catalog every
+    refresh_interval seconds on a daemon thread started by start(); requests
+    only read the current ranking. A failed rebuild keeps the previous ranking
+    and is retried after retry_delay seconds, doubling with each further
+    failure. A page for a user without follows is a slice of
+    it; a user with follows gets the same ranking with their teams' and
+    players' highlights boosted, computed once per distinct follow set and
+    cached until the next rebuild.
+    """
+
+    def __init__(self, table, refresh_interval=REFRESH_INTERVAL, follow_boost=FOLLOW_BOOST,
+                 retry_delay=RETRY_DELAY, first_load_wait=FIRST_LOAD_WAIT):
+        self.table = table
+        self.refresh_interval = refresh_interval
+        self.retry_delay = retry_delay
+        self.first_load_wait = first_load_wait
+        self.follow_boost = follow_boost
+        # (reel_ids, scores, tag ranks, follow orders), replaced as a whole on refresh
+        self._ranking = (np.array([], dtype=object), np.array([]), {}, LRUCache(maxsize=FOLLOW_ORDERS_CACHED))
+        self.refreshed_at = None
+        self.last_refresh_seconds = 0.0
+        self.failures = 0
+        self._lock = threading.Lock()
+        self._first_attempt = threading.Event()
+        self._thread = None
+
+    @property
+    def age(self):
+        if self.refreshed_at is None:
+            return None
+        return time.time() - self.refreshed_at
+
+    def refresh(self):
+        """Rebuild the ranking now; returns whether it is complete (the previous one is kept if a query fails)"""
+        with self._lock:
+            start = time.perf_counter()
+            catalog = get_catalog()
+            highlight_ids, tagged = catalog.tagged()
+            ratings = load_rating_totals(self.table)
+            votes = load_vote_totals()
+            if ratings is None or votes is None:
+                self.failures += 1
+                return False
+
+            frame = pd.DataFrame({'reel_id': pd.unique(pd.concat(
+                [pd.Series(highlight_ids, dtype=object), ratings['reel_id'], votes['reel_id']]).astype(str))})
+            frame = (frame
+                     .merge(ratings.assign(reel_id=ratings['reel_id'].astype(str)), on='reel_id', how='left')
+                     .merge(votes.assign(reel_id=votes['reel_id'].astype(str)), on='reel_id', how='left')
+                     .fillna({'rating_count': 0, 'rating_sum': 0, 'net_votes': 0}))
+            scores = popularity_scores(frame['rating_count'], frame['rating_sum'], frame['net_votes'],
+                                       PRIOR_RATINGS, VOTE_WEIGHT)
+
+            # Best first, ties by id so pages are stable between refreshes
+            reel_ids = frame['reel_id'].to_numpy()
+            order = np.lexsort((reel_ids, -scores))
+            reel_ids, scores = reel_ids[order], scores[order]
+
+            # Catalog positions to ranking positions, so each name's highlights become its ranks
+            ranks = pd.Series(np.arange(len(reel_ids)), index=reel_ids).reindex(highlight_ids).to_numpy()
+            tags = {name: np.unique(ranks[positions]) for name, positions in tagged.items()}
+
+            self._ranking = (reel_ids, scores, tags, LRUCache(maxsize=FOLLOW_ORDERS_CACHED))
+            self.refreshed_at = time.time()
+            self.last_refresh_seconds = time.perf_counter() - start
+            logger.info(f"Ranked {len(reel_ids)} highlights by popularity in {self.last_refresh_seconds:.3f}s")
+            if catalog.version == 0:
+                # Ratings and votes are ranked, but nothing can be boosted until the catalog loads
+                self.failures += 1
+                return False
+            self.failures = 0
+            return True
+
+    def start(self):
+        """Start the rebuild thread, once"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f'popularity-{self.table}', daemon=True)
+                self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            try:
+                complete = self.refresh()
+            except Exception as e:
+                logger.error(f"Ranking {self.table} by popularity failed: {str(e)}", exc_info=True)
+                with self._lock:
+                    self.failures += 1
+                complete = False
+            self._first_attempt.set()
+            delay = self.refresh_interval if complete else \
+                min(self.retry_delay * 2 ** (self.failures - 1), self.refresh_interval)
+            if not complete:
+                logger.warning(f"Popularity ranking of {self.table} incomplete ({self.failures} failures); "
+                               f"retrying in {delay:.0f}s")
+            time.sleep(delay)
+
+    def current(self):
+        """The current ranking tuple, waiting for the first build if it is still running"""
+        if self.refreshed_at is None and self._thread is not None:
+            self._first_attempt.wait(self.first_load_wait)
+        return self._ranking
+
+    def _order(self, ranking, followed_teams, followed_players):
+        """Ranking positions best first for a follow set, or None for the plain ranking"""
+        _, scores, tags, follow_orders = ranking
+        names = frozenset(name for name in (*followed_teams, *followed_players) if name in tags)
+        if not names:
+            return None
+        order = follow_orders.get(names)
+        if order is None:
+            boosted = scores.copy()
+            boosted[np.unique(np.concatenate([tags[name] for name in names]))] += self.follow_boost
+            # The plain ranking is already sorted, so a stable sort keeps its tie order
+            order = np.argsort(-boosted, kind='stable')
+            follow_orders[names] = order
+        return order
+
+    def recommend(self, followed_teams=(), followed_players=(), num_recommendations=5, offset=0):
+        """(recommendations, has_more) for one page of the ranking"""
+        ranking = self.current()
+        reel_ids, scores = ranking[0], ranking[1]
+        order = self._order(ranking, followed_teams or (), followed_players or ())
+        end = offset + num_recommendations
+        positions = order[offset:end] if order is not None else np.arange(offset, min(end, len(reel_ids)))
+        recommendations = [{"reel_id": reel_id, "predicted_score": float(score)}
+                           for reel_id, score in zip(reel_ids[positions].tolist(), scores[positions])]
+        return recommendations, end < len(reel_ids)
+
+    def followed(self, followed_teams=(), followed_players=(), limit=100):
+        """(reel_ids, scores) of the most popular highlights of the followed teams and players"""
+        reel_ids, scores, tags, _ = self.current()
+        ranks = [tags[name] for name in (*followed_teams, *followed_players) if name in tags]
+        if not ranks:
+            return reel_ids[:0], scores[:0]
+        # Ranks are positions in the sorted ranking, so the smallest are the most popular
+        positions = np.unique(np.concatenate(ranks))[:limit]
+        return reel_ids[positions], scores[positions]
+
+    def status(self):
+        age = self.age
+        return {
+            'highlights': len(self._ranking[0]),
+            'age_seconds': None if age is None else round(age, 3),
+            'last_refresh_seconds': round(self.last_refresh_seconds, 4),
+            'follow_sets_cached': len(self._ranking[3]),
+            'failures': self.failures,
+        }
+
+
+_rankers = {}
+_rankers_lock = threading.Lock()
+
+
+def get_popularity(table):
+    """Process-wide popularity ranker for a ratings table, its rebuild thread started on first use"""
+    check_rating_table(table)
+    with _rankers_lock:
+        if table not in _rankers:
+            _rankers[table] = PopularityRanker(table).start()
+        return _rankers[table]
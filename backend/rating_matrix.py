@@ -0,0 +1,207 @@
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+
+class RatingMatrix:
+    """Sparse users x reels rating matrix with compact id <-> position maps.
+
+    Replaces the dense pivot_table DataFrame: `ratings` is a float32 CSR matrix
+    whose rows follow `user_ids` and whose columns follow `reel_ids`. Zero
+    ratings are dropped. When a (user, reel) pair appears more than once the
+    last row wins, both when building and in updated(), as the ratings table
+    is written by upserts; rows should be passed in write order.
+    """
+
+    def __init__(self, ratings, user_ids, reel_ids):
+        self.ratings = ratings
+        self.user_ids = user_ids
+        self.reel_ids = reel_ids
+        self._user_lookup = None
+        self._reel_lookup = None
+
+    @classmethod
+    def from_rows(cls, user_ids, reel_ids, ratings, base=None):
+        """Build straight from parallel (user_id, reel_id, rating) sequences.
+
+        Ids are numbered in sorted order. Given a base matrix, every base id
+        keeps its base position instead (ids without ratings any more become
+        empty rows or columns) and new ids follow in sorted order, so
+        positions held by a model built on base stay valid.
+        """
+        ratings = np.asarray(ratings, dtype=np.float64)
+        user_codes, user_index = pd.factorize(np.asarray(user_ids), sort=True)
+        reel_codes, reel_index = pd.factorize(np.asarray(reel_ids), sort=True)
+
+        # Rows with a missing id or rating are skipped; factorize marks missing ids with -1
+        valid = (user_codes >= 0) & (reel_codes >= 0) & ~np.isnan(ratings)
+        user_codes = user_codes[valid].astype(np.int32)
+        reel_codes = reel_codes[valid].astype(np.int32)
+        ratings = ratings[valid]
+        user_index, reel_index = np.asarray(user_index), np.asarray(reel_index)
+        user_lookup = reel_lookup = None
+        if base is not None:
+            base.user_position(None), base.reel_position(None)
+            user_index, positions, user_lookup = cls._extend(base.user_ids, cls._like(base.user_ids, user_index),
+                                                             base._user_lookup)
+            user_codes = positions[user_codes]
+            reel_index, positions, reel_lookup = cls._extend(base.reel_ids, cls._like(base.reel_ids, reel_index),
+                                                             base._reel_lookup)
+            reel_codes = positions[reel_codes]
+
+        shape = (len(user_index), len(reel_index))
+        last = cls._last_writes(user_codes, reel_codes, shape)
+        matrix = csr_matrix((ratings[last].astype(np.float32), (user_codes[last], reel_codes[last])), shape=shape)
+        matrix.eliminate_zeros()
+        built = cls(matrix, user_index, reel_index)
+        built._user_lookup, built._reel_lookup = user_lookup, reel_lookup
+        return built
+
+    @classmethod
+    def from_frame(cls, frame, user_col='user_id', reel_col='reel_id', rating_col='rating', base=None):
+        """Build from a ratings DataFrame such as the one db.load_data returns"""
+        return cls.from_rows(frame[user_col].to_numpy(), frame[reel_col].to_numpy(),
+                             frame[rating_col].to_numpy(), base)
+
+    def updated(self, user_ids, reel_ids, ratings):
+        """New RatingMatrix with the given cells overwritten.
+
+        Unknown users and reels get new rows/columns appended after the existing
+        ones, and a rating of 0 clears the cell. When the same (user, reel) appears
+        more than once the last value wins, so rows should be passed in write
+        order. The current matrix is left untouched, so readers holding it keep a
+        consistent view.
+        """
+        ratings = np.asarray(ratings, dtype=np.float64)
+        user_ids = self._like(self.user_ids, user_ids)
+        reel_ids = self._like(self.reel_ids, reel_ids)
+        if len(ratings) == 0:
+            return self
+
+        self.user_position(None), self.reel_position(None)  # make sure both lookups exist
+        new_user_ids, user_codes, user_lookup = self._extend(self.user_ids, user_ids, self._user_lookup)
+        new_reel_ids, reel_codes, reel_lookup = self._extend(self.reel_ids, reel_ids, self._reel_lookup)
+        shape = (len(new_user_ids), len(new_reel_ids))
+
+        last = self._last_writes(user_codes, reel_codes, shape)
+        rows, cols, values = user_codes[last], reel_codes[last], ratings[last]
+
+        current = self.ratings.copy()
+        current.resize(shape)
+        pattern = csr_matrix((np.ones(len(last), dtype=np.float32), (rows, cols)), shape=shape)
+        delta = csr_matrix((values.astype(np.float32), (rows, cols)), shape=shape)
+        matrix = (current - current.multiply(pattern) + delta).tocsr()
+        matrix.eliminate_zeros()
+
+        updated = RatingMatrix(matrix, new_user_ids, new_reel_ids)
+        updated._user_lookup, updated._reel_lookup = user_lookup, reel_lookup
+        return updated
+
+    def extends(self, base):
+        """Whether every id of base is at its base position here, i.e. rows and columns were only appended"""
+        return all(len(ids) >= len(known) and (ids is known or np.array_equal(ids[:len(known)], known))
+                   for ids, known in ((self.user_ids, base.user_ids), (self.reel_ids, base.reel_ids)))
+
+    def aligned(self, base):
+        """Same ratings renumbered so base's ids keep their base positions; other ids follow in this matrix's order"""
+        base.user_position(None), base.reel_position(None)
+        user_ids, user_codes, user_lookup = self._extend(base.user_ids, self._like(base.user_ids, self.user_ids),
+                                                         base._user_lookup)
+        reel_ids, reel_codes, reel_lookup = self._extend(base.reel_ids, self._like(base.reel_ids, self.reel_ids),
+                                                         base._reel_lookup)
+        cells = self.ratings.tocoo()
+        matrix = csr_matrix((cells.data, (user_codes[cells.row], reel_codes[cells.col])),
+                            shape=(len(user_ids), len(reel_ids)))
+        aligned = RatingMatrix(matrix, user_ids, reel_ids)
+        aligned._user_lookup, aligned._reel_lookup = user_lookup, reel_lookup
+        return aligned
+
+    def values(self, user_ids, reel_ids):
+        """Current rating of each (user_id, reel_id) pair, 0 where there is none"""
+        rows, cols = self.user_positions(user_ids), self.reel_positions(reel_ids)
+        values = np.zeros(len(rows), dtype=np.float64)
+        known = (rows >= 0) & (cols >= 0)
+        if known.any():
+            values[known] = np.asarray(self.ratings[rows[known], cols[known]]).ravel()
+        return values
+
+    def user_positions(self, user_ids):
+        """Row of each user id, -1 for users not in the matrix"""
+        self.user_position(None)
+        return self._positions(self._user_lookup, self._like(self.user_ids, user_ids))
+
+    def reel_positions(self, reel_ids):
+        """Column of each reel id, -1 for reels not in the matrix"""
+        self.reel_position(None)
+        return self._positions(self._reel_lookup, self._like(self.reel_ids, reel_ids))
+
+    @staticmethod
+    def _positions(lookup, ids):
+        return np.fromiter((lookup.get(i, -1) for i in ids.tolist()), dtype=np.int64, count=len(ids))
+
+    def changed_users(self, newer):
+        """Row positions of this matrix's users whose ratings differ in a later updated() matrix"""
+        current = self.ratings.copy()
+        current.resize(newer.shape)
+        diff = (current != newer.ratings).tocoo()
+        rows = np.unique(diff.row)
+        return rows[rows < self.shape[0]]
+
+    @staticmethod
+    def _last_writes(user_codes, reel_codes, shape):
+        """Index of the last row for each distinct (user, reel) cell"""
+        keys = user_codes.astype(np.int64) * shape[1] + reel_codes
+        _, last = np.unique(keys[::-1], return_index=True)
+        return len(keys) - 1 - last
+
+    @staticmethod
+    def _like(known_ids, ids):
+        """Cast incoming ids (e.g. strings from query args) to the type already used in the matrix"""
+        ids = np.asarray(ids)
+        if len(known_ids) and known_ids.dtype.kind in 'iu':
+            return ids.astype(np.int64)
+        if len(known_ids) and isinstance(known_ids[0], str):
+            return ids.astype(str).astype(object)
+        return ids
+
+    @staticmethod
+    def _extend(known_ids, ids, lookup):
+        """Append unseen ids to known_ids; returns (ids, int32 codes, extended lookup)"""
+        unseen = [i for i in pd.unique(ids).tolist() if i not in lookup]
+        if unseen:
+            lookup = dict(lookup)
+            lookup.update((uid, len(known_ids) + i) for i, uid in enumerate(unseen))
+            unseen_ids = np.asarray(unseen, dtype=object if known_ids.dtype == object else None)
+            known_ids = np.concatenate([known_ids, unseen_ids])
+        codes = np.fromiter((lookup[i] for i in ids.tolist()), dtype=np.int32, count=len(ids))
+        return known_ids, codes, lookup
+
+    @property
+    def shape(self):
+        return self.ratings.shape
+
+    @property
+    def nnz(self):
+        return self.ratings.nnz
+
+    def user_position(self, user_id):
+        """Row of a user id, or None when the user has no ratings"""
+        if self._user_lookup is None:
+            self._user_lookup = {uid: i for i, uid in enumerate(self.user_ids.tolist())}
+        return self._user_lookup.get(user_id)
+
+    def reel_position(self, reel_id):
+        """Column of a reel id, or None when nobody has rated it"""
+        if self._reel_lookup is None:
+            self._reel_lookup = {rid: i for i, rid in enumerate(self.reel_ids.tolist())}
+        return self._reel_lookup.get(reel_id)
+
+    def __getstate__(self):
+        # The lookup dicts are rebuilt on demand; keep them out of the pickle
+        state = self.__dict__.copy()
+        state['_user_lookup'] = None
+        state['_reel_lookup'] = None
+        return state
+
+    def __repr__(self):
+        return f"RatingMatrix(users={self.shape[0]}, reels={self.shape[1]}, nnz={self.nnz})"
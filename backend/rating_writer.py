@@ -0,0 +1,225 @@
+import atexit
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import exc
+
+from db import check_rating_table, has_rating_key, has_rating_sequence, load_column_types, remove, upsert_ratings
+
+logger = logging.getLogger(__name__)
+
+# Flush once this many ratings are buffered, or this many seconds after the first one arrived
+FLUSH_SIZE = int(os.getenv('RATING_FLUSH_SIZE', 500))
+FLUSH_INTERVAL = float(os.getenv('RATING_FLUSH_INTERVAL', 1.0))
+# Past this many buffered ratings (e.g. while the database is down) add() refuses new pairs
+MAX_PENDING = int(os.getenv('RATING_MAX_PENDING', 50000))
+# Longest wait between flush attempts while the database keeps failing
+MAX_RETRY_DELAY = 30.0
+# Errors that say the database could not be reached, rather than that it rejected the rows
+RETRYABLE_ERRORS = (exc.OperationalError, exc.InterfaceError, exc.DisconnectionError, exc.TimeoutError)
+INTEGER_TYPES = ('smallint', 'integer', 'bigint')
+
+
+class RatingWriter(threading.Thread):
+    """Buffers rating writes for one table and flushes them in bulk.
+
+    add() only records the rating in memory, keyed by (user_id, reel_id) so a
+    later rating for the same pair replaces an earlier one still waiting; ids
+    go through key() first, so every pair has one form. A daemon thread
+    writes the buffer with multi-row upserts when it reaches flush_size or
+    flush_interval seconds after its oldest entry. When the database cannot
+    be reached the unwritten rows stay buffered and are retried with
+    backoff; when it rejects a chunk, the chunk is retried row by row and
+    the rows it still rejects are dropped and logged. Pending ratings are
+    flushed synchronously at interpreter exit.
+    """
+
+    def __init__(self, table, flush_size=FLUSH_SIZE, flush_interval=FLUSH_INTERVAL, max_pending=MAX_PENDING):
+        super().__init__(name=f"rating-writer-{table}", daemon=True)
+        self.table = table
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.flushes = 0
+        self.written = 0
+        self.failures = 0
+        self.rejected = 0
+        self.last_flush_seconds = 0.0
+        self._pending = {}
+        self._oldest = None
+        self._keyed = None
+        self._sequenced = None
+        self._id_types = None
+        self._failed_flushes = 0
+        self._failed_at = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+
+    def key(self, user_id, reel_id):
+        """(user_id, reel_id) cast to the table's column types; raises ValueError for ids they cannot hold"""
+        if self._id_types is None:
+            types = load_column_types(self.table)
+            if not types or 'user_id' not in types or 'reel_id' not in types:
+                raise RuntimeError(f"Column types of {self.table} are unavailable")
+            self._id_types = tuple(int if types[column] in INTEGER_TYPES else str
+                                   for column in ('user_id', 'reel_id'))
+        (user_type, reel_type), key = self._id_types, []
+        for value, cast in ((user_id, user_type), (reel_id, reel_type)):
+            value = str(value).strip()
+            if not value:
+                raise ValueError("Empty id")
+            key.append(cast(value))
+        return tuple(key)
+
+    def add(self, user_id, reel_id, rating):
+        """Buffer a rating for ids from key(); False when the buffer is full and the rating was not taken"""
+        with self._lock:
+            if len(self._pending) >= self.max_pending and (user_id, reel_id) not in self._pending:
+                return False
+            self._pending[(user_id, reel_id)] = rating
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            pending = len(self._pending)
+        if pending >= self.flush_size:
+            self._wake.set()
+        return True
+
+    def remove(self, user_id, reel_id):
+        """Delete a rating, buffered or written; returns whether the delete succeeded.
+
+        Holding the flush lock means a flush that already took the rating
+        from the buffer finishes (or puts it back) before the DELETE runs, so
+        the rating cannot be written again after it.
+        """
+        with self._flush_lock:
+            with self._lock:
+                self._pending.pop((user_id, reel_id), None)
+            return remove(user_id, reel_id, self.table)
+
+    def flush(self):
+        """Write everything buffered now; returns False if the database could not be reached"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending, self._oldest = self._pending, {}, None
+            if not batch:
+                return True
+            rows = [(user_id, reel_id, rating) for (user_id, reel_id), rating in batch.items()]
+            if self._keyed is None:
+                self._sequenced = has_rating_sequence(self.table)
+                self._keyed = has_rating_key(self.table)
+                if self._sequenced is None or self._keyed is None:
+                    self._keyed = None
+                    return self._failed(rows, "schema check failed")
+
+            start = time.perf_counter()
+            written = 0
+            for begin in range(0, len(rows), self.flush_size):
+                try:
+                    written += self._write(rows[begin:begin + self.flush_size])
+                except RETRYABLE_ERRORS as e:
+                    # Chunks already written stay written; only this one and the rest go back
+                    self.written += written
+                    return self._failed(rows[begin:], str(e))
+
+            self.last_flush_seconds = time.perf_counter() - start
+            self.flushes += 1
+            self.written += written
+            self._failed_flushes = 0
+            return True
+
+    def _write(self, rows):
+        """Upsert rows, one by one if the database rejects them together; returns how many were written.
+
+        A row the database rejects on its own is dropped. RETRYABLE_ERRORS are
+        raised to the caller.
+        """
+        try:
+            upsert_ratings(self.table, rows, self._keyed, self._sequenced)
+            return len(rows)
+        except RETRYABLE_ERRORS:
+            raise
+        except Exception as e:
+            if len(rows) == 1:
+                self.rejected += 1
+                logger.error(f"Dropping rating {rows[0]} for {self.table}: {str(e)}")
+                return 0
+            logger.warning(f"{self.table} rejected {len(rows)} ratings ({str(e)}); writing them one by one")
+        return sum(self._write([row]) for row in rows)
+
+    def _failed(self, rows, reason):
+        """Put unwritten rows back in the buffer, behind any newer rating for the same pair"""
+        self.failures += 1
+        self._failed_flushes += 1
+        self._failed_at = time.monotonic()
+        with self._lock:
+            pending = {(user_id, reel_id): rating for user_id, reel_id, rating in rows}
+            pending.update(self._pending)
+            self._pending = pending
+            self._oldest = self._oldest or time.monotonic()
+        logger.error(f"Flushing {len(rows)} ratings to {self.table} failed ({reason}); {len(pending)} pending")
+        return False
+
+    def run(self):
+        while not self._stopped:
+            with self._lock:
+                oldest, pending = self._oldest, len(self._pending)
+            if oldest is None:
+                wait = self.flush_interval
+            elif self._failed_flushes:
+                # Back off while the database keeps failing, however full the buffer gets
+                delay = min(self.flush_interval * 2 ** self._failed_flushes, MAX_RETRY_DELAY)
+                wait = delay - (time.monotonic() - self._failed_at)
+            elif pending >= self.flush_size:
+                wait = 0.0
+            else:
+                wait = self.flush_interval - (time.monotonic() - oldest)
+            if oldest is not None and wait <= 0:
+                self.flush()
+                continue
+            self._wake.wait(wait)
+            self._wake.clear()
+
+    def close(self):
+        """Stop the thread and write whatever is still buffered"""
+        self._stopped = True
+        self._wake.set()
+        return self.flush()
+
+    def status(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            'table': self.table,
+            'pending': pending,
+            'flushes': self.flushes,
+            'written': self.written,
+            'failures': self.failures,
+            'rejected': self.rejected,
+            'last_flush_seconds': round(self.last_flush_seconds, 4),
+            'upsert': 'on_conflict' if self._keyed else ('delete_insert' if self._keyed is False else None),
+        }
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_rating_writer(table):
+    """Process-wide started RatingWriter for a ratings table"""
+    check_rating_table(table)
+    with _writers_lock:
+        if table not in _writers:
+            writer = RatingWriter(table)
+            writer.start()
+            _writers[table] = writer
+        return _writers[table]
+
+
+@atexit.register
+def _flush_on_exit():
+    for writer in list(_writers.values()):
+        writer.close()
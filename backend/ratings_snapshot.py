@@ -0,0 +1,250 @@
+import logging
+import os
+import threading
+import time
+import weakref
+
+import numpy as np
+
+from db import check_rating_table, has_rating_sequence, load_data, load_ratings_since
+from rating_matrix import RatingMatrix
+
+logger = logging.getLogger(__name__)
+
+# Seconds between incremental refreshes, and between full reloads (which also pick up deletes)
+REFRESH_INTERVAL = float(os.getenv('RATINGS_REFRESH_INTERVAL', 30))
+FULL_RELOAD_INTERVAL = float(os.getenv('RATINGS_FULL_RELOAD_INTERVAL', 60 * 60))
+# Sequence numbers below the high-water mark read again on every refresh. rating_seq is taken when a
+# row is written but becomes visible when its transaction commits, so a row can appear below the mark.
+SEQUENCE_OVERLAP = int(os.getenv('RATINGS_SEQUENCE_OVERLAP', 1000))
+# Ratings folded in by apply() are merged into the matrix once this many are queued, or this many seconds
+# after the first one, so the matrix is rebuilt once per batch rather than once per rating
+MERGE_SIZE = int(os.getenv('RATINGS_MERGE_SIZE', 1000))
+MERGE_INTERVAL = float(os.getenv('RATINGS_MERGE_INTERVAL', 2))
+# Merges whose changed users are remembered for changes_since()
+CHANGES_KEPT = 64
+
+
+class RatingsSnapshot:
+    """In-process RatingMatrix of one ratings table.
+
+    The first refresh loads the whole table; after that only rows whose
+    rating_seq is above the high-water mark are read and folded into the
+    matrix, so a refresh costs time proportional to the number of new ratings
+    rather than to the size of the table. The last `overlap` sequence numbers
+    below the mark are read again each time, so rows whose transactions
+    committed out of sequence order are not skipped. Tables that
+    migrate_ratings.py has not given a rating_seq column are fully reloaded
+    every time.
+
+    Ratings the application has just written are queued by apply() and
+    merged in batches of up to merge_size, at the latest merge_interval
+    seconds after the first one was queued. Every change to the matrix
+    records which users it touched, so a model can be refitted for just
+    those users (changes_since) instead of diffing the whole matrix.
+    """
+
+    def __init__(self, table, refresh_interval=REFRESH_INTERVAL, full_reload_interval=FULL_RELOAD_INTERVAL,
+                 overlap=SEQUENCE_OVERLAP, merge_size=MERGE_SIZE, merge_interval=MERGE_INTERVAL):
+        self.table = table
+        self.refresh_interval = refresh_interval
+        self.full_reload_interval = full_reload_interval
+        self.overlap = overlap
+        self.merge_size = merge_size
+        self.merge_interval = merge_interval
+        self.matrix = None
+        self.high_water_mark = 0
+        self.refreshed_at = None
+        self.full_reload_at = None
+        self.last_refresh_rows = 0
+        self.last_refresh_seconds = 0.0
+        self.change_count = 0
+        self.merges = 0
+        self._incremental = None
+        self._pending = []
+        self._pending_since = None
+        self._changes = []
+        self._lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+
+    @property
+    def age(self):
+        """Seconds since the last successful refresh, or None before the first one"""
+        if self.refreshed_at is None:
+            return None
+        return time.time() - self.refreshed_at
+
+    def refresh(self, full=False):
+        """Pull new rows from the database; returns the current matrix"""
+        with self._lock:
+            if not self._incremental:
+                # Checked until it succeeds, so a migration run later is picked up without a restart
+                self._incremental = has_rating_sequence(self.table)
+            full = full or self.matrix is None or not self._incremental or (
+                time.time() - self.full_reload_at > self.full_reload_interval)
+
+            start = time.perf_counter()
+            rows = self._load(full)
+            if rows is None:
+                return self.matrix
+
+            if full:
+                # Keep existing ids at their positions, which the published model's arrays are indexed by
+                matrix = RatingMatrix.from_frame(rows, base=self.matrix)
+                if self.matrix is None:
+                    self.matrix = matrix
+                else:
+                    self._replace(matrix, self.matrix.changed_users(matrix))
+                self.full_reload_at = time.time()
+            elif len(rows):
+                self._update(rows['user_id'].to_numpy(), rows['reel_id'].to_numpy(), rows['rating'].to_numpy())
+            # Queued ratings go on top: the writer may not have flushed them yet
+            self._merge()
+            if 'rating_seq' in rows and rows['rating_seq'].notna().any():
+                self.high_water_mark = max(self.high_water_mark, int(rows['rating_seq'].max()))
+
+            self.refreshed_at = time.time()
+            self.last_refresh_rows = len(rows)
+            self.last_refresh_seconds = time.perf_counter() - start
+            logger.info(f"{'Reloaded' if full else 'Refreshed'} {self.table}: {len(rows)} rows in "
+                        f"{self.last_refresh_seconds:.3f}s, high-water mark {self.high_water_mark}")
+            return self.matrix
+
+    def _load(self, full):
+        if self._incremental:
+            return load_ratings_since(self.table, None if full else max(0, self.high_water_mark - self.overlap))
+        return load_data(self.table)
+
+    def _update(self, user_ids, reel_ids, ratings):
+        # Rows read again (the overlap, or ratings apply() already merged) are not changes
+        ratings = np.asarray(ratings, dtype=np.float32)
+        changed = self.matrix.values(user_ids, reel_ids) != ratings
+        if not changed.any():
+            return
+        self.change_count += int(changed.sum())
+        matrix = self.matrix.updated(user_ids, reel_ids, ratings)
+        # updated() only appends rows, so these positions hold in every later matrix too
+        self._replace(matrix, np.unique(matrix.user_positions(np.asarray(user_ids)[changed])))
+
+    def _replace(self, matrix, changed_users):
+        """Swap in matrix, remembering which rows of it differ from the one it replaces"""
+        # A new list, so changes_since() can read the old one without the lock
+        change = (weakref.ref(self.matrix), np.asarray(changed_users, dtype=np.int64))
+        self._changes = (self._changes + [change])[-CHANGES_KEPT:]
+        self.matrix = matrix
+
+    def changes_since(self, matrix):
+        """Rows of the current matrix whose ratings changed after matrix was current.
+
+        None when matrix is not a recent version of this snapshot's matrix, in
+        which case the caller has to compare the two (RatingMatrix.changed_users).
+        """
+        changes = self._changes
+        for begin, (previous, _) in enumerate(changes):
+            if previous() is matrix:
+                return np.unique(np.concatenate([rows for _, rows in changes[begin:]]))
+        return None
+
+    def apply(self, user_ids, reel_ids, ratings):
+        """Queue ratings that were just written for the next merge into the matrix.
+
+        A rating of 0 removes the cell. Queuing is constant time; the queue is
+        merged in one update by the next refresh_if_stale() once merge_size
+        ratings are waiting or merge_interval seconds have passed. The same rows
+        come back through the next incremental refresh, which simply rewrites
+        the same values. Returns the current matrix, or None before the first load.
+        """
+        if self.matrix is None:
+            return None
+        with self._pending_lock:
+            self._pending.extend(zip(user_ids, reel_ids, ratings))
+            if self._pending_since is None:
+                self._pending_since = time.time()
+        return self.matrix
+
+    def merge(self):
+        """Merge queued ratings into the matrix now; returns the current matrix"""
+        with self._lock:
+            self._merge()
+            return self.matrix
+
+    def _merge(self):
+        with self._pending_lock:
+            pending, self._pending, self._pending_since = self._pending, [], None
+        if pending and self.matrix is not None:
+            user_ids, reel_ids, ratings = zip(*pending)
+            self._update(list(user_ids), list(reel_ids), list(ratings))
+            self.merges += 1
+
+    @property
+    def merge_due(self):
+        """Whether enough ratings have been queued, or for long enough, to merge them"""
+        since = self._pending_since
+        return since is not None and (len(self._pending) >= self.merge_size or
+                                      time.time() - since >= self.merge_interval)
+
+    def seed(self, matrix, high_water_mark, loaded_at):
+        """Start from a saved matrix instead of a full table load; the next refresh reads only newer rows"""
+        with self._lock:
+            if self.matrix is not None:
+                return self.matrix
+            self.matrix = matrix
+            self._changes = []
+            self.high_water_mark = high_water_mark
+            self.refreshed_at = loaded_at
+            self.full_reload_at = loaded_at
+            return self.matrix
+
+    def align(self, matrix):
+        """Renumber the live matrix so matrix's ids keep their positions in it.
+
+        Needed when a model built from another process's matrix (e.g. an
+        artifact another worker saved) is served against this snapshot.
+        """
+        with self._lock:
+            if self.matrix is not None and not self.matrix.extends(matrix):
+                # Renumbered rows make the recorded changes meaningless
+                self.matrix = self.matrix.aligned(matrix)
+                self._changes = []
+            return self.matrix
+
+    def refresh_if_stale(self):
+        """Refresh when older than refresh_interval, else merge queued ratings when due.
+
+        Never waits on a refresh or merge already in progress.
+        """
+        if self.matrix is not None and self._lock.locked():
+            return self.matrix
+        if self.matrix is not None and self.age < self.refresh_interval:
+            return self.merge() if self.merge_due else self.matrix
+        return self.refresh()
+
+    def status(self):
+        age = self.age
+        return {
+            'table': self.table,
+            'incremental': bool(self._incremental),
+            'high_water_mark': self.high_water_mark,
+            'age_seconds': None if age is None else round(age, 3),
+            'users': self.matrix.shape[0] if self.matrix is not None else 0,
+            'reels': self.matrix.shape[1] if self.matrix is not None else 0,
+            'nnz': self.matrix.nnz if self.matrix is not None else 0,
+            'last_refresh_rows': self.last_refresh_rows,
+            'last_refresh_seconds': round(self.last_refresh_seconds, 4),
+            'change_count': self.change_count,
+            'pending': len(self._pending),
+            'merges': self.merges,
+        }
+
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+def get_snapshot(table):
+    """Process-wide snapshot for a ratings table"""
+    check_rating_table(table)
+    with _snapshots_lock:
+        if table not in _snapshots:
+            _snapshots[table] = RatingsSnapshot(table)
+        return _snapshots[table]
@@ -0,0 +1,74 @@
+import os
+import secrets
+import threading
+
+import numpy as np
+from cachetools import TTLCache
+
+# Nearest neighbors fetched by the first page of a vector search; later pages are slices of them
+CURSOR_RESULTS = int(os.getenv('VECTOR_CURSOR_RESULTS', 300))
+# Seconds an unused cursor is kept
+CURSOR_TTL = float(os.getenv('VECTOR_CURSOR_TTL', 15 * 60))
+CURSORS_CACHED = int(os.getenv('VECTOR_CURSORS_CACHED', 10000))
+
+
+class ResultCursors:
+    """Ranked result sets kept in memory under opaque tokens.
+
+    A search is run once for the top `limit` results; open() stores the ids
+    and distances under the key of the search that produced them and returns
+    a token, and page() serves slices of them to callers presenting the same
+    token and key until the token goes ttl seconds without use. Tokens live
+    in one process: a client whose token is unknown (expired, issued by
+    another worker, or for another search) gets the search run again under a
+    new cursor. A full cursor may have been cut off at `limit`, so its last
+    page still reports more results; callers fetch pages past `limit` from
+    the database directly.
+    """
+
+    def __init__(self, ttl=CURSOR_TTL, maxsize=CURSORS_CACHED, limit=CURSOR_RESULTS):
+        self.limit = limit
+        self.opened = 0
+        self.misses = 0
+        self._results = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def open(self, results, key):
+        """Token for results, a best-first list of {'id', 'distance'} as returned by db.search_feature,
+        found by the search identified by key"""
+        token = secrets.token_urlsafe(16)
+        ids = np.array([row['id'] for row in results], dtype=object)
+        distances = np.array([row['distance'] for row in results], dtype=np.float64)
+        with self._lock:
+            self._results[token] = (key, ids, distances)
+            self.opened += 1
+        return token
+
+    def page(self, token, key, start, amount):
+        """(ids, distances, has_more) of one slice, or None for an unknown or expired token or another key"""
+        with self._lock:
+            entry = self._results.get(token) if token else None
+            if entry is None or entry[0] != key:
+                self.misses += bool(token)
+                return None
+            # Storing it again restarts its TTL
+            self._results[token] = entry
+        _, ids, distances = entry
+        end = start + amount
+        return ids[start:end].tolist(), distances[start:end].tolist(), end < len(ids) or len(ids) >= self.limit
+
+    def status(self):
+        return {'open': len(self._results), 'opened': self.opened, 'misses': self.misses, 'limit': self.limit}
+
+
+_cursors = None
+_cursors_lock = threading.Lock()
+
+
+def get_cursors():
+    """Process-wide ResultCursors"""
+    global _cursors
+    with _cursors_lock:
+        if _cursors is None:
+            _cursors = ResultCursors()
+        return _cursors
@@ -0,0 +1,88 @@
+import numpy as np
+
+WEIGHTING_MODES = ('uniform', 'similarity')
+
+
+def neighbor_weights(distances, weighting='uniform'):
+    """Per-neighbor weights from kneighbors cosine distances"""
+    distances = np.asarray(distances, dtype=np.float64).ravel()
+    if weighting == 'uniform':
+        return np.ones_like(distances)
+    if weighting == 'similarity':
+        # cosine distance is 1 - similarity; negative similarity carries no signal
+        return np.clip(1.0 - distances, 0.0, None)
+    raise ValueError(f"Unknown weighting '{weighting}', expected one of {WEIGHTING_MODES}")
+
+
+def unrated_mask(rating_rows, user_index):
+    """Boolean vector that is True for every reel the user has not rated"""
+    row = rating_rows[user_index]
+    mask = np.ones(rating_rows.shape[1], dtype=bool)
+    mask[row.indices[row.data != 0]] = False
+    return mask
+
+
+def score_reels(rating_rows, user_index, neighbor_indices, distances=None, weighting='uniform'):
+    """Weighted neighbor rating sum for every reel as one sparse matrix-vector product.
+
+    Returns (scores, candidates) where candidates masks out reels the user already
+    rated. The user's own row is dropped from the neighbor list. candidates is None
+    when the user has no neighbors, in which case there is nothing to recommend.
+    """
+    neighbor_indices = np.asarray(neighbor_indices).ravel()
+    if distances is None:
+        distances = np.zeros(len(neighbor_indices))
+    distances = np.asarray(distances, dtype=np.float64).ravel()
+
+    keep = neighbor_indices != user_index
+    neighbors = neighbor_indices[keep]
+    if len(neighbors) == 0:
+        return np.zeros(rating_rows.shape[1]), None
+
+    weights = neighbor_weights(distances[keep], weighting)
+    scores = np.asarray(rating_rows[neighbors].T @ weights).ravel()
+    return scores, unrated_mask(rating_rows, user_index)
+
+
+def top_k(scores, candidates, k):
+    """Column positions of the k best candidate scores, best first.
+
+    Uses argpartition to find the k-th best score instead of sorting every
+    candidate. Ties are broken by column position so that successive pages of
+    the same ranking never overlap or skip reels.
+    """
+    positions = np.flatnonzero(candidates)
+    if k <= 0 or len(positions) == 0:
+        return positions[:0]
+    if k < len(positions):
+        candidate_scores = scores[positions]
+        cut = len(positions) - k
+        kth = candidate_scores[np.argpartition(candidate_scores, cut)[cut]]
+        above = positions[candidate_scores > kth]
+        ties = positions[candidate_scores == kth][:k - len(above)]
+        positions = np.concatenate([above, ties])
+    order = np.lexsort((positions, -scores[positions]))
+    return positions[order]
+
+
+def paginate(scores, candidates, limit, offset=0):
+    """Slice one page out of the ranking; returns (positions, has_more)"""
+    total = int(np.count_nonzero(candidates))
+    end = min(offset + limit, total)
+    positions = top_k(scores, candidates, end)[offset:end]
+    return positions, end < total
+
+
+def popularity_scores(rating_counts, rating_sums, net_votes=0, prior_ratings=5.0, vote_weight=1.0):
+    """Per-reel popularity: damped mean rating times log rating count, plus log-scaled net votes.
+
+    prior_ratings is how many ratings worth of the overall mean are blended into
+    each reel's mean, so a single 5-star rating does not top the chart.
+    """
+    rating_counts = np.asarray(rating_counts, dtype=np.float64)
+    rating_sums = np.asarray(rating_sums, dtype=np.float64)
+    net_votes = np.asarray(net_votes, dtype=np.float64)
+    total = rating_counts.sum()
+    prior_mean = rating_sums.sum() / total if total else 0.0
+    damped_mean = (rating_sums + prior_ratings * prior_mean) / (rating_counts + prior_ratings)
+    return damped_mean * np.log1p(rating_counts) + vote_weight * np.sign(net_votes) * np.log1p(np.abs(net_votes))
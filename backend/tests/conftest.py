@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The backend modules import each other by bare name, as app.py runs from backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# db and gemini refuse to import without credentials; nothing here connects with them
+os.environ.setdefault('DB_PASS', 'test')
+os.environ.setdefault('GOOGLE_API_KEY', 'test')
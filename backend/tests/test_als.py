@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.sparse import csr_matrix, vstack
+
+from als import ImplicitALS, implicit_weights
+from cfknn import recommend_reels_by_factors
+from rating_matrix import RatingMatrix
+
+
+@pytest.fixture(scope='module')
+def ratings():
+    """Two taste groups: even users watch reels 0-9, odd users reels 10-19"""
+    rng = np.random.default_rng(2)
+    rows, cols = [], []
+    for user in range(60):
+        reels = rng.choice(10, size=6, replace=False) + (user % 2) * 10
+        rows.extend([user] * 6)
+        cols.extend(reels)
+    return csr_matrix((np.full(len(rows), 4.0, dtype=np.float32), (rows, cols)), shape=(60, 20))
+
+
+@pytest.fixture(scope='module')
+def model(ratings):
+    return ImplicitALS(factors=8, iterations=10, threads=1).fit(ratings)
+
+
+def test_scores_follow_the_taste_groups(model):
+    even, odd = model.scores(0), model.scores(1)
+    assert even[:10].mean() > even[10:].mean()
+    assert odd[10:].mean() > odd[:10].mean()
+
+
+def test_refit_folds_in_new_and_changed_users_only(ratings, model):
+    # User 0 switches to the odd group's reels; a new user joins the even group
+    changed = ratings.tolil()
+    changed[0] = 0
+    changed[0, [10, 11, 12, 13]] = 4
+    grown = vstack([changed.tocsr(), csr_matrix(([4.0] * 4, ([0] * 4, [0, 1, 2, 3])), shape=(1, 20))]).tocsr()
+
+    refitted = ImplicitALS(**model.params())
+    refitted.user_factors_, refitted.item_factors_ = model.user_factors_, model.item_factors_
+    refitted.refit(grown, [0])
+
+    assert refitted.user_factors_.shape == (61, 8)
+    np.testing.assert_array_equal(refitted.user_factors_[1:60], model.user_factors_[1:60])
+    assert refitted.item_factors_ is model.item_factors_
+    assert refitted.scores(0)[10:].mean() > refitted.scores(0)[:10].mean()
+    assert refitted.scores(60)[:10].mean() > refitted.scores(60)[10:].mean()
+
+
+def test_recommendations_skip_rated_reels(ratings, model):
+    matrix = RatingMatrix(ratings, np.arange(100, 160), np.array([f"r{i}" for i in range(20)], dtype=object))
+    recommendations, has_more = recommend_reels_by_factors(100, model, matrix, num_recommendations=20)
+
+    rated = {f"r{i}" for i in ratings[0].indices}
+    recommended = [row['reel_id'] for row in recommendations]
+    assert len(recommended) == 14 and not has_more
+    assert not rated & set(recommended)
+    scores = [row['predicted_score'] for row in recommendations]
+    assert scores == sorted(scores, reverse=True)
+    assert recommend_reels_by_factors(999, model, matrix) == ([], False)
+
+
+def test_implicit_weights_add_feedback_for_known_pairs():
+    matrix = RatingMatrix.from_rows([1, 2], ['a', 'b'], [3, 4])
+    feedback = pd.DataFrame({'user_id': ['1', '2', '9'], 'reel_id': ['a', 'a', 'a'], 'weight': [2.0, 1.0, 5.0]})
+    assert implicit_weights(matrix, feedback).toarray().tolist() == [[5, 0], [1, 4]]
+    assert implicit_weights(matrix, None) is matrix.ratings
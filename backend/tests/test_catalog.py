@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import catalog
+from catalog import HighlightCatalog
+
+# A highlight stored once per player, as mlb_highlights does
+ROWS = pd.DataFrame([
+    ('1', 'u1', 'Judge homers', 'a', 'Aaron Judge', 'New York Yankees', 'Boston Red Sox'),
+    ('1', 'u1', 'Judge homers', 'a', 'Juan Soto', 'New York Yankees', 'Boston Red Sox'),
+    ('2', 'u2', 'Betts doubles', 'b', 'Mookie Betts', 'Los Angeles Dodgers', 'New York Yankees'),
+    ('3', 'u3', 'Ohtani strikes out', 'c', 'Shohei Ohtani', 'Los Angeles Dodgers', 'Chicago Cubs'),
+    ('4', 'u4', 'Devers singles', 'd', None, 'Boston Red Sox', 'Chicago Cubs'),
+], columns=['reel_id', 'url', 'title', 'blurb', 'player', 'home_team', 'away_team'])
+
+
+@pytest.fixture
+def highlights(monkeypatch):
+    monkeypatch.setattr(catalog, 'load_highlights', lambda: ROWS)
+    highlights = HighlightCatalog()
+    assert highlights.refresh()
+    return highlights
+
+
+def ids(highlights, positions):
+    return highlights.reel_ids(positions).tolist()
+
+
+def test_followed_matches_home_and_away_teams_and_every_player_row(highlights):
+    assert ids(highlights, highlights.followed(['New York Yankees'])) == ['1', '2']
+    assert ids(highlights, highlights.followed([], ['Juan Soto'])) == ['1']
+    assert ids(highlights, highlights.followed(['Chicago Cubs'], ['Aaron Judge'])) == ['1', '3', '4']
+    assert len(highlights.followed(['Unknown Team'], ['Nobody'])) == 0
+    assert len(highlights.followed()) == 0
+
+
+def test_tagged_lists_every_name_across_columns(highlights):
+    reel_ids, tagged = highlights.tagged()
+    assert reel_ids.tolist() == ['1', '2', '3', '4']
+    named = {name: reel_ids[positions].tolist() for name, positions in tagged.items()}
+    assert named['New York Yankees'] == ['1', '2']
+    assert named['Los Angeles Dodgers'] == ['2', '3']
+    assert named['Juan Soto'] == ['1']
+    assert named['Chicago Cubs'] == ['3', '4']
+    assert None not in named and len(named) == 8
+
+
+def test_shuffled_is_stable_for_a_seed(highlights):
+    order = highlights.shuffled([1, 2, 3]).tolist()
+    assert sorted(order) == ['1', '2', '3', '4']
+    assert highlights.shuffled([1, 2, 3]).tolist() == order
+    orders = {tuple(highlights.shuffled([1, 2, seed]).tolist()) for seed in range(20)}
+    assert len(orders) > 1
+
+
+def test_shuffled_order_survives_a_reload_in_another_row_order(highlights, monkeypatch):
+    positions = highlights.followed(['Los Angeles Dodgers', 'Chicago Cubs'])
+    order = highlights.shuffled(7, positions).tolist()
+    assert sorted(order) == ['2', '3', '4']
+    monkeypatch.setattr(catalog, 'load_highlights', lambda: ROWS.iloc[::-1])
+    assert highlights.refresh()
+    positions = highlights.followed(['Los Angeles Dodgers', 'Chicago Cubs'])
+    assert highlights.shuffled(7, positions).tolist() == order
+
+
+def test_failed_reload_keeps_the_catalog(highlights, monkeypatch):
+    monkeypatch.setattr(catalog, 'load_highlights', lambda: None)
+    assert highlights.refresh() is False
+    assert highlights.failures == 1 and highlights.version == 1
+    assert highlights.count() == 4
+
+
+def test_empty_catalog():
+    highlights = HighlightCatalog()
+    reel_ids, tagged = highlights.tagged()
+    assert len(reel_ids) == 0 and tagged == {}
+    assert len(highlights.followed(['New York Yankees'])) == 0
+    assert len(highlights.shuffled(1)) == 0
+    assert np.array_equal(highlights.positions(['1']), [-1])
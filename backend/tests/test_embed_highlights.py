@@ -0,0 +1,84 @@
+import os
+
+import pandas as pd
+
+from embed_highlights import FakeEmbedder, load_checkpoint, run
+
+
+def documents(count):
+    return pd.DataFrame({'reel_id': [f"{i:03d}" for i in range(count)], 'text': [f"Play {i}" for i in range(count)]})
+
+
+class Writer:
+    """Collects written rows; refuses every write after the first `accept` ones"""
+
+    def __init__(self, accept=None):
+        self.accept = accept
+        self.rows = []
+        self.calls = 0
+
+    def __call__(self, rows):
+        self.calls += 1
+        if self.accept is not None and self.calls > self.accept:
+            return False
+        self.rows.extend(rows)
+        return True
+
+
+def options(checkpoint_path):
+    return dict(checkpoint_path=checkpoint_path, batch_size=5, write_size=10, concurrency=2, backoff=0.0)
+
+
+def test_run_resumes_after_the_last_written_id(tmp_path):
+    checkpoint = str(tmp_path / 'checkpoint.json')
+    embed = FakeEmbedder(dimensions=8)
+
+    first = Writer(accept=2)
+    stats = run(documents(50), embed, embed.model, first, **options(checkpoint))
+    assert not stats['complete']
+    assert stats['written'] == 20
+    assert load_checkpoint(checkpoint, 'embeddings', embed.model) == '019'
+
+    second = Writer()
+    stats = run(documents(50), embed, embed.model, second, **options(checkpoint))
+    assert stats['complete']
+    assert stats['resumed_after'] == '019'
+    assert stats['skipped_checkpoint'] == 20
+    assert [row[0] for row in first.rows + second.rows] == [f"{i:03d}" for i in range(50)]
+    assert not os.path.exists(checkpoint)
+
+
+def test_run_skips_unchanged_documents(tmp_path):
+    embed = FakeEmbedder(dimensions=8)
+    writer = Writer()
+    run(documents(10), embed, embed.model, writer, **options(None))
+    stored = {reel_id: content_hash for reel_id, _, content_hash in writer.rows}
+
+    stats = run(documents(12), embed, embed.model, Writer(), stored, **options(None))
+    assert stats['skipped_unchanged'] == 10
+    assert stats['embedded'] == 2
+
+
+def test_run_without_a_checkpoint_path_leaves_the_checkpoint_alone(tmp_path):
+    checkpoint = str(tmp_path / 'checkpoint.json')
+    embed = FakeEmbedder(dimensions=8)
+    run(documents(30), embed, embed.model, Writer(accept=1), **options(checkpoint))
+
+    stats = run(documents(30), embed, embed.model, Writer(), **options(None))
+    assert stats['complete'] and stats['resumed_after'] is None
+    assert load_checkpoint(checkpoint, 'embeddings', embed.model) == '009'
+
+
+def test_short_embedding_responses_are_retried(tmp_path):
+    embed = FakeEmbedder(dimensions=8)
+    calls = []
+
+    def flaky(texts):
+        calls.append(len(texts))
+        vectors = embed(texts)
+        return vectors[:-1] if len(calls) == 1 else vectors
+
+    writer = Writer()
+    stats = run(documents(5), flaky, embed.model, writer, **options(None))
+    assert stats['complete'] and stats['retries'] == 1
+    assert len(writer.rows) == 5
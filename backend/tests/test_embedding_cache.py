@@ -0,0 +1,44 @@
+from embedding_cache import EmbeddingCache
+
+
+class Compute:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, text):
+        self.calls += 1
+        return [1.0, 2.0]
+
+
+def test_hits_memory_then_the_store(tmp_path):
+    path = str(tmp_path / 'cache' / 'embeddings.sqlite')
+    compute = Compute()
+    assert EmbeddingCache(path).get('Shohei  Ohtani', 'm', compute).tolist() == [1.0, 2.0]
+
+    cache = EmbeddingCache(path)
+    assert cache.get(' Shohei Ohtani', 'm', compute).tolist() == [1.0, 2.0]
+    assert cache.get('Shohei Ohtani', 'm', compute).tolist() == [1.0, 2.0]
+    assert compute.calls == 1
+    assert (cache.disk_hits, cache.memory_hits) == (1, 1)
+
+
+def test_falls_back_to_memory_when_the_store_cannot_be_opened(tmp_path):
+    blocker = tmp_path / 'file'
+    blocker.write_text('')
+    cache = EmbeddingCache(str(blocker / 'embeddings.sqlite'))
+    compute = Compute()
+
+    assert cache.get('Mike Trout', 'm', compute).tolist() == [1.0, 2.0]
+    assert cache.get('Mike Trout', 'm', compute).tolist() == [1.0, 2.0]
+    assert cache.get('Aaron Judge', 'm', compute).tolist() == [1.0, 2.0]
+    assert compute.calls == 2
+    status = cache.status()
+    assert status['store_unavailable']
+    # The failed open is remembered, not retried on every lookup
+    assert status['store_errors'] == 1
+
+
+def test_failed_computes_are_not_cached(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / 'embeddings.sqlite'))
+    assert cache.get('Mookie Betts', 'm', lambda text: None) is None
+    assert cache.get('Mookie Betts', 'm', Compute()).tolist() == [1.0, 2.0]
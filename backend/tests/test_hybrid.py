@@ -0,0 +1,60 @@
+import numpy as np
+
+import hybrid
+from hybrid import blend
+
+
+def source(reel_ids, scores):
+    return np.array(reel_ids, dtype=object), np.array(scores, dtype=np.float64)
+
+
+def test_blend_sums_weighted_scaled_scores():
+    reel_ids, scores, sources = blend({
+        'cf': source(['a', 'b', 'c'], [4.0, 3.0, 2.0]),
+        'vector': source(['c', 'd'], [-0.1, -0.5]),
+    }, weights={'cf': 1.0, 'vector': 0.5})
+    # cf scales to a=1, b=.5, c=0; vector to c=1, d=0
+    assert reel_ids.tolist() == ['a', 'b', 'c', 'd']
+    np.testing.assert_allclose(scores, [1.0, 0.5, 0.5, 0.0])
+    assert sources.tolist() == [[True, False], [True, False], [True, True], [False, True]]
+
+
+def test_blend_ties_keep_reel_id_order():
+    reel_ids, _, _ = blend({'follow': source(['d', 'b', 'c', 'a'], [1.0, 1.0, 1.0, 1.0])})
+    assert reel_ids.tolist() == ['a', 'b', 'c', 'd']
+
+
+def test_blend_takes_a_reels_best_score_within_a_source():
+    reel_ids, scores, _ = blend({'cf': source(['a', 'b', 'a'], [0.0, 1.0, 2.0])}, weights={'cf': 1.0})
+    assert reel_ids.tolist() == ['a', 'b']
+    np.testing.assert_allclose(scores, [1.0, 0.5])
+
+
+def test_blend_unweighted_source_adds_nothing():
+    _, scores, sources = blend({'cf': source(['a'], [1.0]), 'other': source(['a', 'b'], [1.0, 0.0])},
+                               weights={'cf': 1.0})
+    np.testing.assert_allclose(scores, [1.0, 0.0])
+    assert sources.tolist() == [[True, True], [False, True]]
+
+
+def test_blend_without_candidates():
+    reel_ids, scores, sources = blend({})
+    assert len(reel_ids) == 0 and len(scores) == 0 and sources.shape == (0, 0)
+    reel_ids, _, _ = blend({'cf': source([], [])})
+    assert len(reel_ids) == 0
+
+
+def test_vector_candidates_caches_only_found_results(monkeypatch):
+    calls = []
+
+    def search_feature(table, query, amount, start=0):
+        calls.append(query)
+        return [] if query == 'failing' else [{'id': 7, 'distance': 0.25}]
+
+    monkeypatch.setattr(hybrid, 'search_feature', search_feature)
+    monkeypatch.setattr(hybrid, 'VECTOR_CANDIDATES', {})
+    for _ in range(2):
+        assert len(hybrid.vector_candidates('failing')[0]) == 0
+        reel_ids, scores = hybrid.vector_candidates('found')
+        assert reel_ids.tolist() == ['7'] and scores.tolist() == [-0.25]
+    assert calls == ['failing', 'found', 'failing']
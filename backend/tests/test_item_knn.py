@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix, random as sparse_random
+
+from item_knn import build_item_neighbors, score_items
+
+
+@pytest.fixture
+def ratings():
+    return sparse_random(60, 25, density=0.2, format='csr', dtype=np.float32, random_state=3,
+                         data_rvs=lambda n: np.random.default_rng(3).integers(1, 6, n))
+
+
+def brute_force_neighbors(ratings, k):
+    """Each reel's k most cosine-similar other reels, best first, ties by position"""
+    dense = ratings.toarray().astype(np.float64)
+    norms = np.linalg.norm(dense, axis=0)
+    similarities = (dense.T @ dense) / np.outer(norms, norms).clip(min=1e-12)
+    neighbors = []
+    for reel in range(dense.shape[1]):
+        ranked = [other for other in np.lexsort((np.arange(dense.shape[1]), -similarities[reel]))
+                  if other != reel and similarities[reel, other] > 0][:k]
+        neighbors.append((ranked, similarities[reel, ranked]))
+    return neighbors
+
+
+@pytest.mark.parametrize('chunk_cells', [25 * 25, 25 * 4])
+def test_neighbors_match_brute_force_cosine(ratings, chunk_cells):
+    neighbors, _ = build_item_neighbors(ratings, k=5, chunk_cells=chunk_cells)
+    for reel, (expected, similarities) in enumerate(brute_force_neighbors(ratings, 5)):
+        row = neighbors[reel]
+        order = np.lexsort((row.indices, -row.data))
+        assert row.indices[order].tolist() == expected
+        np.testing.assert_allclose(row.data[order], similarities, rtol=1e-5)
+
+
+def test_k_is_capped_by_the_other_reels():
+    ratings = np.array([[1, 2, 0], [3, 0, 1]], dtype=np.float32)
+    neighbors, _ = build_item_neighbors(ratings, k=10)
+    assert neighbors.diagonal().tolist() == [0, 0, 0]
+    assert neighbors.getnnz(axis=1).max() <= 2
+
+
+def test_scores_mask_rated_reels_and_ignore_new_ones(ratings):
+    neighbors, _ = build_item_neighbors(ratings, k=5)
+    user_row = ratings[0]
+    scores, candidates = score_items(neighbors, user_row)
+    np.testing.assert_allclose(scores, (user_row @ neighbors).toarray().ravel(), rtol=1e-6)
+    assert not candidates[user_row.indices].any()
+    assert candidates.sum() == 25 - user_row.nnz
+
+    # A row with a column added after the build is cut to the built reels
+    wider = np.hstack([user_row.toarray(), [[4]]])
+    assert len(score_items(neighbors, csr_matrix(wider))[0]) == 25
+
+
+def test_user_without_ratings_has_no_candidates(ratings):
+    neighbors, _ = build_item_neighbors(ratings, k=5)
+    empty = ratings[0] * 0
+    empty.eliminate_zeros()
+    assert score_items(neighbors, empty)[1] is None
@@ -0,0 +1,83 @@
+import mmap
+
+import numpy as np
+import pytest
+
+from als import ImplicitALS
+from item_knn import build_item_neighbors
+from model_store import read_artifact, write_artifact
+from neighbor_index import BruteForceIndex, ClusteredIndex
+from rating_matrix import RatingMatrix
+from topn import TopNTable
+
+
+def matrix(user_ids, reel_ids):
+    rng = np.random.default_rng(5)
+    users = rng.integers(0, len(user_ids), 300)
+    reels = rng.integers(0, len(reel_ids), 300)
+    return RatingMatrix.from_rows(np.asarray(user_ids, dtype=object)[users], np.asarray(reel_ids, dtype=object)[reels],
+                                  rng.integers(1, 6, 300))
+
+
+def mapped(array):
+    """Whether array is backed by a memory-mapped file, directly or as a view"""
+    while array is not None:
+        if isinstance(array, (np.memmap, mmap.mmap)):
+            return True
+        array = getattr(array, 'base', None)
+    return False
+
+
+def assert_same_matrix(loaded, saved):
+    assert loaded.user_ids.tolist() == saved.user_ids.tolist()
+    assert loaded.reel_ids.tolist() == saved.reel_ids.tolist()
+    assert (loaded.ratings != saved.ratings).nnz == 0
+    assert loaded.user_position(saved.user_ids[3]) == 3
+    assert loaded.reel_position(saved.reel_ids[7]) == 7
+
+
+@pytest.mark.parametrize('user_ids, reel_ids', [
+    (list(range(100, 140)), [f"play-{i}" for i in range(30)]),
+    # Mixed id types cannot be memory-mapped and fall back to a pickled object array
+    (list(range(40)), [f"play-{i}" for i in range(29)] + [7]),
+])
+def test_round_trip_keeps_ids_ratings_and_tables(tmp_path, user_ids, reel_ids):
+    saved = matrix(user_ids, reel_ids)
+    model = BruteForceIndex(n_jobs=1).fit(saved.ratings)
+    top_n = TopNTable(np.arange(80).reshape(40, 2), np.ones((40, 2), dtype=np.float32),
+                      np.full(40, 2), np.full(40, 5), build_seconds=1.5).with_dirty([4])
+    item_neighbors, _ = build_item_neighbors(saved.ratings, k=3)
+    path = write_artifact(str(tmp_path / 'model-1'), model, saved, top_n, item_neighbors, {'version': 1})
+
+    model, loaded, loaded_top_n, loaded_neighbors, manifest = read_artifact(path)
+    assert_same_matrix(loaded, saved)
+    assert manifest['version'] == 1
+    positions, scores, has_more = loaded_top_n.page(0, 2)
+    assert (positions.tolist(), scores.tolist(), has_more) == ([0, 1], [1.0, 1.0], True)
+    assert loaded_top_n.dirty.tolist() == top_n.dirty.tolist()
+    assert loaded_top_n.build_seconds == 1.5
+    assert (loaded_neighbors != item_neighbors).nnz == 0
+    np.testing.assert_array_equal(model.kneighbors(saved.ratings[:5], 3)[1],
+                                  BruteForceIndex(n_jobs=1).fit(saved.ratings).kneighbors(saved.ratings[:5], 3)[1])
+
+
+def test_arrays_are_memory_mapped_read_only(tmp_path):
+    saved = matrix(list(range(40)), [f"play-{i}" for i in range(30)])
+    path = write_artifact(str(tmp_path / 'model-1'), ClusteredIndex(dimensions=8).fit(saved.ratings), saved)
+
+    model, loaded, top_n, item_neighbors, _ = read_artifact(path)
+    assert mapped(loaded.ratings.data) and mapped(loaded.ratings.indptr)
+    assert mapped(loaded.user_ids) and mapped(loaded.reel_ids)
+    assert not loaded.ratings.data.flags.writeable
+    assert top_n is None and item_neighbors is None
+    assert isinstance(model, ClusteredIndex)
+    np.testing.assert_array_equal(model.assignment_, ClusteredIndex(dimensions=8).fit(saved.ratings).assignment_)
+
+
+def test_als_factors_round_trip(tmp_path):
+    saved = matrix(list(range(40)), [f"play-{i}" for i in range(30)])
+    als = ImplicitALS(factors=4, iterations=2, threads=1).fit(saved.ratings)
+    model, _, _, _, _ = read_artifact(write_artifact(str(tmp_path / 'model-1'), als, saved))
+    assert isinstance(model, ImplicitALS) and model.factors == 4
+    np.testing.assert_array_equal(model.scores(3), als.scores(3))
+
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+
+from neighbor_index import BruteForceIndex, ClusteredIndex, make_index
+
+
+@pytest.fixture(scope='module')
+def clustered():
+    """Users in 20 taste groups, each rating mostly its own block of 30 reels"""
+    rng = np.random.default_rng(11)
+    groups = rng.integers(0, 20, size=2000)
+    rows, cols = [], []
+    for user, group in enumerate(groups):
+        reels = np.where(rng.random(12) < 0.85, group * 30 + rng.integers(0, 30, 12), rng.integers(0, 600, 12))
+        rows.extend([user] * len(reels))
+        cols.extend(reels)
+    ratings = csr_matrix((rng.integers(1, 6, len(rows)).astype(np.float32), (rows, cols)), shape=(2000, 600))
+    ratings.sum_duplicates()
+    return ratings
+
+
+def recall(expected, found):
+    return np.mean([len(set(e) & set(f)) / len(e) for e, f in zip(expected, found)])
+
+
+def test_ivf_recall_against_brute_force(clustered):
+    queries = clustered[:200]
+    _, exact = BruteForceIndex(n_jobs=1).fit(clustered).kneighbors(queries, n_neighbors=10)
+    index = ClusteredIndex(dimensions=32, probes=8).fit(clustered)
+    distances, found = index.kneighbors(queries, n_neighbors=10)
+
+    assert recall(exact, found) >= 0.9
+    assert (np.diff(distances, axis=1) >= -1e-6).all()
+    # Every user is its own nearest neighbor
+    assert (found[:, 0] == np.arange(200)).mean() >= 0.99
+
+
+def test_more_probes_do_not_lower_recall(clustered):
+    queries = clustered[:200]
+    _, exact = BruteForceIndex(n_jobs=1).fit(clustered).kneighbors(queries, n_neighbors=10)
+    recalls = [recall(exact, ClusteredIndex(dimensions=32, probes=probes).fit(clustered)
+                      .kneighbors(queries, n_neighbors=10)[1]) for probes in (1, 8, 45)]
+    assert recalls == sorted(recalls)
+    # Probing every list is exact search, up to the order of tied distances
+    assert recalls[-1] >= 0.99
+
+
+def test_refit_reassigns_changed_and_appended_rows(clustered):
+    index = ClusteredIndex(dimensions=32, probes=8).fit(clustered)
+    changed = clustered.tolil()
+    # User 0 now rates exactly like user 1, and a copy of user 2 is appended
+    changed[0] = clustered[1].toarray()
+    grown = csr_matrix(np.vstack([changed.toarray(), clustered[2].toarray()]))
+
+    refitted = index.refit(grown, [0])
+    assert len(refitted.assignment_) == 2001
+    assert refitted.assignment_[0] == refitted.assignment_[1]
+    assert refitted.assignment_[2000] == refitted.assignment_[2]
+    _, found = refitted.kneighbors(grown[[0]], n_neighbors=2)
+    assert set(found[0]) == {0, 1}
+
+
+def test_make_index_rejects_unknown_kinds():
+    assert isinstance(make_index('ivf', probes=4), ClusteredIndex)
+    with pytest.raises(ValueError):
+        make_index('hnsw')
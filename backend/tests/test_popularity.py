@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import popularity
+from popularity import PopularityRanker
+
+
+class Catalog:
+    """Stands in for the highlight catalog behind get_catalog"""
+    version = 1
+
+    def tagged(self):
+        reel_ids = np.array(['a', 'b', 'c', 'd'], dtype=object)
+        return reel_ids, {'Cubs': np.array([3]), 'Judge': np.array([2, 3])}
+
+
+class Source:
+    """Stands in for load_rating_totals/load_vote_totals; either can be made to fail"""
+
+    def __init__(self):
+        self.ratings = pd.DataFrame({'reel_id': ['a', 'b', 'c'], 'rating_count': [10, 10, 1],
+                                     'rating_sum': [50, 40, 2]})
+        self.votes = pd.DataFrame({'reel_id': ['a'], 'net_votes': [0]})
+        self.queries = 0
+
+    def rating_totals(self, table):
+        self.queries += 1
+        return self.ratings
+
+    def vote_totals(self):
+        self.queries += 1
+        return self.votes
+
+
+@pytest.fixture
+def source(monkeypatch):
+    source = Source()
+    monkeypatch.setattr(popularity, 'get_catalog', Catalog)
+    monkeypatch.setattr(popularity, 'load_rating_totals', source.rating_totals)
+    monkeypatch.setattr(popularity, 'load_vote_totals', source.vote_totals)
+    return source
+
+
+def test_ranking_and_follow_boost(source):
+    ranker = PopularityRanker('user_ratings_db', follow_boost=100.0)
+    assert ranker.refresh() is True
+    recs, has_more = ranker.recommend(num_recommendations=2)
+    assert [rec['reel_id'] for rec in recs] == ['a', 'b'] and has_more
+    recs, _ = ranker.recommend(['Cubs'], [], num_recommendations=2)
+    assert recs[0]['reel_id'] == 'd'
+    reel_ids, _ = ranker.followed([], ['Judge'])
+    assert reel_ids.tolist() == ['c', 'd']
+
+
+def test_requests_only_read_the_ranking(source):
+    ranker = PopularityRanker('user_ratings_db', refresh_interval=0)
+    ranker.refresh()
+    queries = source.queries
+    ranker.recommend()
+    ranker.followed(['Cubs'])
+    assert source.queries == queries
+
+
+def test_failed_refresh_keeps_the_previous_ranking(source):
+    ranker = PopularityRanker('user_ratings_db')
+    ranker.refresh()
+    ranked = ranker.current()
+    source.votes = None
+    assert ranker.refresh() is False
+    assert ranker.current() is ranked and ranker.failures == 1
+    source.votes = pd.DataFrame({'reel_id': [], 'net_votes': []})
+    assert ranker.refresh() is True and ranker.failures == 0
+
+
+def test_unloaded_catalog_is_incomplete(source, monkeypatch):
+    monkeypatch.setattr(Catalog, 'version', 0)
+    ranker = PopularityRanker('user_ratings_db')
+    assert ranker.refresh() is False
+    assert len(ranker.current()[0]) == 4 and ranker.failures == 1
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+from rating_matrix import RatingMatrix
+
+
+def frame(rows):
+    return pd.DataFrame(rows, columns=['user_id', 'reel_id', 'rating'])
+
+
+def dense(matrix):
+    return matrix.ratings.toarray()
+
+
+def test_from_rows_keeps_the_last_write_of_a_pair():
+    matrix = RatingMatrix.from_rows([1, 1, 2], ['a', 'a', 'b'], [3, 5, 4])
+    assert matrix.nnz == 2
+    assert matrix.values([1, 2], ['a', 'b']).tolist() == [5, 4]
+
+
+def test_updated_overwrites_clears_and_appends():
+    matrix = RatingMatrix.from_rows([1, 2], ['a', 'b'], [3, 4])
+    updated = matrix.updated([1, 2, 3], ['a', 'b', 'c'], [5, 0, 2])
+
+    assert updated.user_ids.tolist() == [1, 2, 3]
+    assert updated.reel_ids.tolist() == ['a', 'b', 'c']
+    assert dense(updated).tolist() == [[5, 0, 0], [0, 0, 0], [0, 0, 2]]
+    # The original is left as it was for readers still holding it
+    assert dense(matrix).tolist() == [[3, 0], [0, 4]]
+    assert updated.extends(matrix)
+
+
+def test_updated_casts_string_ids_to_the_matrix_type():
+    matrix = RatingMatrix.from_rows([1, 2], ['a', 'b'], [3, 4])
+    updated = matrix.updated(['2'], ['a'], [1])
+    assert updated.shape == matrix.shape
+    assert updated.values([2], ['a']).tolist() == [1]
+
+
+def test_changed_users_lists_rows_whose_ratings_differ():
+    matrix = RatingMatrix.from_rows([1, 2, 3], ['a', 'b', 'c'], [3, 4, 5])
+    updated = matrix.updated([2, 3, 4], ['b', 'a', 'a'], [4, 1, 2])
+    # User 2 rewrote the same value and user 4 is new, so only user 3 changed
+    assert matrix.changed_users(updated).tolist() == [2]
+
+
+def test_full_reload_keeps_base_positions():
+    base = RatingMatrix.from_frame(frame([(1, 'a', 3), (2, 'b', 4), (3, 'c', 5)]))
+    # User 2 and reel 'b' lost their ratings; user 0 and reel 'd' are new and sort first
+    reloaded = RatingMatrix.from_frame(frame([(1, 'a', 3), (3, 'c', 1), (0, 'd', 2)]), base=base)
+
+    assert reloaded.extends(base)
+    assert reloaded.user_ids.tolist() == [1, 2, 3, 0]
+    assert reloaded.reel_ids.tolist() == ['a', 'b', 'c', 'd']
+    assert base.changed_users(reloaded).tolist() == [1, 2]
+
+
+def test_aligned_renumbers_to_the_base_positions():
+    base = RatingMatrix.from_rows([1, 2], ['a', 'b'], [3, 4])
+    fresh = RatingMatrix.from_rows([0, 2], ['b', 'c'], [1, 2])
+    assert not fresh.extends(base)
+
+    aligned = fresh.aligned(base)
+    assert aligned.extends(base)
+    assert aligned.user_ids.tolist() == [1, 2, 0]
+    assert aligned.values([0, 2, 1], ['b', 'c', 'a']).tolist() == [1, 2, 0]
+    assert np.array_equal(aligned.values([0, 2], ['b', 'c']), fresh.values([0, 2], ['b', 'c']))
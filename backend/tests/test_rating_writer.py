@@ -0,0 +1,104 @@
+import pytest
+from sqlalchemy import exc
+
+import rating_writer
+from rating_writer import RatingWriter
+
+
+class Database:
+    """Stands in for the db functions rating_writer calls"""
+
+    def __init__(self):
+        self.rows = []
+        self.bad_reels = set()
+        self.down = False
+        self.upserts = 0
+
+    def upsert_ratings(self, table, rows, keyed, sequenced):
+        self.upserts += 1
+        if self.down:
+            raise exc.OperationalError('INSERT', {}, Exception('connection refused'))
+        if any(reel_id in self.bad_reels for _, reel_id, _ in rows):
+            raise exc.DataError('INSERT', {}, Exception('value out of range'))
+        self.rows.extend(rows)
+
+
+@pytest.fixture
+def database(monkeypatch):
+    database = Database()
+    monkeypatch.setattr(rating_writer, 'upsert_ratings', database.upsert_ratings)
+    monkeypatch.setattr(rating_writer, 'has_rating_key', lambda table: True)
+    monkeypatch.setattr(rating_writer, 'has_rating_sequence', lambda table: True)
+    monkeypatch.setattr(rating_writer, 'load_column_types', lambda table: {'user_id': 'integer', 'reel_id': 'text'})
+    return database
+
+
+def test_key_casts_ids_to_the_column_types(database):
+    writer = RatingWriter('user_ratings_db')
+    assert writer.key(' 7', 12) == (7, '12')
+    with pytest.raises(ValueError):
+        writer.key('seven', 'a')
+    with pytest.raises(ValueError):
+        writer.key(7, ' ')
+
+
+def test_flush_writes_the_latest_rating_of_each_pair(database):
+    writer = RatingWriter('user_ratings_db', flush_size=2)
+    writer.add(1, 'a', 3)
+    writer.add(2, 'b', 4)
+    writer.add(1, 'a', 5)
+    assert writer.flush()
+    assert sorted(database.rows) == [(1, 'a', 5), (2, 'b', 4)]
+    assert writer.status()['pending'] == 0
+
+
+def test_rejected_rows_are_dropped_and_the_rest_written(database):
+    database.bad_reels = {'bad'}
+    writer = RatingWriter('user_ratings_db')
+    for user_id, reel_id in ((1, 'a'), (2, 'bad'), (3, 'c')):
+        writer.add(user_id, reel_id, 4)
+    assert writer.flush()
+    assert sorted(database.rows) == [(1, 'a', 4), (3, 'c', 4)]
+    status = writer.status()
+    assert (status['written'], status['rejected'], status['pending']) == (2, 1, 0)
+
+
+def test_unreachable_database_keeps_only_unwritten_chunks(database, monkeypatch):
+    writer = RatingWriter('user_ratings_db', flush_size=2)
+    for reel_id in 'abcd':
+        writer.add(1, reel_id, 4)
+    upsert = database.upsert_ratings
+
+    def fail_second_chunk(*args):
+        if database.upserts == 1:
+            database.down = True
+        return upsert(*args)
+
+    monkeypatch.setattr(rating_writer, 'upsert_ratings', fail_second_chunk)
+
+    assert not writer.flush()
+    assert database.rows == [(1, 'a', 4), (1, 'b', 4)]
+    assert writer.status()['pending'] == 2
+
+    # A rating added while the database was down wins over the one being retried
+    writer.add(1, 'c', 1)
+    database.down = False
+    assert writer.flush()
+    assert database.rows[2:] == [(1, 'c', 1), (1, 'd', 4)]
+    assert writer.status()['written'] == 4
+
+
+def test_a_failed_schema_check_keeps_the_batch(database, monkeypatch):
+    monkeypatch.setattr(rating_writer, 'has_rating_key', lambda table: None)
+    writer = RatingWriter('user_ratings_db')
+    writer.add(1, 'a', 4)
+    assert not writer.flush()
+    assert writer.status()['pending'] == 1
+    assert database.upserts == 0
+
+
+def test_full_buffer_refuses_new_pairs(database):
+    writer = RatingWriter('user_ratings_db', max_pending=1)
+    assert writer.add(1, 'a', 4)
+    assert writer.add(1, 'a', 5)
+    assert not writer.add(2, 'b', 4)
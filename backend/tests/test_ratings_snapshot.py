@@ -0,0 +1,90 @@
+import pandas as pd
+import pytest
+
+import ratings_snapshot
+from ratings_snapshot import RatingsSnapshot
+
+
+class Table:
+    """Stands in for the ratings table behind load_ratings_since"""
+
+    def __init__(self, rows):
+        self.rows = [(user_id, reel_id, rating, seq) for seq, (user_id, reel_id, rating) in enumerate(rows, 1)]
+
+    def add(self, user_id, reel_id, rating):
+        self.rows.append((user_id, reel_id, rating, len(self.rows) + 1))
+
+    def since(self, table, high_water_mark=None):
+        rows = [row for row in self.rows if high_water_mark is None or row[3] > high_water_mark]
+        return pd.DataFrame(rows, columns=['user_id', 'reel_id', 'rating', 'rating_seq'])
+
+
+@pytest.fixture
+def table(monkeypatch):
+    table = Table([(1, 'a', 3), (2, 'b', 4), (3, 'c', 5)])
+    monkeypatch.setattr(ratings_snapshot, 'has_rating_sequence', lambda name: True)
+    monkeypatch.setattr(ratings_snapshot, 'load_ratings_since', table.since)
+    return table
+
+
+def snapshot(**options):
+    snapshot = RatingsSnapshot('user_ratings_db', overlap=0, **options)
+    snapshot.refresh()
+    return snapshot
+
+
+def test_apply_queues_without_touching_the_matrix(table):
+    ratings = snapshot(merge_size=10, merge_interval=60)
+    loaded = ratings.matrix
+    assert ratings.apply([1], ['b'], [2]) is loaded
+    assert ratings.matrix is loaded
+    assert ratings.status()['pending'] == 1
+    assert not ratings.merge_due
+    assert ratings.refresh_if_stale() is loaded
+
+
+def test_queued_ratings_merge_in_one_batch(table):
+    ratings = snapshot(merge_size=3, merge_interval=60)
+    loaded = ratings.matrix
+    ratings.apply([1], ['b'], [2])
+    ratings.apply([4], ['a'], [1])
+    ratings.apply([2], ['b'], [0])
+    assert ratings.merge_due
+
+    merged = ratings.refresh_if_stale()
+    assert merged is not loaded
+    assert merged.values([1, 4, 2], ['b', 'a', 'b']).tolist() == [2, 1, 0]
+    status = ratings.status()
+    assert (status['pending'], status['merges'], status['change_count']) == (0, 1, 3)
+    assert ratings.changes_since(loaded).tolist() == [0, 1, 3]
+
+
+def test_changes_since_spans_several_merges(table):
+    ratings = snapshot()
+    loaded = ratings.matrix
+    ratings.apply([1], ['b'], [2])
+    middle = ratings.merge()
+    ratings.apply([3], ['a'], [1])
+    # Rewriting a value the matrix already holds is not a change
+    ratings.apply([2], ['b'], [4])
+    ratings.merge()
+
+    assert ratings.changes_since(loaded).tolist() == [0, 2]
+    assert ratings.changes_since(middle).tolist() == [2]
+    assert ratings.changes_since(object()) is None
+
+
+def test_refresh_keeps_queued_ratings_the_table_does_not_have_yet(table):
+    ratings = snapshot(merge_size=10, merge_interval=60)
+    loaded = ratings.matrix
+    table.add(2, 'a', 5)
+    ratings.apply([3], ['b'], [2])
+
+    matrix = ratings.refresh(full=True)
+    assert matrix.values([2, 3], ['a', 'b']).tolist() == [5, 2]
+    assert ratings.status()['pending'] == 0
+    assert ratings.changes_since(loaded).tolist() == [1, 2]
+
+
+def test_apply_before_the_first_load_is_ignored():
+    assert RatingsSnapshot('user_ratings_db').apply([1], ['a'], [3]) is None
@@ -0,0 +1,41 @@
+from result_cursor import ResultCursors
+
+
+def results(count):
+    return [{'id': f"r{i}", 'distance': i / 10} for i in range(count)]
+
+
+def test_page_slices_the_opened_results():
+    cursors = ResultCursors(limit=10)
+    token = cursors.open(results(7), ('search', 'ohtani'))
+
+    ids, distances, has_more = cursors.page(token, ('search', 'ohtani'), 0, 5)
+    assert ids == ['r0', 'r1', 'r2', 'r3', 'r4']
+    assert distances == [0.0, 0.1, 0.2, 0.3, 0.4]
+    assert has_more
+    ids, _, has_more = cursors.page(token, ('search', 'ohtani'), 5, 5)
+    assert ids == ['r5', 'r6']
+    assert not has_more
+
+
+def test_a_full_cursor_reports_more_on_its_last_page():
+    cursors = ResultCursors(limit=10)
+    token = cursors.open(results(10), ('user', 1))
+    ids, _, has_more = cursors.page(token, ('user', 1), 5, 5)
+    assert ids == ['r5', 'r6', 'r7', 'r8', 'r9']
+    assert has_more
+
+
+def test_unknown_tokens_and_other_keys_miss():
+    cursors = ResultCursors(limit=10)
+    token = cursors.open(results(3), ('user', 1))
+    assert cursors.page(token, ('user', 2), 0, 5) is None
+    assert cursors.page('unknown', ('user', 1), 0, 5) is None
+    assert cursors.page('', ('user', 1), 0, 5) is None
+    assert cursors.status()['misses'] == 2
+
+
+def test_expired_tokens_miss():
+    cursors = ResultCursors(ttl=0, limit=10)
+    token = cursors.open(results(3), ('user', 1))
+    assert cursors.page(token, ('user', 1), 0, 5) is None
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from rating_matrix import RatingMatrix
+from scoring import neighbor_weights, paginate, score_reels, top_k
+
+
+def legacy_ranking(user_index, indices, user_reel_matrix):
+    """The pandas nested loop recommend_reels used before it was vectorized"""
+    reel_scores = {}
+    for i in indices:
+        if i == user_index:
+            continue
+        for reel_id in user_reel_matrix.columns:
+            if user_reel_matrix.iloc[user_index][reel_id] == 0:
+                reel_scores[reel_id] = reel_scores.get(reel_id, 0) + user_reel_matrix.iloc[i][reel_id]
+    return sorted(reel_scores.items(), key=lambda x: x[1], reverse=True)
+
+
+@pytest.fixture
+def ratings():
+    rng = np.random.default_rng(7)
+    # Small integer ratings, so many reels tie and the tie order is exercised
+    dense = rng.integers(0, 4, size=(12, 15)) * (rng.random((12, 15)) < 0.5)
+    frame = pd.DataFrame(dense, index=range(100, 112), columns=[f"r{i:02d}" for i in range(15)])
+    rows = frame.stack()
+    rows = rows[rows != 0].reset_index()
+    rows.columns = ['user_id', 'reel_id', 'rating']
+    return frame, RatingMatrix.from_frame(rows)
+
+
+@pytest.mark.parametrize('user_index', [0, 3, 7])
+def test_ranking_matches_the_legacy_loop(ratings, user_index):
+    frame, matrix = ratings
+    assert matrix.reel_ids.tolist() == frame.columns.tolist()
+    # kneighbors returns the user itself first
+    indices = np.array([user_index, 4, 9, 1, 11])
+
+    expected = legacy_ranking(user_index, indices, frame)
+    scores, candidates = score_reels(matrix.ratings, user_index, indices)
+    positions = top_k(scores, candidates, len(expected))
+
+    assert [(reel_id, float(score)) for reel_id, score in expected] == \
+        list(zip(matrix.reel_ids[positions].tolist(), scores[positions].tolist()))
+
+
+def test_pages_match_slices_of_the_legacy_ranking(ratings):
+    frame, matrix = ratings
+    indices = np.array([2, 0, 5, 8])
+    expected = [reel_id for reel_id, _ in legacy_ranking(2, indices, frame)]
+    scores, candidates = score_reels(matrix.ratings, 2, indices)
+
+    for offset in range(0, len(expected) + 3, 3):
+        positions, has_more = paginate(scores, candidates, 3, offset)
+        assert matrix.reel_ids[positions].tolist() == expected[offset:offset + 3]
+        assert has_more == (offset + 3 < len(expected))
+
+
+def test_top_k_breaks_ties_by_position():
+    scores = np.array([1.0, 3.0, 1.0, 3.0, 2.0, 1.0])
+    candidates = np.array([True, True, True, True, True, False])
+    assert top_k(scores, candidates, 6).tolist() == [1, 3, 4, 0, 2]
+    # The k-th score is tied; the cut keeps the lowest positions
+    assert top_k(scores, candidates, 4).tolist() == [1, 3, 4, 0]
+    assert top_k(scores, candidates, 0).tolist() == []
+
+
+def test_paginate_reports_has_more_until_the_last_candidate():
+    scores = np.arange(5, dtype=np.float64)
+    candidates = np.ones(5, dtype=bool)
+    assert paginate(scores, candidates, 2, 0)[0].tolist() == [4, 3]
+    assert paginate(scores, candidates, 2, 0)[1]
+    assert paginate(scores, candidates, 2, 2)[1]
+    positions, has_more = paginate(scores, candidates, 2, 4)
+    assert positions.tolist() == [0] and not has_more
+    positions, has_more = paginate(scores, candidates, 2, 6)
+    assert positions.tolist() == [] and not has_more
+
+
+def test_user_without_other_neighbors_has_no_candidates(ratings):
+    _, matrix = ratings
+    scores, candidates = score_reels(matrix.ratings, 3, [3])
+    assert candidates is None
+    assert not scores.any()
+
+
+def test_similarity_weighting_scales_each_neighbor():
+    assert neighbor_weights([0.0, 0.25, 1.5], 'similarity').tolist() == [1.0, 0.75, 0.0]
+    with pytest.raises(ValueError):
+        neighbor_weights([0.0], 'rank')
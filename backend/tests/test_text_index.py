@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+from text_index import PREFIX_WEIGHT, TextIndex
+
+FIELDS = {'title': 3.0, 'blurb': 1.0}
+
+
+def index(rows, documents=None, num_documents=None):
+    frame = pd.DataFrame(rows, columns=list(FIELDS))
+    documents = np.arange(len(frame)) if documents is None else np.asarray(documents)
+    num_documents = len(frame) if num_documents is None else num_documents
+    return TextIndex.build(frame, documents, num_documents, field_weights=FIELDS)
+
+
+def test_prefix_matches_score_less_than_exact_tokens():
+    text = index([('home run', ''), ('homer', ''), ('run home', ''), ('strikeout', '')])
+    assert text.search('home').tolist() == [0, 2, 1]
+    scores = text.scores('home')
+    # "home" is in two of the four documents and "homer" in one, so their idfs differ
+    np.testing.assert_allclose(scores[1] / scores[0], PREFIX_WEIGHT * np.log1p(4) / np.log1p(2), rtol=1e-6)
+    # All prefix matches, so the rarer "homer" ranks first
+    assert text.search('hom').tolist() == [1, 0, 2]
+    assert len(text.search('homers')) == 0
+
+
+def test_prefix_range_ends_at_the_last_token_starting_with_the_term():
+    text = index([('z', ''), ('za', ''), ('zz', ''), ('y', '')])
+    assert text.search('z').tolist() == [0, 1, 2]
+    assert text.search('zz').tolist() == [2]
+
+
+def test_field_weights():
+    text = index([('', 'judge homers'), ('judge homers', ''), ('', 'judge')])
+    scores = text.scores('judge')
+    np.testing.assert_allclose(scores[1] / scores[0], FIELDS['title'] / FIELDS['blurb'], rtol=1e-6)
+    assert text.search('judge').tolist() == [1, 0, 2]
+
+
+def test_every_query_token_must_match():
+    text = index([('Judge homers', ''), ('Judge strikes out', ''), ('Ohtani homers', '')])
+    assert text.search('judge homers').tolist() == [0]
+    assert text.search(['judge', 'homers']).tolist() == [0]
+    assert len(text.search('judge ohtani')) == 0
+
+
+def test_rows_add_up_per_document():
+    text = index([('Judge', ''), ('Judge', ''), ('Ohtani', '')], documents=[0, 0, 1], num_documents=2)
+    scores = text.scores('judge')
+    assert scores[0] > 0 and scores[1] == 0
+    assert text.search('ohtani').tolist() == [1]
+
+
+def test_empty_queries_match_nothing():
+    text = index([('Judge homers', 'a blast')])
+    for query in ('', '   ', '!!', [], ['']):
+        assert text.scores(query).tolist() == [0.0]
+        assert len(text.search(query)) == 0
+
+
+def test_empty_index():
+    text = index([])
+    assert len(text.vocabulary) == 0
+    assert len(text.search('judge')) == 0
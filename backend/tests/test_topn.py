@@ -0,0 +1,37 @@
+import numpy as np
+
+from topn import TopNTable
+
+
+def table():
+    # User 0 has 3 of 5 ranked reels stored, user 1 all 2 of 2
+    positions = np.array([[4, 2, 7], [1, 0, -1]])
+    scores = np.array([[0.9, 0.5, 0.1], [0.8, 0.2, 0.0]], dtype=np.float32)
+    return TopNTable(positions, scores, counts=np.array([3, 2]), totals=np.array([5, 2]))
+
+
+def test_page_slices_the_stored_prefix():
+    positions, scores, has_more = table().page(0, 2)
+    assert positions.tolist() == [4, 2]
+    assert scores.tolist() == [np.float32(0.9), np.float32(0.5)]
+    assert has_more
+
+
+def test_page_past_the_stored_prefix_is_computed_live():
+    assert table().page(0, 2, offset=2) is None
+
+
+def test_page_ends_at_the_total():
+    positions, _, has_more = table().page(1, 5)
+    assert positions.tolist() == [1, 0]
+    assert not has_more
+    positions, _, has_more = table().page(1, 5, offset=4)
+    assert positions.tolist() == []
+    assert not has_more
+
+
+def test_dirty_and_unknown_users_are_computed_live():
+    dirty = table().with_dirty([1, 9])
+    assert dirty.page(1, 1) is None
+    assert dirty.page(0, 1) is not None
+    assert table().page(2, 1) is None
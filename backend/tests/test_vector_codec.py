@@ -0,0 +1,40 @@
+import numpy as np
+
+from vector_codec import Vector, _adapt_vector, encode
+
+
+def decode(text):
+    assert text.startswith('[') and text.endswith(']')
+    return np.array([float(value) for value in text[1:-1].split(',') if value], dtype=np.float32)
+
+
+def test_encode_round_trips_float32_exactly():
+    rng = np.random.default_rng(0)
+    values = np.concatenate([
+        rng.standard_normal(768).astype(np.float32),
+        np.array([0.0, -0.0, 1.0, -1.25, 1e-38, 3.4028235e38, np.nextafter(np.float32(1), np.float32(2))],
+                 dtype=np.float32),
+    ])
+    decoded = decode(encode(values))
+    assert decoded.dtype == np.float32
+    np.testing.assert_array_equal(decoded, values)
+
+
+def test_encode_is_short_for_simple_values():
+    assert encode([0.5, -1.25, 3]) == '[0.5,-1.25,3]'
+    assert encode([]) == '[]'
+
+
+def test_encode_rounds_float64_input_to_float32():
+    value = 0.1
+    assert decode(encode([value]))[0] == np.float32(value)
+
+
+def test_vector_holds_float32():
+    vector = Vector([1, 2.5, -3])
+    assert vector.values.dtype == np.float32 and len(vector) == 3
+
+
+def test_adapter_renders_a_vector_literal():
+    rendered = _adapt_vector(Vector([0.5, -2])).getquoted()
+    assert rendered == b"'[0.5,-2]'::vector"
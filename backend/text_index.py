@@ -0,0 +1,96 @@
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+TOKEN = re.compile(r'\w+')
+# Weight of a token by the field it appears in
+FIELD_WEIGHTS = {
+    'title': float(os.getenv('SEARCH_WEIGHT_TITLE', 3.0)),
+    'player': float(os.getenv('SEARCH_WEIGHT_PLAYER', 2.0)),
+    'home_team': float(os.getenv('SEARCH_WEIGHT_TEAM', 2.0)),
+    'away_team': float(os.getenv('SEARCH_WEIGHT_TEAM', 2.0)),
+    'blurb': float(os.getenv('SEARCH_WEIGHT_BLURB', 1.0)),
+}
+# Share of a token's weight given when a term is only a prefix of it
+PREFIX_WEIGHT = float(os.getenv('SEARCH_PREFIX_WEIGHT', 0.5))
+
+
+def tokenize(text):
+    return TOKEN.findall(str(text).lower())
+
+
+class TextIndex:
+    """Inverted index over the text fields of the highlight catalog.
+
+    Every lowercase word token of a field points at the documents holding it,
+    with the field's weight summed over its occurrences. The vocabulary is
+    sorted, so all tokens starting with a search term are one contiguous
+    range and prefix matching is two binary searches. A document's score for
+    a term is the best idf-weighted token in that range (prefix-only matches
+    count PREFIX_WEIGHT of it); its search score is the sum over terms.
+    """
+
+    def __init__(self, vocabulary, offsets, documents, weights, num_documents):
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.documents = documents
+        self.weights = weights
+        self.num_documents = num_documents
+
+    @classmethod
+    def build(cls, frame, documents, num_documents, field_weights=FIELD_WEIGHTS):
+        """Index the field_weights columns of frame, whose rows belong to the given document positions"""
+        postings = []
+        for field, weight in field_weights.items():
+            tokens = frame[field].fillna('').astype(str).str.lower().str.findall(TOKEN).explode().dropna()
+            postings.append(pd.DataFrame({'token': tokens.to_numpy(dtype=object),
+                                          'document': documents[tokens.index.to_numpy(dtype=np.int64)],
+                                          'weight': weight}))
+        postings = pd.concat(postings, ignore_index=True) if postings else pd.DataFrame(
+            columns=['token', 'document', 'weight'])
+        postings = postings.groupby(['token', 'document'], sort=True)['weight'].sum()
+
+        tokens = postings.index.get_level_values('token').to_numpy(dtype=object)
+        vocabulary, counts = np.unique(tokens, return_counts=True) if len(tokens) else (tokens, np.array([], int))
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        # Term frequency times idf, so common words like "the" barely count
+        idf = np.log1p(num_documents / np.maximum(counts, 1)).astype(np.float32)
+        weights = postings.to_numpy(dtype=np.float32) * np.repeat(idf, counts)
+        documents = postings.index.get_level_values('document').to_numpy(dtype=np.int32)
+        return cls(vocabulary, offsets, documents, weights, num_documents)
+
+    def _term_scores(self, term):
+        """Score of every document for one term; 0 where it does not match"""
+        low = np.searchsorted(self.vocabulary, term, side='left')
+        # The first string sorting after every string that starts with term
+        high = np.searchsorted(self.vocabulary, term[:-1] + chr(ord(term[-1]) + 1), side='left')
+        scores = np.zeros(self.num_documents, dtype=np.float32)
+        begin, end = self.offsets[low], self.offsets[high]
+        weights = self.weights[begin:end].copy()
+        exact = low < len(self.vocabulary) and self.vocabulary[low] == term
+        weights[self.offsets[low + 1] - begin if exact else 0:] *= PREFIX_WEIGHT
+        np.maximum.at(scores, self.documents[begin:end], weights)
+        return scores
+
+    def scores(self, query):
+        """Search score of every document; documents missing any query token score 0"""
+        terms = tokenize(query) if isinstance(query, str) else [token for term in query for token in tokenize(term)]
+        if not terms:
+            return np.zeros(self.num_documents, dtype=np.float32)
+        total = np.zeros(self.num_documents, dtype=np.float32)
+        matched = np.ones(self.num_documents, dtype=bool)
+        for term in dict.fromkeys(terms):
+            term_scores = self._term_scores(term)
+            matched &= term_scores > 0
+            total += term_scores
+        return np.where(matched, total, 0)
+
+    def search(self, query, limit=None):
+        """Positions of the documents matching every query token, best first; ties keep position order"""
+        scores = self.scores(query)
+        positions = np.flatnonzero(scores)
+        order = np.lexsort((positions, -scores[positions]))
+        return positions[order][:limit]
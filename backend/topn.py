@@ -0,0 +1,141 @@
+import time
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from scoring import neighbor_weights
+
+# Dense score cells materialized per chunk of users (float32, so ~128 MB)
+CHUNK_CELLS = 32 * 1024 * 1024
+
+
+class TopNTable:
+    """Precomputed best-first reel positions for every user of a RatingMatrix.
+
+    Row u holds the first `counts[u]` reels of the same ranking recommend_reels
+    produces live, so a page inside that prefix is an array slice. Users whose
+    ratings changed after the build are marked dirty and must be served live.
+    """
+
+    def __init__(self, positions, scores, counts, totals, build_seconds=0.0, dirty=None):
+        self.positions = positions
+        self.scores = scores
+        self.counts = counts
+        self.totals = totals
+        self.build_seconds = build_seconds
+        self.dirty = dirty if dirty is not None else np.zeros(len(counts), dtype=bool)
+
+    @property
+    def size(self):
+        return self.positions.shape[1]
+
+    @property
+    def users_per_second(self):
+        return len(self.counts) / self.build_seconds if self.build_seconds else None
+
+    def page(self, user_index, limit, offset=0):
+        """(positions, scores, has_more) for one page, or None when it must be computed live"""
+        if user_index >= len(self.counts) or self.dirty[user_index]:
+            return None
+        end = min(offset + limit, int(self.totals[user_index]))
+        if end > self.counts[user_index]:
+            return None
+        start = min(offset, end)
+        return (self.positions[user_index, start:end], self.scores[user_index, start:end],
+                end < self.totals[user_index])
+
+    def with_dirty(self, user_indices):
+        """Copy of the table with more users marked as needing live scoring"""
+        dirty = self.dirty.copy()
+        user_indices = np.asarray(user_indices, dtype=np.int64)
+        dirty[user_indices[user_indices < len(dirty)]] = True
+        return TopNTable(self.positions, self.scores, self.counts, self.totals, self.build_seconds, dirty)
+
+
+def neighbor_graph(indices, distances, num_users, weighting='uniform', row_offset=0, user_indices=None):
+    """Sparse weight matrix from batched kneighbors output for users row_offset.., without self-edges.
+
+    user_indices gives the queried users instead when they are not consecutive.
+    Also returns how many neighbors other than itself each user has.
+    """
+    rows, k = indices.shape
+    weights = neighbor_weights(distances, weighting).reshape(rows, k)
+    if user_indices is None:
+        user_indices = row_offset + np.arange(rows)
+    not_self = indices != np.asarray(user_indices)[:, None]
+    weights = np.where(not_self, weights, 0.0)
+    graph = csr_matrix((weights.ravel(), indices.ravel(), np.arange(0, rows * k + 1, k)),
+                       shape=(rows, num_users))
+    return graph, not_self.sum(axis=1)
+
+
+def select_top_n(scores, n):
+    """Best-first column positions of the n largest finite scores in each row.
+
+    Ties are broken by column position, matching scoring.top_k. Rows with
+    fewer than n finite scores are padded with -1. n must be between 1 and
+    the number of columns.
+    """
+    rows, cols = scores.shape
+    kth = -np.partition(-scores, n - 1, axis=1)[:, n - 1:n]
+    above = scores > kth
+    ties = (scores == kth) & np.isfinite(scores)
+    need = n - above.sum(axis=1, keepdims=True)
+    selected = above | (ties & (np.cumsum(ties, axis=1) <= need))
+
+    counts = selected.sum(axis=1)
+    positions = np.full((rows, n), -1, dtype=np.int32)
+    row_ids, col_ids = np.nonzero(selected)
+    slots = np.arange(len(row_ids)) - np.repeat(np.cumsum(counts) - counts, counts)
+    positions[row_ids, slots] = col_ids
+
+    ranked_scores = np.where(positions >= 0, np.take_along_axis(scores, np.maximum(positions, 0), axis=1), -np.inf)
+    order = np.lexsort((np.where(positions >= 0, positions, cols), -ranked_scores), axis=-1)
+    positions = np.take_along_axis(positions, order, axis=1)
+    ranked_scores = np.take_along_axis(ranked_scores, order, axis=1)
+    return positions, ranked_scores, counts
+
+
+def build_top_n(model_knn, user_reel_matrix, n=100, n_neighbors=20, weighting='uniform', chunk_cells=CHUNK_CELLS):
+    """Top-n recommendations for every user in one batched pass.
+
+    Each chunk of users gets one kneighbors call and one sparse product of its
+    neighbor-weight rows with the rating matrix; rated reels are masked out and
+    the best n per row are picked with a partition instead of a sort.
+    """
+    start = time.perf_counter()
+    ratings = user_reel_matrix.ratings
+    num_users, num_reels = ratings.shape
+    n = min(n, num_reels)
+    n_neighbors = min(n_neighbors, num_users)
+    chunk = max(1, min(num_users, chunk_cells // max(num_reels, 1)))
+    if n == 0 or num_users == 0:
+        empty = np.zeros(num_users, dtype=np.int32)
+        return TopNTable(np.zeros((num_users, 0), dtype=np.int32), np.zeros((num_users, 0), dtype=np.float32),
+                         empty, empty, time.perf_counter() - start)
+
+    positions = np.full((num_users, n), -1, dtype=np.int32)
+    scores = np.zeros((num_users, n), dtype=np.float32)
+    counts = np.zeros(num_users, dtype=np.int32)
+    totals = (num_reels - np.diff(ratings.indptr)).astype(np.int32)
+
+    for begin in range(0, num_users, chunk):
+        end = min(begin + chunk, num_users)
+        rows = ratings[begin:end]
+        distances, indices = model_knn.kneighbors(rows, n_neighbors=n_neighbors)
+        graph, neighbor_counts = neighbor_graph(indices, distances, num_users, weighting, row_offset=begin)
+
+        chunk_scores = np.asarray((graph @ ratings).todense(), dtype=np.float32)
+        rated_rows, rated_cols = rows.nonzero()
+        chunk_scores[rated_rows, rated_cols] = -np.inf
+
+        chunk_positions, chunk_ranked, chunk_counts = select_top_n(chunk_scores, n)
+        positions[begin:end] = chunk_positions
+        scores[begin:end] = np.where(np.isfinite(chunk_ranked), chunk_ranked, 0)
+        counts[begin:end] = chunk_counts
+
+        lonely = neighbor_counts == 0
+        counts[begin:end][lonely] = 0
+        totals[begin:end][lonely] = 0
+
+    return TopNTable(positions, scores, counts, totals, time.perf_counter() - start)
@@ -1,9 +1,9 @@
 import pandas as pd
-import numpy as np
-from scipy.sparse import csr_matrix
-from sklearn.neighbors import NearestNeighbors
 import joblib
 import os
+from rating_matrix import RatingMatrix
+from scoring import score_reels, top_k
+from neighbor_index import make_index
 
 def load_data():
     column_names = ['user_id', 'highlight_id', 'rating']
@@ -11,10 +11,7 @@ def load_data():
     return ratings
 
 def build_and_save_model(user_play_matrix, model_path='knn_model.pkl'):
-    user_play_matrix = user_play_matrix.astype(float)
-    user_play_matrix_sparse = csr_matrix(user_play_matrix.values)  
-    model_knn = NearestNeighbors(metric='cosine', algorithm='brute', n_neighbors=10, n_jobs=-1)
-    model_knn.fit(user_play_matrix_sparse)
+    model_knn = make_index(os.getenv('CFKNN_INDEX', 'brute')).fit(user_play_matrix.ratings)
     joblib.dump((model_knn, user_play_matrix), model_path)
     print(f"Model trained and saved to {model_path}")
     return model_knn, user_play_matrix
@@ -23,30 +20,39 @@ def load_model(model_path='knn_model.pkl'):
     if os.path.exists(model_path):
         print(f"Loading model from {model_path}...")
         model_knn, user_play_matrix = joblib.load(model_path)
-        return model_knn, user_play_matrix
+        if isinstance(user_play_matrix, RatingMatrix):
+            return model_knn, user_play_matrix
+        print("Model file uses the old dense format. Please retrain the model.")
+        return None, None
     else:
         print(f"Model not found at {model_path}. Please train the model first.")
         return None, None
 
-def recommend_plays(user_id, model_knn, user_play_matrix, num_recommendations=5):
-    user_index = user_id - 1  
-    distances, indices = model_knn.kneighbors(user_play_matrix.iloc[user_index, :].values.reshape(1, -1), n_neighbors=10)
-    similar_users = indices.flatten()
-    play_scores = {}
-
-    for i in similar_users:
-        for play_id in user_play_matrix.columns:
-            if user_play_matrix.iloc[user_index][play_id] == 0:  
-                play_scores[play_id] = play_scores.get(play_id, 0) + user_play_matrix.iloc[i][play_id]
+def top_plays(user_id, model_knn, user_play_matrix, num_recommendations=5):
+    """(play positions, scores) of the best plays for a user, or None if there is nothing to recommend"""
+    user_index = user_play_matrix.user_position(user_id)
+    if user_index is None:
+        print(f"User {user_id} has no ratings")
+        return None
+    distances, indices = model_knn.kneighbors(user_play_matrix.ratings[user_index], n_neighbors=10)
+    scores, candidates = score_reels(user_play_matrix.ratings, user_index, indices[0], distances[0])
+    if candidates is None:
+        return None
+    positions = top_k(scores, candidates, num_recommendations)
+    return positions, scores[positions]
 
-    recommended_plays = sorted(play_scores.items(), key=lambda x: x[1], reverse=True)[:num_recommendations]
+def recommend_plays(user_id, model_knn, user_play_matrix, num_recommendations=5):
+    plays = top_plays(user_id, model_knn, user_play_matrix, num_recommendations)
+    if plays is None:
+        return
+    positions, scores = plays
     print(f"Top {num_recommendations} play recommendations for User {user_id}:")
-    for play_id, score in recommended_plays:
+    for play_id, score in zip(user_play_matrix.reel_ids[positions], scores):
         print(f"Play ID: {play_id}, Predicted Score: {score}")
 
 def main():
     ratings = load_data()
-    user_play_matrix = ratings.pivot_table(index='user_id', columns='highlight_id', values='rating', fill_value=0)
+    user_play_matrix = RatingMatrix.from_frame(ratings, reel_col='highlight_id')
     
     model_path = 'knn_model.pkl'
     model_knn, user_play_matrix_loaded = load_model(model_path)
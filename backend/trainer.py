@@ -0,0 +1,180 @@
+import logging
+import os
+import threading
+import time
+
+import cfknn
+from db import check_rating_table
+from ratings_snapshot import get_snapshot
+
+try:
+    import fcntl
+except ImportError:  # Windows: there is no file locking, and a single development process builds its own models
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Rebuild when the model is this many seconds old, or once this many ratings changed since the last build
+RETRAIN_INTERVAL = float(os.getenv('MODEL_RETRAIN_INTERVAL', 60 * 60))
+RETRAIN_DELTA = int(os.getenv('MODEL_RETRAIN_DELTA', 1000))
+POLL_INTERVAL = 5
+
+
+class ModelTrainer(threading.Thread):
+    """Daemon thread that rebuilds the cfknn model off the request path.
+
+    On start it publishes the newest saved artifact (seeding the ratings
+    snapshot from it) or builds one. After that it rebuilds on a schedule or
+    when enough ratings changed, writing a new versioned artifact and swapping
+    it in with cfknn.publish_model. Requests keep using the previous model
+    until the swap, so they never wait on a build.
+
+    Only one process per MODEL_DIR and table builds: the one holding an
+    exclusive lock on the table's lock file. The trainers of the other
+    worker processes load each artifact it saves instead, and take the lock
+    over if the building process exits.
+    """
+
+    def __init__(self, table, interval=RETRAIN_INTERVAL, delta_threshold=RETRAIN_DELTA):
+        super().__init__(name=f"model-trainer-{table}", daemon=True)
+        self.table = table
+        self.interval = interval
+        self.delta_threshold = delta_threshold
+        self.builder = False
+        self.building = False
+        self.builds = 0
+        self.last_error = None
+        self._requested = False
+        self._wake = threading.Event()
+        self._lock_file = None
+
+    def run(self):
+        self.builder = self._take_build_lock()
+        state = cfknn.load_latest_model(self.table)
+        if state is not None:
+            self._publish_loaded(state)
+        elif self.builder:
+            self.build()
+
+        while True:
+            self._wake.wait(POLL_INTERVAL)
+            self._wake.clear()
+            if not self.builder:
+                self.builder = self._take_build_lock()
+            if not self.builder:
+                self._follow()
+            elif self._due():
+                self.build()
+
+    def _take_build_lock(self):
+        """Whether this process holds the table's build lock, taking it when it is free"""
+        if fcntl is None:
+            return True
+        try:
+            if self._lock_file is None:
+                os.makedirs(cfknn.MODEL_DIR, exist_ok=True)
+                self._lock_file = open(os.path.join(cfknn.MODEL_DIR, f"{self.table}.lock"), 'a')
+            # Released by the OS when the holding process exits
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def _publish_loaded(self, state):
+        get_snapshot(self.table).seed(state.matrix, state.high_water_mark, state.built_at)
+        cfknn.publish_model(self.table, state)
+
+    def _follow(self):
+        """Publish an artifact the building process saved since the current model"""
+        latest = cfknn.latest_model_version(self.table)
+        current = cfknn.current_model(self.table)
+        if latest is None or (current is not None and latest <= current.version):
+            return
+        state = cfknn.load_latest_model(self.table)
+        if state is not None:
+            self._publish_loaded(state)
+            logger.info(f"Loaded model {state.version} for {self.table} built by another process")
+
+    def request_build(self):
+        """Ask for a rebuild as soon as the current one (if any) finishes"""
+        self._requested = True
+        self._wake.set()
+
+    def _due(self):
+        if self._requested:
+            return True
+        state = cfknn.current_model(self.table)
+        if state is None:
+            return True
+        return (time.time() - state.built_at >= self.interval
+                or self._ratings_since_build(state) >= self.delta_threshold)
+
+    def _ratings_since_build(self, state):
+        # A seeded snapshot starts counting from zero, so never go negative
+        return max(0, get_snapshot(self.table).change_count - state.change_count)
+
+    def build(self):
+        self._requested = False
+        self.building = True
+        try:
+            state = cfknn.build_model(self.table)
+            if state is None:
+                self.last_error = 'ratings could not be loaded'
+                return None
+            cfknn.publish_model(self.table, state)
+            self.builds += 1
+            self.last_error = None
+            logger.info(f"Published model {state.version} for {self.table} in {state.build_seconds:.2f}s")
+            return state
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"Model build failed for {self.table}: {e}", exc_info=True)
+            return None
+        finally:
+            self.building = False
+
+    def status(self):
+        state = cfknn.current_model(self.table)
+        status = {
+            'table': self.table,
+            'mode': cfknn.RECOMMENDER_MODE,
+            'builder': self.builder,
+            'building': self.building,
+            'builds': self.builds,
+            'last_error': self.last_error,
+            'retrain_interval': self.interval,
+            'retrain_delta': self.delta_threshold,
+            'version': None,
+        }
+        if state is not None:
+            status.update({
+                'version': state.version,
+                'built_at': state.built_at,
+                'build_seconds': round(state.build_seconds, 3),
+                'staleness_seconds': round(time.time() - state.built_at, 3),
+                'ratings_since_build': self._ratings_since_build(state),
+            })
+        if state is not None and state.top_n is not None:
+            status['top_n'] = {
+                'size': state.top_n.size,
+                'build_seconds': round(state.top_n.build_seconds, 3),
+                'users_per_second': round(state.top_n.users_per_second or 0, 1),
+                'dirty_users': int(state.top_n.dirty.sum()),
+            }
+        if state is not None and state.item_neighbors is not None:
+            status['item_neighbors'] = {'reels': state.item_neighbors.shape[0], 'nnz': state.item_neighbors.nnz}
+        return status
+
+
+_trainers = {}
+_trainers_lock = threading.Lock()
+
+
+def get_trainer(table='user_ratings_db'):
+    """Process-wide trainer for a ratings table, started on first use"""
+    check_rating_table(table)
+    with _trainers_lock:
+        if table not in _trainers:
+            _trainers[table] = ModelTrainer(table)
+            _trainers[table].start()
+        return _trainers[table]
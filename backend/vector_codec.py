@@ -0,0 +1,43 @@
+from functools import lru_cache
+
+import numpy as np
+from psycopg2.extensions import AsIs, register_adapter
+
+
+class Vector:
+    """A float32 embedding passed to psycopg2 as a pgvector value.
+
+    Wrap query vectors in Vector instead of formatting them into strings;
+    once register_vector_adapter() has run, psycopg2 renders the parameter as
+    a '[...]'::vector literal itself.
+    """
+
+    __slots__ = ('values',)
+
+    def __init__(self, values):
+        self.values = np.asarray(values, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.values)
+
+
+@lru_cache(maxsize=16)
+def _template(dimensions):
+    # %.9g is the shortest fixed precision that reads back as the same float32
+    return '[' + ','.join(['%.9g'] * dimensions) + ']'
+
+
+def encode(values):
+    """pgvector text form of a vector, e.g. '[0.5,-1.25]', exact for float32 values"""
+    values = np.asarray(values, dtype=np.float32)
+    return _template(len(values)) % tuple(values.tolist())
+
+
+def _adapt_vector(vector):
+    # The encoded form holds only digits, signs, '.', 'e' and commas, so it needs no quoting
+    return AsIs(f"'{encode(vector.values)}'::vector")
+
+
+def register_vector_adapter():
+    """Teach psycopg2 to send Vector parameters; safe to call more than once"""
+    register_adapter(Vector, _adapt_vector)
@@ -1,6 +1,6 @@
 // File: frontend/src/pages/RecommendationsPage.js
 
-import React, { useState, useEffect, useRef, useMemo } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import PageTransition from "../components/PageTransition";
 import { useAuth } from "../contexts/AuthContext";
 import TranslatedText from "../components/TranslatedText";
@@ -117,61 +117,55 @@ function RecommendationsPage() {
   const [isSearching, setIsSearching] = useState(false);
 
   // Recommendations state
-  const [followRecommendations, setFollowRecommendations] = useState([]);
-  const [modelRecommendations, setModelRecommendations] = useState([]);
-  const [isLoading, setIsLoading] = useState(true);
+  const [recommendations, setRecommendations] = useState([]);
   const [isLoadingMore, setIsLoadingMore] = useState(false);
   const [isModelLoaded, setIsModelLoaded] = useState(false);
 
   // Pagination tracking
   const [currentPage, setCurrentPage] = useState(1);
-  const [followHasMore, setFollowHasMore] = useState(true);
-  const [modelHasMore, setModelHasMore] = useState(true);
   const [hasMore, setHasMore] = useState(true);
 
   // State to track which video is currently playing (for previews)
   const [playingVideo, setPlayingVideo] = useState(null);
 
-  // Dummy functions to fetch recommendations
-
-  const fetchFollowRecommendations = async (pageNum, theSearchTerm) => {
+  // One page of the blended feed: model, pgvector and follow recommendations ranked together by the backend
+  const fetchFeedRecommendations = async (pageNum) => {
+    if (!user?.id) return;
     try {
       setIsLoadingMore(true);
       const token = localStorage.getItem("auth_token") || "";
       const response = await fetch(
-        `${
-          process.env.REACT_APP_BACKEND_URL
-        }/recommend/follow?page=${pageNum}&search=${encodeURIComponent(
-          theSearchTerm
-        )}`,
+        `${process.env.REACT_APP_BACKEND_URL}/recommend/feed?page=${pageNum}`,
         {
           headers: { Authorization: `Bearer ${token}` },
         }
       );
       const data = await response.json();
       if (data.success && Array.isArray(data.recommendations)) {
+        // One request for the video data of the whole page
+        const videos = await videoService.getVideoMetadata(
+          data.recommendations.map((rec) => rec.reel_id)
+        );
         const newRecs = await Promise.all(
-          data.recommendations.map(async (rec) => {
-            // For each recommendation, fetch its video data
-            const videoRes = await fetch(
-              `${process.env.REACT_APP_BACKEND_URL}/api/mlb/video?play_id=${rec.reel_id}`,
-              {
-                headers: { Authorization: `Bearer ${token}` },
-              }
-            );
-            const videoData = await videoRes.json();
+          data.recommendations.map(async (rec, index) => {
+            const videoData = videos[index];
             const generated = await fetchDescriptionFromGemini(
               videoData.title || "MLB Highlight"
             );
+            const followed = (rec.sources || []).includes("follow");
             return {
               id: rec.reel_id,
               type: "video",
               title: videoData.success
                 ? `${videoData.title}`
-                : "Followed Team/Player Highlight",
+                : followed
+                ? "Followed Team/Player Highlight"
+                : "Model Recommendation",
               description: videoData.success
                 ? generated
-                : "Highlight from your followed teams/players",
+                : followed
+                ? "Highlight from your followed teams/players"
+                : "",
               videoUrl: videoData.success ? videoData.video_url : null,
               upvotes: 0,
               downvotes: 0,
@@ -179,82 +173,19 @@ function RecommendationsPage() {
             };
           })
         );
-        setFollowRecommendations((prev) =>
+        setRecommendations((prev) =>
           pageNum === 1 ? newRecs : [...prev, ...newRecs]
         );
-        setFollowHasMore(data.has_more);
-      }
-    } catch (err) {
-      console.error("Error fetching follow-based recs:", err);
-    } finally {
-      setIsLoadingMore(false);
-    }
-  };
-
-  const fetchModelRecommendations = async (pageNum, theSearchTerm) => {
-    if (!user?.id) return;
-    try {
-      setIsLoading(true);
-      const token = localStorage.getItem("auth_token");
-      const start = (pageNum - 1) * 5;
-      const response = await fetch(
-        `${process.env.REACT_APP_BACKEND_URL}/recommend/vector?start=${start}`,
-        {
-          headers: {
-            Authorization: `Bearer ${token}`,
-            "Content-Type": "application/json",
-          },
-        }
-      );
-      const data = await response.json();
-      if (data.success && Array.isArray(data.recommendations)) {
-        const newRecs = await Promise.all(
-          data.recommendations.map(async (id) => {
-            try {
-              const videoRes = await fetch(
-                `${process.env.REACT_APP_BACKEND_URL}/api/mlb/video?play_id=${id}`,
-                {
-                  headers: { Authorization: `Bearer ${token}` },
-                }
-              );
-              const videoData = await videoRes.json();
-              const generated = await fetchDescriptionFromGemini(
-                videoData.title || "MLB Highlight"
-              );
-              return {
-                id,
-                type: "video",
-                title: videoData.success
-                  ? `${videoData.title} `
-                  : "Model Recommendation",
-                description: videoData.success ? generated : "",
-                videoUrl: videoData.success ? videoData.video_url : null,
-                upvotes: 0,
-                downvotes: 0,
-                comments: [],
-              };
-            } catch (error) {
-              console.error(`Error fetching video ${id}:`, error);
-              return null;
-            }
-          })
-        );
-        const valid = newRecs.filter((r) => r);
-        if (pageNum === 1) {
-          setModelRecommendations(valid);
-        } else {
-          setModelRecommendations((prev) => [...prev, ...valid]);
-        }
-        setModelHasMore(data.has_more);
+        setHasMore(data.has_more);
         setIsModelLoaded(true);
       } else {
-        setModelHasMore(false);
+        setHasMore(false);
       }
     } catch (error) {
-      console.error("Error fetching model recommendations:", error);
-      setModelHasMore(false);
+      console.error("Error fetching feed recommendations:", error);
+      setHasMore(false);
     } finally {
-      setIsLoading(false);
+      setIsLoadingMore(false);
     }
   };
 
@@ -277,30 +208,12 @@ function RecommendationsPage() {
     }
   };
 
-  // Load initial recommendations on mount
+  // Load the first page on mount
   useEffect(() => {
-    fetchFollowRecommendations(1, "");
-    fetchModelRecommendations(1, "");
+    setCurrentPage(1);
+    fetchFeedRecommendations(1);
   }, [user?.id]);
 
-  // Combine the two sets of recommendations in an interleaved manner
-  const combinedRecommendations = useMemo(() => {
-    const combined = [];
-    const maxLength = Math.max(
-      followRecommendations.length,
-      modelRecommendations.length
-    );
-    for (let i = 0; i < maxLength; i++) {
-      if (i < followRecommendations.length) {
-        combined.push(followRecommendations[i]);
-      }
-      if (i < modelRecommendations.length) {
-        combined.push(modelRecommendations[i]);
-      }
-    }
-    return combined;
-  }, [followRecommendations, modelRecommendations]);
-
   // Infinity scroll logic
   const sentinelRef = useRef(null);
   useEffect(() => {
@@ -309,18 +222,7 @@ function RecommendationsPage() {
         if (entry.isIntersecting && !isLoadingMore && hasMore) {
           const nextPage = currentPage + 1;
           setCurrentPage(nextPage);
-          const isEven = nextPage % 2 === 0;
-          const pageForRequest = Math.ceil(nextPage / 2);
-          setIsLoadingMore(true);
-          try {
-            if (isEven) {
-              await fetchFollowRecommendations(pageForRequest, searchTerm);
-            } else {
-              await fetchModelRecommendations(pageForRequest, searchTerm);
-            }
-          } finally {
-            setIsLoadingMore(false);
-          }
+          await fetchFeedRecommendations(nextPage);
         }
       },
       { threshold: 0.1 }
@@ -329,11 +231,7 @@ function RecommendationsPage() {
       observer.observe(sentinelRef.current);
     }
     return () => observer.disconnect();
-  }, [currentPage, isLoadingMore, hasMore, searchTerm]);
-
-  useEffect(() => {
-    setHasMore(followHasMore || modelHasMore);
-  }, [followHasMore, modelHasMore]);
+  }, [currentPage, isLoadingMore, hasMore]);
 
   // Search logic
   const handleSearchSubmit = async (e) => {
@@ -356,14 +254,11 @@ function RecommendationsPage() {
       );
       const searchData = await searchResponse.json();
       if (searchData.success && Array.isArray(searchData.recommendations)) {
-        const videoPromises = searchData.recommendations.map(async (id) => {
-          const videoRes = await fetch(
-            `${process.env.REACT_APP_BACKEND_URL}/api/mlb/video?play_id=${id}`,
-            {
-              headers: { Authorization: `Bearer ${token}` },
-            }
-          );
-          const videoData = await videoRes.json();
+        const videos = await videoService.getVideoMetadata(
+          searchData.recommendations
+        );
+        const videoPromises = searchData.recommendations.map(async (id, index) => {
+          const videoData = videos[index];
           const generated = await fetchDescriptionFromGemini(
             videoData.title || "MLB Highlight"
           );
@@ -380,15 +275,11 @@ function RecommendationsPage() {
         });
         const videosResult = await Promise.all(videoPromises);
         const validVideos = videosResult.filter((v) => v.videoUrl);
-        const halfLength = Math.ceil(validVideos.length / 2);
-        setFollowRecommendations(validVideos.slice(0, halfLength));
-        setModelRecommendations(validVideos.slice(halfLength));
-        setHasMore(searchData.has_more);
-        setFollowHasMore(searchData.has_more);
-        setModelHasMore(searchData.has_more);
+        setRecommendations(validVideos);
+        // The search returns all its results at once; the feed doesn't page through a search
+        setHasMore(false);
       } else {
-        setFollowRecommendations([]);
-        setModelRecommendations([]);
+        setRecommendations([]);
         setHasMore(false);
         toast.error("No results found");
       }
@@ -506,11 +397,11 @@ function RecommendationsPage() {
   };
 
   useEffect(() => {
-    if (combinedRecommendations.length > 0) {
-      const videoIds = combinedRecommendations.map((rec) => rec.id);
+    if (recommendations.length > 0) {
+      const videoIds = recommendations.map((rec) => rec.id);
       loadVotes(videoIds);
     }
-  }, [combinedRecommendations]);
+  }, [recommendations]);
 
   const [comments, setComments] = useState({});
   const [newComments, setNewComments] = useState({});
@@ -532,12 +423,12 @@ function RecommendationsPage() {
   };
 
   useEffect(() => {
-    if (combinedRecommendations.length > 0) {
-      combinedRecommendations.forEach((rec) => {
+    if (recommendations.length > 0) {
+      recommendations.forEach((rec) => {
         loadComments(rec.id);
       });
     }
-  }, [combinedRecommendations]);
+  }, [recommendations]);
 
   const handleAddComment = async (videoId) => {
     try {
@@ -601,12 +492,12 @@ function RecommendationsPage() {
 
   // Load comments when recommendations change
   useEffect(() => {
-    if (combinedRecommendations.length > 0) {
-      combinedRecommendations.forEach((rec) => {
+    if (recommendations.length > 0) {
+      recommendations.forEach((rec) => {
         loadComments(rec.id);
       });
     }
-  }, [combinedRecommendations]);
+  }, [recommendations]);
 
   // Add useEffect to fetch upcoming events
   useEffect(() => {
@@ -761,7 +652,7 @@ function RecommendationsPage() {
               </div>
             )}
 
-            {combinedRecommendations.map((item) => (
+            {recommendations.map((item) => (
               <div
                 key={item.id}
                 className="bg-white dark:bg-gray-800 shadow rounded-lg p-4 transition-transform hover:-translate-y-0.5 hover:shadow-lg duration-300 ease-in-out"
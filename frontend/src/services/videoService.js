@@ -106,5 +106,25 @@ export const videoService = {
       console.error('Error deleting comment:', error);
       throw error;
     }
+  },
+
+  // Metadata for many play ids in one request; returns one entry per id, in order
+  getVideoMetadata: async (playIds) => {
+    if (!playIds.length) return [];
+    try {
+      const response = await axios.post(
+        `${BASE_URL}/api/mlb/videos`,
+        { play_ids: playIds },
+        {
+          headers: {
+            'Authorization': `Bearer ${localStorage.getItem('auth_token')}`
+          }
+        }
+      );
+      return response.data.videos;
+    } catch (error) {
+      console.error('Error getting video metadata:', error);
+      return playIds.map((playId) => ({ play_id: playId, success: false }));
+    }
   }
 }; 
\ No newline at end of file